@@ -0,0 +1,73 @@
+"""
+Резервное копирование базы знаний (см. src/backup.py)
+
+Снимок можно делать при работающем приложении (например, по расписанию
+cron / планировщика задач). Восстановление — только при остановленном.
+
+Запуск:
+    python scripts/backup_index.py create --label "перед обновлением"
+    python scripts/backup_index.py list
+    python scripts/backup_index.py verify 20260101-030000
+    python scripts/backup_index.py restore 20260101-030000
+    python scripts/backup_index.py prune --keep 14
+"""
+import argparse
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.backup import create_snapshot, list_snapshots, prune_snapshots, restore_snapshot, verify_snapshot
+from src.config import BACKUP_KEEP
+
+
+def print_snapshots():
+    snapshots = list_snapshots()
+    if not snapshots:
+        print("Снимков нет")
+        return
+    print(f"{'id':<20} {'файлов':>7} {'размер, МБ':>11} {'новых, МБ':>10}  подпись")
+    for snapshot in snapshots:
+        stats = snapshot['stats']
+        print(f"{snapshot['id']:<20} {stats['files']:>7} {stats['bytes'] / 1024 ** 2:>11.1f} "
+              f"{stats['added_bytes'] / 1024 ** 2:>10.1f}  {snapshot.get('label') or ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Снимки и восстановление базы знаний")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = commands.add_parser("create", help="Создать снимок")
+    create_parser.add_argument("--label", help="Подпись снимка")
+
+    commands.add_parser("list", help="Список снимков")
+
+    verify_parser = commands.add_parser("verify", help="Проверить блоки снимка")
+    verify_parser.add_argument("snapshot_id")
+
+    restore_parser = commands.add_parser("restore", help="Восстановить снимок (приложение должно быть остановлено)")
+    restore_parser.add_argument("snapshot_id")
+    restore_parser.add_argument("--no-verify", action="store_true", help="Не проверять SHA-256 блоков")
+
+    prune_parser = commands.add_parser("prune", help="Удалить старые снимки и неиспользуемые блоки")
+    prune_parser.add_argument("--keep", type=int, default=BACKUP_KEEP, help="Сколько последних снимков оставить")
+
+    args = parser.parse_args()
+
+    if args.command == "create":
+        create_snapshot(args.label)
+    elif args.command == "list":
+        print_snapshots()
+    elif args.command == "verify":
+        bad = verify_snapshot(args.snapshot_id)
+        if bad:
+            print(f"❌ Отсутствуют или повреждены блоки: {len(bad)}")
+            sys.exit(1)
+        print("✅ Все блоки снимка на месте")
+    elif args.command == "restore":
+        restore_snapshot(args.snapshot_id, verify=not args.no_verify)
+    elif args.command == "prune":
+        report = prune_snapshots(args.keep)
+        print(f"Удалено снимков: {report['removed_snapshots']}, блоков: {report['removed_objects']} "
+              f"({report['freed_bytes'] / 1024 ** 2:.1f} МБ)")
@@ -0,0 +1,125 @@
+"""
+Бенчмарк сжатия эмбеддингов: recall@k относительно полной точности
+
+Берёт полные векторы чанков (metadata.db или хранилище векторов), выбирает часть из
+них как запросы и сравнивает top-k точного поиска во float32 с:
+- поиском по векторам пониженной размерности (PCA / усечение) — то, что
+  хранит ChromaDB;
+- тем же поиском с пересчётом лучших кандидатов по полным векторам
+  float16 / int8 — то, что делает RAGPipeline.rescore.
+
+Запуск:
+    python scripts/benchmark_embedding_compression.py
+    python scripts/benchmark_embedding_compression.py --dims 128 256 512 --k 5 --queries 300
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embedding_compression import Projection, quantize, dequantize, load_full_vectors, normalize
+from src.metadata_manager import MetadataManager
+from src.vector_store import get_vector_store
+
+BATCH_SIZE = 500
+
+
+def load_corpus(limit: int) -> np.ndarray:
+    """Полные нормированные векторы чанков (не больше limit)"""
+    collection = get_vector_store()
+    pool = MetadataManager().pool
+
+    vectors = []
+    total = min(collection.count(), limit)
+    for offset in range(0, total, BATCH_SIZE):
+        batch = collection.get(include=['embeddings'], limit=min(BATCH_SIZE, total - offset), offset=offset)
+        with pool.connection() as conn:
+            stored = load_full_vectors(conn, batch['ids'])
+        for chunk_id, embedding in zip(batch['ids'], batch['embeddings']):
+            vectors.append(stored[chunk_id] if chunk_id in stored else embedding)
+
+    return normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int, exclude: np.ndarray) -> np.ndarray:
+    """Индексы k ближайших по косинусу (сам запрос исключается)"""
+    scores = queries @ corpus.T
+    scores[np.arange(len(queries)), exclude] = -np.inf
+    candidates = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def rescored(queries, full_corpus, candidates, k) -> np.ndarray:
+    """Пересортировка кандидатов по (деквантизованным) полным векторам"""
+    result = []
+    for query, row in zip(queries, candidates):
+        scores = full_corpus[row] @ query
+        result.append(row[np.argsort(-scores)[:k]])
+    return np.asarray(result)
+
+
+def run_benchmark(dims, k: int, n_queries: int, candidates: int, limit: int, method: str):
+    corpus = load_corpus(limit)
+    n, full_dim = corpus.shape
+    print(f"Векторов: {n}, размерность: {full_dim}")
+    if n <= max(k, candidates):
+        print("❌ Слишком маленький корпус для бенчмарка")
+        return
+
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(n, size=min(n_queries, n), replace=False)
+    queries = corpus[query_ids]
+    truth = top_k(queries, corpus, k, query_ids)
+
+    full_mb = n * full_dim * 4 / 1024 ** 2
+    print(f"Полная точность: {full_mb:.1f} МБ (float32 × {full_dim})\n")
+
+    # Полные векторы в SQLite после квантизации (для пересчёта)
+    quantized = {}
+    for quantization in ('float16', 'int8'):
+        codes, scales = quantize(corpus, quantization)
+        quantized[quantization] = normalize(dequantize(codes, scales, quantization))
+        found = top_k(normalize(quantized[quantization][query_ids]), quantized[quantization], k, query_ids)
+        print(f"Только квантизация {quantization}: recall@{k} = {recall(found, truth):.3f}, "
+              f"{codes.nbytes / 1024 ** 2:.1f} МБ")
+
+    print(f"\n{'метод':<10} {'dim':>5} {'ChromaDB, МБ':>13} {'recall@' + str(k):>10} "
+          f"{'+ пересчёт f16':>15} {'+ пересчёт i8':>14}")
+    for dim in dims:
+        if dim >= full_dim:
+            continue
+        projection = Projection.fit(corpus, dim, method)
+        reduced = projection.transform(corpus)
+        reduced_queries = reduced[query_ids]
+
+        plain = recall(top_k(reduced_queries, reduced, k, query_ids), truth)
+        pool = top_k(reduced_queries, reduced, candidates, query_ids)
+        row = [
+            recall(rescored(queries, quantized[quantization], pool, k), truth)
+            for quantization in ('float16', 'int8')
+        ]
+        print(f"{method:<10} {dim:>5} {n * dim * 4 / 1024 ** 2:>13.1f} {plain:>10.3f} {row[0]:>15.3f} {row[1]:>14.3f}")
+
+    print(f"\n(пересчёт: {candidates} кандидатов из сжатого индекса → top-{k} по полным векторам)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k сжатых эмбеддингов относительно float32")
+    parser.add_argument("--dims", type=int, nargs="+", default=[128, 256, 384, 512])
+    parser.add_argument("--method", choices=["pca", "truncate"], default="pca")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200, help="Число запросов (векторы корпуса)")
+    parser.add_argument("--candidates", type=int, default=50, help="Кандидатов для пересчёта")
+    parser.add_argument("--limit", type=int, default=50000, help="Максимум векторов корпуса")
+    args = parser.parse_args()
+
+    run_benchmark(args.dims, args.k, args.queries, args.candidates, args.limit, args.method)
@@ -0,0 +1,63 @@
+"""
+Скрипт для (пере)построения индекса FTS5 по чанкам из ChromaDB
+
+Нужен один раз для чанков, загруженных до появления FTS5, или если индекс
+разошёлся с ChromaDB. Новые загрузки индексируются автоматически.
+"""
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.fts_search import index_chunks
+from src.metadata_manager import MetadataManager
+from src.vector_store import get_vector_store
+
+BATCH_SIZE = 500
+
+
+def build_fts_index():
+    """Полная перестройка chunk_texts/chunks_fts из ChromaDB"""
+    collection = get_vector_store()
+    metadata_manager = MetadataManager()
+    known_instructions = set(metadata_manager.get_active_flags())
+
+    total = collection.count()
+    print(f"Чанков в ChromaDB: {total}")
+
+    indexed = 0
+    skipped = 0
+    with metadata_manager.pool.transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM chunk_texts')
+
+        for offset in range(0, total, BATCH_SIZE):
+            batch = collection.get(
+                include=['documents', 'metadatas'],
+                limit=BATCH_SIZE,
+                offset=offset
+            )
+
+            rows = [
+                (chunk_id, metadata.get('instruction_id'), metadata.get('title', ''), text)
+                for chunk_id, text, metadata in zip(batch['ids'], batch['documents'], batch['metadatas'])
+                if metadata.get('instruction_id') in known_instructions
+            ]
+            skipped += len(batch['ids']) - len(rows)
+
+            if rows:
+                chunk_ids, instruction_ids, titles, texts = zip(*rows)
+                index_chunks(cursor, list(chunk_ids), list(instruction_ids), list(titles), list(texts))
+                indexed += len(rows)
+
+        # Оптимизация структуры индекса после массовой вставки
+        cursor.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('optimize')")
+
+    print(f"Проиндексировано чанков: {indexed}")
+    if skipped:
+        print(f"Пропущено чанков без инструкции в SQLite: {skipped}")
+
+
+if __name__ == "__main__":
+    build_fts_index()
@@ -0,0 +1,55 @@
+"""
+Скрипт для (пере)построения индекса инструкций по чанкам из ChromaDB
+
+Нужен один раз для инструкций, загруженных до появления двухэтапного поиска,
+или если индекс разошёлся с чанками. Новые загрузки индексируются
+автоматически. Флаг active берётся из чанков — при сомнениях сначала
+запустите scripts/reconcile_index.py.
+"""
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.index_lock import index_write_lock
+from src.instruction_index import upsert_instructions
+from src.metadata_manager import MetadataManager
+from src.vector_store import get_vector_store, get_instruction_store
+
+# Инструкций за один запрос к ChromaDB
+BATCH_SIZE = 100
+
+
+def build_instruction_index():
+    """Полная перестройка коллекции инструкций из чанков"""
+    collection = get_vector_store()
+    metadata_manager = MetadataManager()
+    instruction_ids = list(metadata_manager.get_active_flags())
+
+    # Пересоздаём хранилище, чтобы не осталось записей удалённых инструкций
+    try:
+        get_instruction_store().drop()
+    except Exception:
+        pass
+    instruction_collection = get_instruction_store()
+
+    print(f"Инструкций в SQLite: {len(instruction_ids)}")
+
+    indexed = 0
+    for start in range(0, len(instruction_ids), BATCH_SIZE):
+        batch = collection.get(
+            where={"instruction_id": {"$in": instruction_ids[start:start + BATCH_SIZE]}},
+            include=['metadatas', 'embeddings']
+        )
+        if len(batch['ids']) > 0:
+            indexed += upsert_instructions(instruction_collection, batch['metadatas'], batch['embeddings'])
+
+    print(f"Проиндексировано инструкций: {indexed}")
+    if indexed < len(instruction_ids):
+        print(f"Инструкций без чанков в ChromaDB: {len(instruction_ids) - indexed}")
+
+
+if __name__ == "__main__":
+    with index_write_lock():
+        build_instruction_index()
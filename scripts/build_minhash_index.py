@@ -0,0 +1,77 @@
+"""
+Скрипт для (пере)построения индекса почти одинаковых чанков (src/near_duplicates.py)
+
+Нужен один раз для чанков, загруженных до появления MinHash, или после
+изменения MINHASH_* / SHINGLE_SIZE. Новые загрузки индексируются
+автоматически. Чанки обходятся в порядке загрузки (chunk_texts), поэтому
+оригиналом считается более ранний.
+
+Найденным дублям в хранилище векторов проставляется duplicate_of, как при
+загрузке: поиск убирает дубль, если среди кандидатов есть его оригинал.
+Сами чанки не удаляются.
+
+Запуск:
+    python scripts/build_minhash_index.py
+"""
+import argparse
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.index_lock import index_write_lock
+from src.metadata_manager import MetadataManager
+from src.near_duplicates import find_near_duplicates, store_signatures, record_duplicates
+from src.vector_store import get_vector_store
+
+BATCH_SIZE = 500
+
+
+def build_minhash_index():
+    """Полная перестройка chunk_minhash/chunk_lsh/chunk_duplicates по chunk_texts"""
+    metadata_manager = MetadataManager()
+
+    with index_write_lock(), metadata_manager.pool.transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM chunk_lsh')
+        cursor.execute('DELETE FROM chunk_minhash')
+        cursor.execute('DELETE FROM chunk_duplicates')
+
+        total = cursor.execute('SELECT COUNT(*) FROM chunk_texts').fetchone()[0]
+        print(f"Чанков в chunk_texts: {total}")
+
+        duplicate_of = {}
+        last_rowid = 0
+        while True:
+            rows = cursor.execute(
+                'SELECT rowid, chunk_id, instruction_id, text FROM chunk_texts WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (last_rowid, BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+
+            # Кандидаты из предыдущих пачек уже записаны в этой транзакции
+            instruction_of = {row[1]: row[2] for row in rows}
+            signatures, duplicates = find_near_duplicates(conn, [row[1] for row in rows], [row[3] for row in rows])
+            store_signatures(cursor, signatures, instruction_of)
+            record_duplicates(cursor, duplicates, instruction_of)
+            duplicate_of.update((chunk_id, original_id) for chunk_id, (original_id, _) in duplicates.items())
+
+        print(f"Найдено почти одинаковых чанков: {len(duplicate_of)}")
+        if duplicate_of:
+            # Хранилище векторов — последним: при ошибке выше транзакция SQLite откатится
+            collection = get_vector_store()
+            chunk_ids = list(duplicate_of)
+            for start in range(0, len(chunk_ids), BATCH_SIZE):
+                batch = chunk_ids[start:start + BATCH_SIZE]
+                collection.update_metadata(ids=batch, metadatas=[{'duplicate_of': duplicate_of[c]} for c in batch])
+            print(f"Помечено чанков: {len(duplicate_of)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Индекс почти одинаковых чанков (MinHash + LSH)")
+    parser.parse_args()
+
+    build_minhash_index()
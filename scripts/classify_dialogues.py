@@ -0,0 +1,346 @@
+"""
+Классификация диалогов Telegram локальной моделью (LLMClient / Ollama)
+
+Для каждого диалога из markdown (результат scripts/parse_telegram_chat.py)
+модель генерирует понятный заголовок и категорию: полезный / задача /
+оффтоп / неясно. Диалоги упаковываются в пачки по бюджету токенов, пачки
+обрабатываются параллельно (--workers), ответ разбирается как JSON;
+диалоги, не получившие корректного результата, отправляются повторно.
+
+Результаты кэшируются по хэшу диалога в data/dialogue_classification.jsonl
+и дописываются после каждой пачки: прерванный запуск продолжается с места
+остановки, уже размеченные диалоги к модели повторно не отправляются.
+
+В конце результаты применяются к markdown: остаются диалоги выбранных
+категорий (--keep), заголовки заменяются сгенерированными.
+
+Запуск:
+    python scripts/classify_dialogues.py
+    python scripts/classify_dialogues.py --md data/docs/руководитель_инструкции.md --keep полезный задача
+    python scripts/classify_dialogues.py --workers 2 --batch-tokens 2000
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Dict, Optional
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import LLM_MAX_CONCURRENT_REQUESTS, LLM_CONTEXT_TOKENS
+from src.llm_client import get_llm_client
+
+MD_FILE = "data/docs/руководитель_инструкции.md"
+CACHE_FILE = "data/dialogue_classification.jsonl"
+
+CATEGORIES = ("полезный", "задача", "оффтоп", "неясно")
+
+# Бюджет пачки: ~4 символа на токен (как в chunker), ответ — ~80 токенов на диалог
+BATCH_MAX_DIALOGUES = 12
+DIALOGUE_MAX_CHARS = 4000  # длинный диалог обрезается, для классификации хватает начала
+ANSWER_TOKENS_PER_DIALOGUE = 80
+CONTEXT_MARGIN_TOKENS = 300  # обёртка JSON и неточность оценки токенов
+
+MAX_ATTEMPTS = 3
+CLASSIFY_TEMPERATURE = 0.1
+
+SYSTEM_PROMPT = """Ты разбираешь экспорт чата техподдержки из Telegram (ЕГАИС, УТМ, 1С, роботы, магазины).
+
+Для каждого диалога:
+1. Сгенерируй понятный заголовок (максимум 10 слов), отражающий СУТЬ проблемы или задачи,
+   без опечаток и сокращений. Пример: "90043 заменить джакарту" → "Замена Jakarta и запуск робота ЕГАИС на магазине 90043"
+2. Выбери категорию:
+   - "полезный" — есть техническая проблема и/или решение, инструкция
+   - "задача" — служебное поручение без технического контекста ("напиши учётку", "проверь базу")
+   - "оффтоп" — пустые диалоги, приветствия, нетехническая переписка
+   - "неясно" — слишком мало информации для понимания
+3. Кратко объясни выбор (1 предложение)
+
+Ответь ТОЛЬКО JSON массивом, по одному объекту на каждый диалог:
+[{"id": 1, "new_title": "...", "category": "полезный|задача|оффтоп|неясно", "reason": "..."}]"""
+
+# Пачка вместе с системным промптом и ответом должна поместиться в контекст модели
+# (LLM_CONTEXT_TOKENS), иначе начало промпта — инструкции и формат JSON — обрежется
+MAX_BATCH_TOKEN_BUDGET = (
+    LLM_CONTEXT_TOKENS
+    - len(SYSTEM_PROMPT) // 4
+    - ANSWER_TOKENS_PER_DIALOGUE * BATCH_MAX_DIALOGUES
+    - CONTEXT_MARGIN_TOKENS
+)
+BATCH_TOKEN_BUDGET = min(3000, MAX_BATCH_TOKEN_BUDGET)
+
+JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+TITLE_LINE_RE = re.compile(r'^#\s+.+?$', re.MULTILINE)
+
+
+def parse_markdown_dialogues(md_file: str, limit: int = None) -> List[Dict]:
+    """
+    Парсинг markdown файла с диалогами
+
+    Возвращает список диалогов:
+    [{"original_title", "date", "content", "section", "hash"}, ...]
+    где section — исходный текст секции, hash — ключ кэша результатов
+    """
+    with open(md_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    dialogues = []
+
+    # Секции разделены строкой --- (см. parse_telegram_chat.process_chat)
+    for idx, section in enumerate(content.split('\n---\n')):
+        section = section.strip()
+        if not section:
+            continue
+
+        title_match = re.search(r'^#\s+(.+?)$', section, re.MULTILINE)
+        title = title_match.group(1).strip() if title_match else f"Диалог {idx + 1}"
+
+        date_match = re.search(r'\*\*Дата:\*\*\s+(.+?)$', section, re.MULTILINE)
+        date = date_match.group(1).strip() if date_match else "неизвестно"
+
+        dialogue_match = re.search(r'\*\*Диалог:\*\*\s*\n\n(.+)', section, re.DOTALL)
+        dialogue_content = dialogue_match.group(1).strip() if dialogue_match else section
+
+        dialogues.append({
+            "original_title": title,
+            "date": date,
+            "content": dialogue_content,
+            "section": section,
+            "hash": hashlib.sha256(f"{title}\n{dialogue_content}".encode('utf-8')).hexdigest()
+        })
+
+        if limit and len(dialogues) >= limit:
+            break
+
+    return dialogues
+
+
+def load_cache(cache_file: str) -> Dict[str, Dict]:
+    """Результаты прошлых запусков: {hash диалога: результат}"""
+    results = {}
+    if not os.path.exists(cache_file):
+        return results
+    with open(cache_file, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # строка, недописанная при аварийной остановке
+            results[record['hash']] = record
+    return results
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def make_batches(dialogues: List[Dict], token_budget: int, max_dialogues: int) -> List[List[Dict]]:
+    """Жадная упаковка диалогов в пачки не больше token_budget токенов"""
+    batches = []
+    current, current_tokens = [], 0
+    for dialogue in dialogues:
+        tokens = estimate_tokens(dialogue['content'][:DIALOGUE_MAX_CHARS]) + estimate_tokens(dialogue['original_title'])
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_dialogues):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(dialogue)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_prompt(batch: List[Dict]) -> str:
+    """Диалоги пачки с номерами 1..N (номер — id в ответе модели)"""
+    items = [
+        {
+            "id": number,
+            "original_title": dialogue['original_title'],
+            "content": dialogue['content'][:DIALOGUE_MAX_CHARS]
+        }
+        for number, dialogue in enumerate(batch, 1)
+    ]
+    return "Диалоги для обработки:\n\n" + json.dumps(items, ensure_ascii=False, indent=2)
+
+
+def parse_answer(answer: str, batch: List[Dict]) -> Dict[str, Dict]:
+    """
+    Корректные результаты из ответа модели: {hash диалога: результат}
+
+    Объекты с неизвестным id, пустым заголовком или категорией вне
+    CATEGORIES пропускаются — такие диалоги уйдут на повтор.
+    """
+    match = JSON_ARRAY_RE.search(answer)
+    if not match:
+        return {}
+    try:
+        items = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        title = str(item.get('new_title') or '').strip()
+        category = str(item.get('category') or '').strip().lower()
+        if not 1 <= number <= len(batch) or not title or category not in CATEGORIES:
+            continue
+        dialogue = batch[number - 1]
+        results[dialogue['hash']] = {
+            'hash': dialogue['hash'],
+            'original_title': dialogue['original_title'],
+            'new_title': title,
+            'category': category,
+            'reason': str(item.get('reason') or '').strip()
+        }
+    return results
+
+
+def classify_batch(llm, batch: List[Dict]) -> Dict[str, Dict]:
+    """
+    Классификация пачки с повторами
+
+    Повторно отправляются только диалоги без корректного результата,
+    мимо кэша ответов LLM (иначе вернётся тот же ответ).
+    """
+    results = {}
+    pending = batch
+    for attempt in range(MAX_ATTEMPTS):
+        answer = llm.generate(
+            prompt=build_prompt(pending),
+            system_prompt=SYSTEM_PROMPT,
+            max_tokens=ANSWER_TOKENS_PER_DIALOGUE * len(pending) + 100,
+            temperature=CLASSIFY_TEMPERATURE,
+            use_cache=attempt == 0
+        )
+        results.update(parse_answer(answer, pending))
+        pending = [dialogue for dialogue in pending if dialogue['hash'] not in results]
+        if not pending:
+            break
+    return results
+
+
+def classify_dialogues(
+    dialogues: List[Dict],
+    cache_file: str = CACHE_FILE,
+    workers: int = LLM_MAX_CONCURRENT_REQUESTS,
+    token_budget: int = BATCH_TOKEN_BUDGET,
+    llm=None
+) -> Dict[str, Dict]:
+    """
+    Классификация всех диалогов, которых ещё нет в кэше
+
+    Returns:
+        {hash диалога: результат} для всех размеченных диалогов
+    """
+    if token_budget > MAX_BATCH_TOKEN_BUDGET:
+        print(f"⚠️  Бюджет пачки {token_budget} не помещается в контекст модели ({LLM_CONTEXT_TOKENS}), "
+              f"используется {MAX_BATCH_TOKEN_BUDGET}")
+        token_budget = MAX_BATCH_TOKEN_BUDGET
+
+    results = load_cache(cache_file)
+    todo = list({d['hash']: d for d in dialogues if d['hash'] not in results}.values())
+    print(f"   В кэше: {len(dialogues) - len(todo)}, к обработке: {len(todo)}")
+    if not todo:
+        return results
+
+    llm = llm or get_llm_client()
+    batches = make_batches(todo, token_budget, BATCH_MAX_DIALOGUES)
+    print(f"🤖 Классификация: {len(batches)} пачек, потоков: {workers}")
+
+    os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+    done = 0
+    with open(cache_file, 'a', encoding='utf-8') as cache, ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(classify_batch, llm, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                batch_results = future.result()
+            except Exception as e:
+                print(f"   ⚠️  Пачка из {len(batch)} диалогов не обработана: {e}")
+                continue
+
+            # Результаты пишутся сразу: прерванный запуск продолжится с этого места
+            for record in batch_results.values():
+                cache.write(json.dumps(record, ensure_ascii=False) + '\n')
+            cache.flush()
+            results.update(batch_results)
+            done += 1
+            failed = len(batch) - len(batch_results)
+            print(f"   [{done}/{len(batches)}] размечено {len(batch_results)}"
+                  + (f", без результата {failed}" if failed else ""))
+
+    return results
+
+
+def apply_results(dialogues: List[Dict], results: Dict[str, Dict], output_file: str, keep: List[str]) -> Dict[str, int]:
+    """
+    Запись markdown с диалогами категорий keep и новыми заголовками
+
+    Диалоги без результата (не удалось разобрать ответ) сохраняются как есть.
+
+    Returns:
+        Число диалогов по категориям
+    """
+    stats = {}
+    sections = []
+    for dialogue in dialogues:
+        result = results.get(dialogue['hash'])
+        category = result['category'] if result else 'без результата'
+        stats[category] = stats.get(category, 0) + 1
+
+        if result is None:
+            sections.append(dialogue['section'])
+        elif category in keep:
+            title = result['new_title'].replace('\n', ' ')
+            sections.append(TITLE_LINE_RE.sub(lambda _: f"# {title}", dialogue['section'], count=1))
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("\n---\n\n".join(sections) + "\n")
+    return stats
+
+
+def main(md_file: str, output_file: Optional[str], keep: List[str], cache_file: str,
+         workers: int, token_budget: int, limit: int = None):
+    """Основная функция"""
+    print(f"🔍 Парсинг диалогов из {md_file}...")
+    dialogues = parse_markdown_dialogues(md_file, limit=limit)
+    print(f"   Извлечено диалогов: {len(dialogues)}")
+
+    results = classify_dialogues(dialogues, cache_file, workers, token_budget)
+
+    output_file = output_file or str(Path(md_file).with_name(f"{Path(md_file).stem}_classified.md"))
+    stats = apply_results(dialogues, results, output_file, keep)
+
+    print(f"\n✅ Готово! Файл: {output_file}")
+    for category, count in sorted(stats.items(), key=lambda item: -item[1]):
+        mark = "→" if category in keep or category == 'без результата' else "✗"
+        print(f"   {mark} {category}: {count}")
+    if stats.get('без результата'):
+        print("💡 Запустите скрипт ещё раз — диалоги без результата будут отправлены повторно")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Классификация диалогов Telegram локальной LLM")
+    parser.add_argument("--md", default=MD_FILE, help="Markdown с диалогами (parse_telegram_chat.py)")
+    parser.add_argument("--output", help="Итоговый markdown (по умолчанию <md>_classified.md)")
+    parser.add_argument("--keep", nargs="+", default=["полезный"], choices=CATEGORIES,
+                        help="Категории, которые остаются в итоговом файле")
+    parser.add_argument("--cache", default=CACHE_FILE, help="Файл результатов (кэш по хэшу диалога)")
+    parser.add_argument("--workers", type=int, default=LLM_MAX_CONCURRENT_REQUESTS,
+                        help="Одновременных запросов к модели")
+    parser.add_argument("--batch-tokens", type=int, default=BATCH_TOKEN_BUDGET, help="Бюджет пачки, токенов")
+    parser.add_argument("--limit", type=int, help="Обработать только первые N диалогов")
+    args = parser.parse_args()
+
+    main(args.md, args.output, args.keep, args.cache, args.workers, args.batch_tokens, args.limit)
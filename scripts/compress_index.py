@@ -0,0 +1,159 @@
+"""
+Скрипт сжатия индекса эмбеддингов (см. src/embedding_compression.py)
+
+1. Берёт полные векторы чанков: из metadata.db, если они там уже есть,
+   иначе из хранилища векторов (индекс ещё не сжимался)
+2. Обучает проекцию на выборке корпуса и сохраняет её в EMBEDDING_PROJECTION_FILE
+3. Записывает полные векторы в metadata.db (EMBEDDING_QUANTIZATION)
+4. Перестраивает хранилище чанков с векторами пониженной размерности
+   (через временное хранилище TMP_COLLECTION)
+5. Перестраивает индекс инструкций
+
+Если запуск прервался во время подмены основного хранилища временным,
+следующий запуск сначала завершает её (src/vector_store.py: swap_store):
+временное хранилище удаляется только после успешного копирования.
+
+Перед запуском задайте EMBEDDING_REDUCTION и EMBEDDING_REDUCED_DIM в src/config.py.
+Приложение на время перестройки лучше остановить.
+
+Запуск:
+    python scripts/compress_index.py
+    python scripts/compress_index.py --sample 50000
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.build_instruction_index import build_instruction_index
+from src.config import (
+    EMBEDDING_REDUCTION,
+    EMBEDDING_REDUCED_DIM,
+    EMBEDDING_PROJECTION_FILE,
+    EMBEDDING_QUANTIZATION
+)
+from src.embedding_compression import Projection, load_full_vectors, store_full_vectors
+from src.index_lock import index_write_lock
+from src.metadata_manager import MetadataManager
+from src.vector_store import get_vector_store, swap_pending, swap_store
+
+BATCH_SIZE = 500
+COPY_BATCH_SIZE = 5000
+TMP_COLLECTION = "documents_compact"
+
+
+def full_vectors_for_batch(conn, batch, known_instructions) -> tuple:
+    """
+    Полные векторы чанков пачки (только чанки инструкций из SQLite)
+
+    Returns:
+        Tuple (индексы чанков в пачке, матрица полных векторов)
+    """
+    stored = load_full_vectors(conn, batch['ids'])
+    positions = []
+    vectors = []
+    for i, (chunk_id, metadata) in enumerate(zip(batch['ids'], batch['metadatas'])):
+        if metadata.get('instruction_id') not in known_instructions:
+            continue
+        positions.append(i)
+        vectors.append(stored[chunk_id] if chunk_id in stored else batch['embeddings'][i])
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if len(matrix) and matrix.shape[1] <= EMBEDDING_REDUCED_DIM:
+        raise RuntimeError(
+            "В хранилище уже сжатые векторы, а полных в metadata.db нет — "
+            "загрузите документы заново"
+        )
+    return positions, matrix
+
+
+def compress_index(sample_size: int):
+    if EMBEDDING_REDUCTION is None:
+        print("❌ EMBEDDING_REDUCTION не задан в src/config.py")
+        return
+
+    if swap_pending(TMP_COLLECTION):
+        # Основное хранилище неполное: единственная полная копия — во временном
+        print(f"⚠️  Предыдущая подмена не завершена, продолжаем из {TMP_COLLECTION}")
+        print(f"✅ Хранилище чанков перестроено: {swap_store(TMP_COLLECTION, batch_size=COPY_BATCH_SIZE)} чанков")
+        build_instruction_index()
+        return
+
+    collection = get_vector_store()
+    metadata_manager = MetadataManager()
+    known_instructions = set(metadata_manager.get_active_flags())
+
+    total = collection.count()
+    print(f"Чанков в хранилище: {total}")
+    if total == 0:
+        return
+
+    # 1-3. Полные векторы -> metadata.db, выборка для обучения проекции
+    step = max(1, total // sample_size)
+    sample = []
+    skipped = 0
+    for offset in range(0, total, BATCH_SIZE):
+        batch = collection.get(include=['metadatas', 'embeddings'], limit=BATCH_SIZE, offset=offset)
+        with metadata_manager.pool.transaction() as conn:
+            positions, vectors = full_vectors_for_batch(conn, batch, known_instructions)
+            skipped += len(batch['ids']) - len(positions)
+            store_full_vectors(
+                conn.cursor(),
+                [batch['ids'][i] for i in positions],
+                [batch['metadatas'][i]['instruction_id'] for i in positions],
+                vectors,
+                EMBEDDING_QUANTIZATION
+            )
+        sample.extend(vectors[(offset + np.arange(len(vectors))) % step == 0])
+
+    print(f"Полные векторы сохранены ({EMBEDDING_QUANTIZATION}), выборка для обучения: {len(sample)}")
+
+    projection = Projection.fit(sample, EMBEDDING_REDUCED_DIM, EMBEDDING_REDUCTION)
+    projection.save(EMBEDDING_PROJECTION_FILE)
+    print(f"Проекция {EMBEDDING_REDUCTION} → {EMBEDDING_REDUCED_DIM} сохранена: {EMBEDDING_PROJECTION_FILE}")
+
+    # 4. Сжатые векторы во временное хранилище, затем замена основного
+    compact = get_vector_store(TMP_COLLECTION)
+    compact.drop()
+    compact = get_vector_store(TMP_COLLECTION)
+
+    written = 0
+    for offset in range(0, total, COPY_BATCH_SIZE):
+        batch = collection.get(
+            include=['documents', 'metadatas', 'embeddings'],
+            limit=COPY_BATCH_SIZE,
+            offset=offset
+        )
+        with metadata_manager.pool.connection() as conn:
+            positions, vectors = full_vectors_for_batch(conn, batch, known_instructions)
+        if not positions:
+            continue
+        compact.add(
+            ids=[batch['ids'][i] for i in positions],
+            documents=[batch['documents'][i] for i in positions],
+            metadatas=[batch['metadatas'][i] for i in positions],
+            embeddings=projection.transform(vectors).tolist()
+        )
+        written += len(positions)
+
+    print("🔁 Подмена основного хранилища (при сбое перезапустите скрипт — подмена продолжится)")
+    swap_store(TMP_COLLECTION, batch_size=COPY_BATCH_SIZE)
+    print(f"Хранилище чанков перестроено: {written} чанков")
+    if skipped:
+        print(f"Удалено чанков без инструкции в SQLite: {skipped}")
+
+    # 5. Индекс инструкций строится из новых векторов
+    build_instruction_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сжатие векторов хранилища (PCA/усечение + полные векторы в SQLite)")
+    parser.add_argument("--sample", type=int, default=20000, help="Векторов для обучения PCA")
+    args = parser.parse_args()
+
+    with index_write_lock():
+        compress_index(args.sample)
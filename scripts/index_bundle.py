@@ -0,0 +1,41 @@
+"""
+Пакет индекса для узлов поиска (см. src/index_bundle.py)
+
+На узле загрузки:
+    python scripts/index_bundle.py export /mnt/share/bundle-2026-01-01
+
+На узле поиска (приложение остановлено, RAG_READ_ONLY для скрипта не задавать):
+    python scripts/index_bundle.py import /mnt/share/bundle-2026-01-01
+    RAG_READ_ONLY=1 streamlit run src/app.py
+"""
+import argparse
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.index_bundle import export_bundle, import_bundle
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Экспорт и импорт пакета индекса")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Выгрузить базу знаний в пакет")
+    export_parser.add_argument("path", help="Каталог пакета (новый или пустой)")
+
+    import_parser = commands.add_parser("import", help="Заменить базу знаний содержимым пакета")
+    import_parser.add_argument("path", help="Каталог пакета")
+    import_parser.add_argument("--no-verify", action="store_true", help="Не проверять SHA-256 файлов")
+    import_parser.add_argument("--force", action="store_true", help="Импортировать при другой модели эмбеддингов")
+
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.command == "export":
+        export_bundle(args.path)
+    else:
+        import_bundle(args.path, verify=not args.no_verify, force=args.force)
+    print(f"Готово за {time.time() - start:.1f} с")
@@ -0,0 +1,66 @@
+"""
+Воркер фоновой загрузки документов (см. src/ingest_jobs.py)
+
+Приложение выполняет задачи в собственном потоке; отдельный процесс нужен,
+чтобы большие загрузки не занимали процесс Streamlit, или чтобы дообработать
+очередь, когда приложение остановлено. Несколько воркеров могут работать
+одновременно — задача достаётся только одному.
+
+Запуск:
+    python scripts/ingest_worker.py            # работать постоянно
+    python scripts/ingest_worker.py --once     # выполнить очередь и выйти
+    python scripts/ingest_worker.py --list     # последние задачи
+    python scripts/ingest_worker.py --enqueue data/docs/manual.docx --source-type multi_instruction --tags "1С,ЕГАИС"
+"""
+import argparse
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ingest_jobs import IngestJobQueue, IngestWorker
+
+
+def print_jobs(queue: IngestJobQueue):
+    jobs = queue.list_jobs(limit=20)
+    if not jobs:
+        print("Задач нет")
+        return
+    print(f"{'создана':<20} {'статус':<9} {'инструкций':>11} {'чанков':>7}  файл")
+    for job in jobs:
+        print(f"{job['created_at'][:19]:<20} {job['status']:<9} "
+              f"{str(job['done_items']) + '/' + str(job['total_items']):>11} {job['chunks']:>7}  "
+              f"{os.path.basename(job['file_path'])}" + (f"  ({job['error']})" if job['error'] else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Воркер очереди загрузки документов")
+    parser.add_argument("--once", action="store_true", help="Выполнить задачи из очереди и выйти")
+    parser.add_argument("--list", action="store_true", help="Показать последние задачи")
+    parser.add_argument("--enqueue", metavar="FILE", help="Поставить документ в очередь")
+    parser.add_argument("--source-type", default="single_file", choices=["single_file", "multi_instruction"])
+    parser.add_argument("--tags", default="", help="Теги через запятую (для --enqueue)")
+    parser.add_argument("--author", default="Admin")
+    args = parser.parse_args()
+
+    queue = IngestJobQueue()
+    if args.list:
+        print_jobs(queue)
+    elif args.enqueue:
+        job_id = queue.enqueue(
+            args.enqueue,
+            args.source_type,
+            tags=[tag.strip() for tag in args.tags.split(',') if tag.strip()],
+            author=args.author
+        )
+        print(f"📥 Задача {job_id} поставлена в очередь")
+    elif args.once:
+        processed = IngestWorker(queue).run_pending()
+        print(f"Выполнено задач: {processed}")
+    else:
+        print("🚀 Воркер загрузки запущен (Ctrl+C — остановка)")
+        try:
+            IngestWorker(queue).run_forever()
+        except KeyboardInterrupt:
+            pass
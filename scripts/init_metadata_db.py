@@ -9,6 +9,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.config import METADATA_DB, DATA_DIR
+from src.metadata_manager import apply_migrations
 
 def init_metadata_database():
     """Создание структуры базы данных метаданных"""
@@ -103,6 +104,10 @@ def init_metadata_database():
         )
 
     conn.commit()
+
+    # Дополнительные индексы и изменения схемы из src/metadata_manager.py
+    apply_migrations(conn)
+
     conn.close()
 
     print(f"База данных метаданных создана: {METADATA_DB}")
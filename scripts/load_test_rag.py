@@ -0,0 +1,89 @@
+"""
+Нагрузочный тест RAGPipeline.query
+
+По умолчанию использует заглушку LLM (StubBackend), поэтому работает на машинах
+без загруженной модели: измеряется поиск + очередь LLM + моделируемая генерация.
+
+Пример:
+    python scripts/load_test_rag.py --users 8 --requests 5 --backend stub
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.rag_pipeline import RAGPipeline
+
+DEFAULT_QUERIES = [
+    "Как перезапустить УТМ ЕГАИС?",
+    "Ошибка при загрузке накладных в 1С",
+    "Не печатает чек на кассе",
+    "Как обновить справочник номенклатуры?",
+    "Робот не выгружает остатки",
+]
+
+
+def percentile(values: list, p: float) -> float:
+    """Перцентиль (p от 0 до 100) без numpy"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run_load_test(backend: str, users: int, requests_per_user: int, top_k: int):
+    """Запуск параллельных пользователей и сбор латентностей"""
+    rag = RAGPipeline(llm_backend=backend)
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def user_loop(user_idx: int):
+        for i in range(requests_per_user):
+            query = DEFAULT_QUERIES[(user_idx + i) % len(DEFAULT_QUERIES)]
+            started = time.perf_counter()
+            try:
+                rag.query(query, top_k=top_k)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    print(f"🚀 Нагрузочный тест: {users} пользователей × {requests_per_user} запросов (бэкенд: {backend})")
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user_loop, args=(u,)) for u in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - started
+
+    print(f"\n✅ Готово за {total:.1f} с")
+    print(f"   Успешных запросов: {len(latencies)}, ошибок: {len(errors)}")
+    if latencies:
+        print(f"   Пропускная способность: {len(latencies) / total:.2f} запр/с")
+        print(f"   p50: {percentile(latencies, 50):.2f} с")
+        print(f"   p90: {percentile(latencies, 90):.2f} с")
+        print(f"   p99: {percentile(latencies, 99):.2f} с")
+        print(f"   max: {max(latencies):.2f} с")
+    for err in errors[:5]:
+        print(f"   ⚠️  {err}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест RAG pipeline")
+    parser.add_argument("--backend", default="stub", help="Бэкенд LLM: stub, ollama, openai")
+    parser.add_argument("--users", type=int, default=4, help="Число параллельных пользователей")
+    parser.add_argument("--requests", type=int, default=3, help="Запросов на пользователя")
+    parser.add_argument("--top-k", type=int, default=3, help="Количество документов для поиска")
+    args = parser.parse_args()
+
+    run_load_test(args.backend, args.users, args.requests, args.top_k)
@@ -0,0 +1,52 @@
+"""
+Скрипт для перевода тегов в метаданных ChromaDB в фильтруемый вид
+
+Раньше теги чанка хранились только строкой 'tags' ("ЕГАИС,1С"), по которой
+Chroma не умеет фильтровать. Скрипт добавляет каждому чанку булевы поля
+{"tag:ЕГАИС": True, ...} (см. src/storage.py::tag_metadata).
+"""
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.storage import tag_metadata
+from src.vector_store import get_vector_store
+
+BATCH_SIZE = 500
+
+
+def migrate_chunk_tags():
+    """Добавление фильтруемых полей тегов всем чанкам"""
+    collection = get_vector_store()
+    total = collection.count()
+    print(f"Чанков в коллекции: {total}")
+
+    updated = 0
+    for offset in range(0, total, BATCH_SIZE):
+        batch = collection.get(
+            include=['metadatas'],
+            limit=BATCH_SIZE,
+            offset=offset
+        )
+
+        ids = []
+        metadatas = []
+        for chunk_id, metadata in zip(batch['ids'], batch['metadatas']):
+            tags = [t.strip() for t in (metadata.get('tags') or '').split(',') if t.strip()]
+            new_fields = tag_metadata(tags)
+            if all(metadata.get(k) == v for k, v in new_fields.items()):
+                continue
+            ids.append(chunk_id)
+            metadatas.append({**metadata, **new_fields})
+
+        if ids:
+            collection.update_metadata(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+
+    print(f"Обновлено чанков: {updated}")
+
+
+if __name__ == "__main__":
+    migrate_chunk_tags()
@@ -0,0 +1,67 @@
+"""
+Скрипт переноса векторов между хранилищами (ChromaDB <-> numpy)
+
+Копирует чанки и индекс инструкций из одного хранилища в другое
+(см. src/vector_store.py). После переноса выставьте VECTOR_STORE_BACKEND
+в src/config.py. Для хранилища numpy можно сразу обучить списки IVF
+(NUMPY_INDEX_TYPE = "ivf").
+
+Запуск:
+    python scripts/migrate_vector_store.py --from chroma --to numpy
+    python scripts/migrate_vector_store.py --from chroma --to numpy --ivf-lists 256
+    python scripts/migrate_vector_store.py --to numpy --ivf-lists 256   # только IVF
+"""
+import argparse
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.index_lock import index_write_lock
+from src.storage import DOCUMENTS_COLLECTION, INSTRUCTIONS_COLLECTION
+from src.vector_store import get_vector_store, copy_store
+
+
+def migrate(source_backend: str, target_backend: str):
+    for name in (DOCUMENTS_COLLECTION, INSTRUCTIONS_COLLECTION):
+        source = get_vector_store(name, source_backend)
+        target = get_vector_store(name, target_backend)
+        target.drop()
+        target = get_vector_store(name, target_backend)
+
+        start = time.time()
+        copied = copy_store(source, target)
+        print(f"✅ {name}: {copied} записей за {time.time() - start:.1f} с ({source_backend} → {target_backend})")
+
+
+def build_ivf(n_lists: int):
+    for name in (DOCUMENTS_COLLECTION, INSTRUCTIONS_COLLECTION):
+        store = get_vector_store(name, "numpy")
+        lists = min(n_lists, store.count())
+        if lists < 2:
+            print(f"⚠️  {name}: слишком мало записей для IVF")
+            continue
+        start = time.time()
+        store.build_ivf(lists)
+        print(f"✅ {name}: IVF из {lists} списков за {time.time() - start:.1f} с")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перенос векторов между хранилищами")
+    parser.add_argument("--from", dest="source", choices=["chroma", "numpy"], help="Исходное хранилище")
+    parser.add_argument("--to", dest="target", choices=["chroma", "numpy"], required=True, help="Целевое хранилище")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="Обучить IVF с таким числом списков (только numpy)")
+    args = parser.parse_args()
+
+    if args.source and args.source == args.target:
+        parser.error("Исходное и целевое хранилища совпадают")
+    if args.ivf_lists and args.target != "numpy":
+        parser.error("IVF поддерживается только хранилищем numpy")
+
+    with index_write_lock():
+        if args.source:
+            migrate(args.source, args.target)
+        if args.ivf_lists:
+            build_ivf(args.ivf_lists)
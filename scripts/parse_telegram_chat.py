@@ -7,15 +7,50 @@
 3. Извлечение технических диалогов по ключевым словам
 4. Копирование изображений в data/images/
 5. Создание .md файла с инструкциями
+
+Экспорт в сотни мегабайт не загружается целиком: массив messages читается
+потоком (iter_messages), фильтрация идёт пачками в нескольких процессах,
+в памяти остаются только отобранные сообщения в сокращённом виде.
+
+Импорт инкрементальный: в STATE_FILE сохраняется водяной знак (последний
+обработанный id и date_unixtime сообщения), и следующий запуск берёт из
+экспорта только более новые сообщения и пишет их диалоги в отдельный файл.
+Последний диалог экспорта всегда может продолжиться: время выгрузки в
+экспорте не записано, поэтому он не выводится, а сохраняется в состоянии
+и дополняется новыми сообщениями при следующем запуске. Закрытым он
+считается, когда в экспорте появится сообщение позже него больше чем на
+DIALOGUE_TIME_WINDOW.
+
+Запуск:
+    python scripts/parse_telegram_chat.py
+    python scripts/parse_telegram_chat.py --json export/result.json --workers 4
+    python scripts/parse_telegram_chat.py --full    # вся история заново
+    python scripts/parse_telegram_chat.py --ingest --tags "1С,ЕГАИС"   # сразу в базу знаний
+
+С --ingest диалоги загружаются в базу знаний напрямую (src/ingestion.py)
+как инструкции с датой, участниками и изображениями в метаданных, без
+промежуточного .md и ручной загрузки через интерфейс. Id инструкции
+постоянный (чат + первое сообщение диалога): диалоги, уже загруженные
+прерванным запуском, повторно не загружаются. Чтобы пройти с --ingest
+всю историю заново, удалите файл состояния (--full вместе с --ingest не
+допускается): уже загруженные диалоги будут пропущены.
 """
 
+import argparse
 import json
+import multiprocessing
 import os
 import re
 import shutil
+import sys
+import uuid
+from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
+
+# Добавляем корневую директорию проекта в путь (для --ingest)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 # =============== КОНФИГУРАЦИЯ ===============
@@ -32,12 +67,26 @@ OUTPUT_FILE = "data/docs/руководитель_инструкции.md"
 # Папка для копирования изображений
 IMAGES_DIR = "data/images"
 
+# Состояние инкрементального импорта (водяной знак и незакрытый диалог)
+STATE_FILE = "data/telegram_import_state.json"
+
+# Диалогов в одной пачке при загрузке сразу в базу (--ingest):
+# диалоги короткие, поэтому пачки крупнее, чем для документов
+INGEST_BATCH_SIZE = 256
+
+# Пространство имён постоянных id инструкций-диалогов (uuid5)
+DIALOGUE_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "telegram-dialogue")
+
 # Временной интервал для группировки диалога (в секундах)
 DIALOGUE_TIME_WINDOW = 3 * 60 * 60  # 3 часа
 
 # Минимальная длина сообщения (символы)
 MIN_MESSAGE_LENGTH = 10
 
+# Потоковое чтение и фильтрация
+READ_CHUNK_SIZE = 1024 * 1024   # символов JSON за одно чтение
+FILTER_BATCH_SIZE = 5000        # сообщений в задаче процесса фильтрации
+
 # Ключевые слова для определения технических сообщений
 TECHNICAL_KEYWORDS = [
     # ЕГАИС
@@ -77,6 +126,46 @@ SKIP_PHRASES = [
     "спокойной ночи", "доброе утро", "добрый день", "пока"
 ]
 
+# Паттерны технического контента (коды ошибок, IP-адреса, версии)
+TECHNICAL_PATTERNS = [
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}',  # IP адрес
+    r'ошибк[аи]?\s*\d+',                     # "ошибка 409"
+    r'error\s*\d+',                          # "error 500"
+    r'версия\s*\d+',                         # "версия 8"
+    r'код\s*\d+',                            # "код 123"
+]
+
+
+def _keywords_pattern(keywords: List[str]) -> str:
+    """
+    Регулярное выражение-префиксное дерево для поиска любого из слов
+
+    Альтернатива из 80 слов regex проверял бы по очереди в каждой позиции;
+    дерево сравнивает каждый символ текста один раз на уровень.
+    Слово, являющееся префиксом другого, поглощает более длинное:
+    для проверки "есть ли ключевое слово" этого достаточно.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        if '' in node:
+            return ''
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    return build(trie)
+
+
+# Все ключевые слова и паттерны — одно выражение, компилируется один раз
+TECHNICAL_RE = re.compile('|'.join([_keywords_pattern(TECHNICAL_KEYWORDS)] + TECHNICAL_PATTERNS))
+WHITESPACE_RE = re.compile(r'\s+')
+SKIP_SET = frozenset(SKIP_PHRASES) | frozenset(phrase + "." for phrase in SKIP_PHRASES)
+
 
 # =============== УТИЛИТЫ ===============
 
@@ -85,7 +174,7 @@ def clean_text(text: str) -> str:
     if not text:
         return ""
     # Убираем множественные пробелы
-    text = re.sub(r'\s+', ' ', text)
+    text = WHITESPACE_RE.sub(' ', text)
     return text.strip()
 
 
@@ -101,11 +190,7 @@ def is_skip_message(text: str) -> bool:
         return True
 
     # Точное совпадение с фразами-исключениями
-    for phrase in SKIP_PHRASES:
-        if text_lower == phrase or text_lower == phrase + ".":
-            return True
-
-    return False
+    return text_lower in SKIP_SET
 
 
 def has_technical_content(text: str) -> bool:
@@ -113,27 +198,8 @@ def has_technical_content(text: str) -> bool:
     if not text:
         return False
 
-    text_lower = text.lower()
-
-    # Ищем ключевые слова
-    for keyword in TECHNICAL_KEYWORDS:
-        if keyword in text_lower:
-            return True
-
-    # Ищем паттерны (коды ошибок, IP-адреса, версии)
-    patterns = [
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}',  # IP адрес
-        r'ошибк[аи]?\s*\d+',                     # "ошибка 409"
-        r'error\s*\d+',                          # "error 500"
-        r'версия\s*\d+',                         # "версия 8"
-        r'код\s*\d+',                            # "код 123"
-    ]
-
-    for pattern in patterns:
-        if re.search(pattern, text_lower):
-            return True
-
-    return False
+    # Ключевые слова и паттерны за один проход
+    return TECHNICAL_RE.search(text.lower()) is not None
 
 
 def format_datetime(unix_timestamp: str) -> str:
@@ -147,65 +213,175 @@ def format_datetime(unix_timestamp: str) -> str:
 
 # =============== ОСНОВНАЯ ЛОГИКА ===============
 
-def load_json(filepath: str) -> Dict:
-    """Загрузка JSON файла"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+class JSONStream:
+    """Буферизованное чтение JSON из файла по одному значению"""
+
+    def __init__(self, f, chunk_size: int = READ_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Дочитывание файла в буфер (прочитанная часть отбрасывается)"""
+        data = self.f.read(self.chunk_size)
+        if not data:
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Следующий значащий символ (пробелы пропускаются), '' в конце файла"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Ожидался '{char}', найдено '{found or 'конец файла'}'")
+        self.pos += 1
+
+    def skip_comma(self):
+        if self.peek() == ',':
+            self.pos += 1
+
+    def value(self):
+        """Следующее JSON-значение целиком"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # значение обрезано концом буфера
+                if not self._fill():
+                    raise
+                continue
+            # число на границе буфера могло быть обрезано ("12" из "123")
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
 
 
-def filter_messages(messages: List[Dict]) -> List[Dict]:
+def iter_messages(filepath: str, header: Dict = None) -> Iterator[Dict]:
+    """
+    Сообщения экспорта по одному, без загрузки файла целиком
+
+    Поля верхнего уровня кроме messages (имя чата, id) небольшие:
+    они записываются в header, если он передан.
+    """
+    with open(filepath, 'r', encoding='utf-8-sig') as f:
+        stream = JSONStream(f)
+        stream.expect('{')
+        while stream.peek() != '}':
+            key = stream.value()
+            stream.expect(':')
+            if key == 'messages':
+                stream.expect('[')
+                while stream.peek() != ']':
+                    yield stream.value()
+                    stream.skip_comma()
+                stream.expect(']')
+            else:
+                value = stream.value()
+                if header is not None:
+                    header[key] = value
+            stream.skip_comma()
+
+
+def filter_message(msg: Dict) -> Optional[Dict]:
     """
-    Фильтрация сообщений:
+    Отбор одного сообщения:
     - Удаляем стикеры, служебные сообщения
     - Удаляем короткие и неинформативные
     - Оставляем только технические
-    """
-    filtered = []
-
-    for msg in messages:
-        # Пропускаем стикеры
-        if msg.get('media_type') == 'sticker':
-            continue
-
-        # Пропускаем голосовые
-        if msg.get('media_type') == 'voice_message':
-            continue
 
-        # Пропускаем служебные
-        if msg.get('type') != 'message':
-            continue
+    Returns:
+        Сокращённое сообщение (нужные дальше поля) или None
+    """
+    # Пропускаем стикеры и голосовые
+    if msg.get('media_type') in ('sticker', 'voice_message'):
+        return None
 
-        # Извлекаем текст
-        text = msg.get('text', '')
-        if isinstance(text, list):
-            # Иногда text - это массив объектов
-            text = ' '.join([t.get('text', '') if isinstance(t, dict) else str(t) for t in text])
+    # Пропускаем служебные
+    if msg.get('type') != 'message':
+        return None
 
-        text = clean_text(text)
+    # Извлекаем текст
+    text = msg.get('text', '')
+    if isinstance(text, list):
+        # Иногда text - это массив объектов
+        text = ' '.join([t.get('text', '') if isinstance(t, dict) else str(t) for t in text])
 
-        # Есть ли фото?
-        has_photo = 'photo' in msg
+    text = clean_text(text)
 
-        # Если есть фото - оставляем даже без текста
-        if has_photo:
-            msg['cleaned_text'] = text
-            msg['has_photo'] = True
-            filtered.append(msg)
-            continue
+    # Есть ли фото?
+    has_photo = 'photo' in msg
 
+    # Если есть фото - оставляем даже без текста
+    if not has_photo:
         # Проверяем текст
         if is_skip_message(text):
-            continue
+            return None
 
         # Проверяем технический контент
         if not has_technical_content(text):
-            continue
+            return None
+
+    return {
+        'id': msg.get('id'),
+        'date_unixtime': msg.get('date_unixtime', '0'),
+        'from': msg.get('from', 'Unknown'),
+        'photo': msg.get('photo'),
+        'cleaned_text': text,
+        'has_photo': has_photo
+    }
+
+
+def filter_batch(messages: List[Dict]) -> List[Dict]:
+    """Отбор пачки сообщений (выполняется в процессе пула)"""
+    return [filtered for filtered in map(filter_message, messages) if filtered is not None]
 
-        # Добавляем очищенный текст
-        msg['cleaned_text'] = text
-        msg['has_photo'] = False
-        filtered.append(msg)
 
+def iter_batches(messages: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for msg in messages:
+        batch.append(msg)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def filter_messages(messages: Iterable[Dict], workers: int = 1) -> List[Dict]:
+    """
+    Фильтрация сообщений пачками, при workers > 1 — в пуле процессов
+
+    Порядок сообщений сохраняется. В работе одновременно не больше
+    2 × workers пачек, поэтому чтение не уходит вперёд фильтрации
+    и память не растёт с размером экспорта.
+    """
+    batches = iter_batches(messages, FILTER_BATCH_SIZE)
+    if workers <= 1:
+        return [msg for batch in batches for msg in filter_batch(batch)]
+
+    filtered = []
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(filter_batch, (batch,)))
+            if len(pending) >= 2 * workers:
+                filtered.extend(pending.popleft().get())
+        while pending:
+            filtered.extend(pending.popleft().get())
     return filtered
 
 
@@ -264,9 +440,9 @@ def extract_topic(dialogue: List[Dict]) -> str:
 def copy_images(dialogue: List[Dict], dialogue_idx: int) -> List[str]:
     """
     Копирование изображений из диалога в data/images/
-    Возвращает список плейсхолдеров для .md файла
+    Возвращает пути к изображениям относительно корня проекта
     """
-    image_placeholders = []
+    image_paths = []
 
     for msg_idx, msg in enumerate(dialogue):
         if not msg.get('has_photo'):
@@ -286,9 +462,12 @@ def copy_images(dialogue: List[Dict], dialogue_idx: int) -> List[str]:
                 print(f"⚠️  Изображение не найдено: {photo_path}")
                 continue
 
-        # Создаём уникальное имя для изображения
+        # Имя по id сообщения не меняется между запусками инкрементального импорта
         ext = source_path.suffix
-        new_name = f"telegram_d{dialogue_idx}_m{msg_idx}{ext}"
+        if msg.get('id') is not None:
+            new_name = f"telegram_{msg['id']}{ext}"
+        else:
+            new_name = f"telegram_d{dialogue_idx}_m{msg_idx}{ext}"
 
         # Путь назначения
         dest_path = Path(IMAGES_DIR) / new_name
@@ -296,34 +475,29 @@ def copy_images(dialogue: List[Dict], dialogue_idx: int) -> List[str]:
         # Создаём папку если не существует
         dest_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # Копируем файл
+        # Уже скопированное пропускаем, новое — жёсткая ссылка (копия, если не получилось)
         try:
-            shutil.copy2(source_path, dest_path)
-            # Относительный путь для плейсхолдера
-            rel_path = f"images/{new_name}"
-            image_placeholders.append(f"[[image: {rel_path}]]")
+            if not (dest_path.exists() and dest_path.stat().st_size == source_path.stat().st_size):
+                if dest_path.exists():
+                    dest_path.unlink()
+                try:
+                    os.link(source_path, dest_path)
+                except OSError:
+                    shutil.copy2(source_path, dest_path)
+            image_paths.append(f"{IMAGES_DIR}/{new_name}")
         except Exception as e:
             print(f"⚠️  Ошибка копирования {source_path}: {e}")
 
-    return image_placeholders
+    return image_paths
 
 
-def format_dialogue_to_markdown(dialogue: List[Dict], dialogue_idx: int) -> str:
+def format_dialogue_body(dialogue: List[Dict], images: List[str]) -> str:
     """
-    Форматирование диалога в markdown инструкцию
+    Текст диалога без заголовка: дата, скриншоты, реплики
     """
-    if not dialogue:
-        return ""
-
-    # Заголовок
-    topic = extract_topic(dialogue)
-
     # Дата
     first_date = format_datetime(dialogue[0].get('date_unixtime', '0'))
 
-    # Копируем изображения
-    images = copy_images(dialogue, dialogue_idx)
-
     # Собираем текст диалога
     conversation = []
     for msg in dialogue:
@@ -333,15 +507,13 @@ def format_dialogue_to_markdown(dialogue: List[Dict], dialogue_idx: int) -> str:
         if text or msg.get('has_photo'):
             conversation.append(f"**{author}:** {text}")
 
-    # Формируем markdown
-    md = f"# {topic}\n\n"
-    md += f"**Дата:** {first_date}\n\n"
+    md = f"**Дата:** {first_date}\n\n"
 
     # Добавляем изображения в начало (если есть)
     if images:
         md += "**Скриншоты:**\n"
         for img in images:
-            md += f"{img}\n"
+            md += f"[[image: {img}]]\n"
         md += "\n"
 
     # Добавляем диалог
@@ -352,30 +524,234 @@ def format_dialogue_to_markdown(dialogue: List[Dict], dialogue_idx: int) -> str:
     return md
 
 
-def process_chat(json_file: str, output_file: str):
+def format_dialogue_to_markdown(dialogue: List[Dict], dialogue_idx: int) -> str:
     """
-    Основная функция обработки чата
+    Форматирование диалога в markdown инструкцию
     """
-    print("🚀 Начинаем обработку Telegram чата...")
+    if not dialogue:
+        return ""
+
+    # Заголовок
+    topic = extract_topic(dialogue)
+
+    # Копируем изображения
+    images = copy_images(dialogue, dialogue_idx)
+
+    return f"# {topic}\n\n" + format_dialogue_body(dialogue, images)
+
 
-    # Загружаем JSON
-    print(f"📂 Загружаем {json_file}...")
-    data = load_json(json_file)
-    messages = data.get('messages', [])
-    print(f"   Всего сообщений: {len(messages)}")
+def dialogue_instruction_id(dialogue: List[Dict], chat_id) -> str:
+    """Постоянный id инструкции диалога: по чату и первому сообщению"""
+    first = dialogue[0]
+    key = first.get('id') if first.get('id') is not None else first.get('date_unixtime')
+    return str(uuid.uuid5(DIALOGUE_ID_NAMESPACE, f"{chat_id}:{key}"))
 
-    # Фильтруем сообщения
-    print("🔍 Фильтруем технические сообщения...")
-    filtered = filter_messages(messages)
-    print(f"   Осталось после фильтрации: {len(filtered)} ({len(filtered)/len(messages)*100:.1f}%)")
 
-    # Группируем в диалоги
+def dialogue_to_instruction(
+    dialogue: List[Dict],
+    dialogue_idx: int,
+    doc_id: str,
+    source_file: str,
+    tags: List[str],
+    chat_id=''
+) -> Dict:
+    """
+    Диалог в формате инструкции docs_parser.parse_document (для src/ingestion.py)
+
+    Дата, участники и число сообщений попадают в метаданные чанков
+    (extra_metadata), изображения — в список images инструкции.
+    """
+    images = copy_images(dialogue, dialogue_idx)
+    participants = ', '.join(dict.fromkeys(msg.get('from') or 'Unknown' for msg in dialogue))
+    first_time = int(dialogue[0].get('date_unixtime', 0))
+
+    return {
+        'id': dialogue_instruction_id(dialogue, chat_id),
+        'doc_id': doc_id,
+        'title': extract_topic(dialogue),
+        'file_path': source_file,
+        'file_format': 'json',
+        'source_type': 'telegram',
+        'separator_index': dialogue[0].get('id'),
+        'text': format_dialogue_body(dialogue, images),
+        'tags': tags,
+        'author': participants,
+        'images': images,
+        'extra_metadata': {
+            'date': format_datetime(first_time),
+            'date_unixtime': first_time,
+            'participants': participants,
+            'message_count': len(dialogue),
+        }
+    }
+
+
+def ingest_dialogues(
+    dialogues: List[List[Dict]],
+    source_file: str,
+    tags: List[str],
+    batch_size: int,
+    chat_id=''
+) -> Tuple[int, int]:
+    """
+    Загрузка диалогов сразу в базу знаний, без промежуточного .md
+
+    Диалоги, инструкции которых уже есть в базе (по постоянному id),
+    пропускаются.
+
+    Returns:
+        Tuple (число загруженных инструкций, число записанных чанков)
+    """
+    # Модули RAG нужны только здесь (процессам фильтрации они не нужны)
+    from src.config import EMBEDDING_MODEL_NAME
+    from src.ingestion import ingest_instructions
+    from src.metadata_manager import MetadataManager
+    from src.model_registry import get_embedding_model
+
+    known = MetadataManager().get_active_flags()
+    pending = [
+        (idx, dialogue) for idx, dialogue in enumerate(dialogues)
+        if dialogue_instruction_id(dialogue, chat_id) not in known
+    ]
+    if len(pending) < len(dialogues):
+        print(f"   Диалогов уже в базе знаний: {len(dialogues) - len(pending)} — пропускаем")
+    if not pending:
+        return 0, 0
+
+    doc_id = str(uuid.uuid4())  # Общий doc_id для диалогов одного запуска
+    instructions = [
+        dialogue_to_instruction(dialogue, idx, doc_id, source_file, tags, chat_id)
+        for idx, dialogue in pending
+    ]
+
+    def show_progress(instruction, chunk_count):
+        print(f"   ✓ {instruction['title']} ({chunk_count} чанков)")
+
+    chunk_count = ingest_instructions(
+        instructions,
+        embedding_model=get_embedding_model(EMBEDDING_MODEL_NAME),
+        batch_size=batch_size,
+        on_progress=show_progress
+    )
+    return len(instructions), chunk_count
+
+
+def empty_state() -> Dict:
+    return {'last_message_id': None, 'last_date_unixtime': 0, 'open_dialogue': []}
+
+
+def load_state(state_file: str) -> Dict:
+    """Состояние инкрементального импорта (пустое при первом запуске)"""
+    if os.path.exists(state_file):
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return empty_state()
+
+
+def save_state(state_file: str, state: Dict):
+    Path(state_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{state_file}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(f"{state_file}.tmp", state_file)
+
+
+def is_new_message(msg: Dict, state: Dict) -> bool:
+    """Сообщение новее водяного знака (по id, для старых экспортов — по времени)"""
+    if state['last_message_id'] is not None and isinstance(msg.get('id'), int):
+        return msg['id'] > state['last_message_id']
+    return int(msg.get('date_unixtime', 0)) > state['last_date_unixtime']
+
+
+def split_open_dialogue(dialogues: List[List[Dict]]) -> Tuple[List[List[Dict]], List[Dict]]:
+    """
+    Отделение последнего диалога: он мог продолжиться после выгрузки экспорта
+
+    Сравнивать с текущим временем нельзя — импорт может идти через часы
+    после выгрузки. Диалог закрывает только следующее сообщение позже
+    DIALOGUE_TIME_WINDOW (тогда он уже не последний).
+
+    Returns:
+        Tuple (закрытые диалоги, незакрытый диалог или [])
+    """
+    if dialogues:
+        return dialogues[:-1], dialogues[-1]
+    return dialogues, []
+
+
+def process_chat(
+    json_file: str,
+    output_file: str,
+    workers: int = 1,
+    incremental: bool = True,
+    state_file: str = STATE_FILE,
+    ingest: bool = False,
+    tags: List[str] = None,
+    batch_size: int = INGEST_BATCH_SIZE
+):
+    """
+    Основная функция обработки чата
+
+    Args:
+        incremental: Только сообщения новее водяного знака, диалоги — в новый
+            файл <output_file>_<дата>.md; иначе вся история в output_file
+        ingest: Загрузить диалоги сразу в базу знаний вместо .md файла
+        tags: Теги инструкций (при ingest)
+        batch_size: Диалогов в одной пачке эмбеддингов/записи (при ingest)
+    """
+    print("🚀 Начинаем обработку Telegram чата...")
+
+    state = load_state(state_file) if incremental else empty_state()
+    if incremental and state['last_date_unixtime']:
+        print(f"   Водяной знак: сообщение {state['last_message_id']} "
+              f"от {format_datetime(state['last_date_unixtime'])}")
+
+    # Читаем JSON потоком и сразу фильтруем
+    print(f"📂 Читаем {json_file}, фильтруем технические сообщения (процессов: {workers})...")
+    total = 0
+    new_total = 0
+    watermark = {'last_message_id': state['last_message_id'], 'last_date_unixtime': state['last_date_unixtime']}
+
+    def new_messages(messages):
+        nonlocal total, new_total
+        for msg in messages:
+            total += 1
+            if not is_new_message(msg, state):
+                continue
+            new_total += 1
+            if isinstance(msg.get('id'), int):
+                watermark['last_message_id'] = max(watermark['last_message_id'] or 0, msg['id'])
+            watermark['last_date_unixtime'] = max(watermark['last_date_unixtime'], int(msg.get('date_unixtime', 0)))
+            yield msg
+
+    header = {}
+    filtered = filter_messages(new_messages(iter_messages(json_file, header)), workers)
+    print(f"   Всего сообщений: {total}, новых: {new_total}")
+    print(f"   Осталось после фильтрации: {len(filtered)} ({len(filtered)/max(new_total, 1)*100:.1f}%)")
+
+    # Группируем в диалоги (незакрытый диалог прошлого запуска продолжается новыми сообщениями)
     print("📊 Группируем в диалоги...")
-    dialogues = group_into_dialogues(filtered)
+    dialogues = group_into_dialogues(state['open_dialogue'] + filtered)
+    open_dialogue = []
+    if incremental:
+        dialogues, open_dialogue = split_open_dialogue(dialogues)
     print(f"   Создано диалогов: {len(dialogues)}")
+    if open_dialogue:
+        print(f"   Последний диалог ({len(open_dialogue)} сообщений) ещё не закончен — будет дополнен в следующий раз")
+
+    if ingest:
+        instruction_count, chunk_count = 0, 0
+        if dialogues:
+            print(f"📥 Загружаем диалоги в базу знаний (пачками по {batch_size})...")
+            instruction_count, chunk_count = ingest_dialogues(
+                dialogues, json_file, tags or [], batch_size, chat_id=header.get('id', '')
+            )
+
+        # Состояние сохраняется только после записи в базу
+        save_state(state_file, {**watermark, 'open_dialogue': open_dialogue})
+        print(f"\n✅ Загружено инструкций: {instruction_count}, чанков: {chunk_count}")
+        return
 
     # Генерируем markdown
-    print("📝 Создаём markdown файл...")
     markdown_content = []
 
     for idx, dialogue in enumerate(dialogues):
@@ -383,19 +759,32 @@ def process_chat(json_file: str, output_file: str):
         if md:
             markdown_content.append(md)
 
-    # Объединяем с разделителем
-    final_md = "\n---\n\n".join(markdown_content)
-
-    # Сохраняем файл
     output_path = Path(output_file)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if incremental:
+        output_path = output_path.with_name(f"{output_path.stem}_{datetime.now():%Y%m%d_%H%M%S}{output_path.suffix}")
+
+    if markdown_content:
+        print("📝 Создаём markdown файл...")
+
+        # Объединяем с разделителем
+        final_md = "\n---\n\n".join(markdown_content)
+
+        # Сохраняем файл
+        output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(final_md)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(final_md)
+
+    # Состояние сохраняется только после записи результата
+    save_state(state_file, {**watermark, 'open_dialogue': open_dialogue})
+
+    if not markdown_content:
+        print("\n✅ Новых диалогов нет")
+        return
 
     print(f"\n✅ Готово!")
     print(f"   Создано инструкций: {len(markdown_content)}")
-    print(f"   Выходной файл: {output_file}")
+    print(f"   Выходной файл: {output_path}")
     print(f"   Размер файла: {output_path.stat().st_size / 1024:.1f} КБ")
     print(f"\n💡 Следующий шаг: просмотрите файл и уберите лишнее вручную (~30-40% ручной работы)")
 
@@ -403,11 +792,36 @@ def process_chat(json_file: str, output_file: str):
 # =============== ЗАПУСК ===============
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Парсинг экспорта Telegram чата в инструкции")
+    parser.add_argument("--json", default=JSON_FILE, help="Файл экспорта result.json")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Выходной .md файл")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Процессов фильтрации")
+    parser.add_argument("--full", action="store_true", help="Обработать всю историю заново (водяной знак сбрасывается)")
+    parser.add_argument("--state", default=STATE_FILE, help="Файл состояния инкрементального импорта")
+    parser.add_argument("--ingest", action="store_true", help="Загрузить диалоги сразу в базу знаний (без .md)")
+    parser.add_argument("--tags", default="", help="Теги инструкций через запятую (для --ingest)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Диалогов в пачке (для --ingest)")
+    args = parser.parse_args()
+
+    if args.full and args.ingest:
+        # Вся история в базу — это инкрементальный импорт с пустым состоянием:
+        # уже загруженные диалоги узнаются по id и пропускаются
+        parser.error("--full нельзя сочетать с --ingest: для повторного импорта удалите файл состояния (--state)")
+
     # Проверяем наличие JSON файла
-    if not os.path.exists(JSON_FILE):
-        print(f"❌ Файл {JSON_FILE} не найден!")
+    if not os.path.exists(args.json):
+        print(f"❌ Файл {args.json} не найден!")
         print(f"   Убедитесь, что result.json находится в корне проекта")
         exit(1)
 
     # Запускаем обработку
-    process_chat(JSON_FILE, OUTPUT_FILE)
+    process_chat(
+        args.json,
+        args.output,
+        args.workers,
+        incremental=not args.full,
+        state_file=args.state,
+        ingest=args.ingest,
+        tags=[tag.strip() for tag in args.tags.split(',') if tag.strip()],
+        batch_size=args.batch_size
+    )
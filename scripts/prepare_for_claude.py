@@ -1,171 +0,0 @@
-"""
-Скрипт для подготовки диалогов для обработки через Claude Sonnet 4.5
-
-Создаёт JSON файл с первыми 50 диалогами для теста
-"""
-
-import re
-import json
-from pathlib import Path
-
-
-def parse_markdown_dialogues(md_file: str, limit: int = None) -> list:
-    """
-    Парсинг markdown файла с диалогами
-
-    Возвращает список диалогов в формате:
-    [
-        {
-            "id": 1,
-            "title": "Заголовок",
-            "date": "2023-02-16 05:25",
-            "content": "текст диалога"
-        },
-        ...
-    ]
-    """
-    with open(md_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Разделяем по ---
-    sections = content.split('\n---\n')
-
-    dialogues = []
-
-    for idx, section in enumerate(sections):
-        if not section.strip():
-            continue
-
-        # Извлекаем заголовок (первая строка с #)
-        title_match = re.search(r'^#\s+(.+?)$', section, re.MULTILINE)
-        title = title_match.group(1).strip() if title_match else f"Диалог {idx+1}"
-
-        # Извлекаем дату
-        date_match = re.search(r'\*\*Дата:\*\*\s+(.+?)$', section, re.MULTILINE)
-        date = date_match.group(1).strip() if date_match else "неизвестно"
-
-        # Извлекаем диалог (всё после "**Диалог:**")
-        dialogue_match = re.search(r'\*\*Диалог:\*\*\s*\n\n(.+)', section, re.DOTALL)
-        dialogue_content = dialogue_match.group(1).strip() if dialogue_match else section
-
-        dialogues.append({
-            "id": idx + 1,
-            "original_title": title,
-            "date": date,
-            "content": dialogue_content
-        })
-
-        if limit and len(dialogues) >= limit:
-            break
-
-    return dialogues
-
-
-def create_claude_prompt(dialogues: list) -> str:
-    """
-    Создание промпта для Claude
-    """
-    prompt = """Привет! Я обрабатываю экспорт чата техподдержки из Telegram. Получилось 428 диалогов, но многие из них — служебная переписка, задачи или оффтоп.
-
-Мне нужна твоя помощь в обработке диалогов. Вот что нужно сделать:
-
-## Задача:
-
-Для каждого диалога:
-
-1. **Сгенерировать понятный заголовок** (максимум 10 слов):
-   - Заголовок должен отражать СУТЬ проблемы/задачи
-   - Избегать опечаток и сокращений
-   - Примеры хороших заголовков:
-     - ❌ "Со с роботом 027?"
-     - ✅ "Проблема с роботом на магазине 027"
-     - ❌ "90043 заменить джакарту"
-     - ✅ "Замена Jakarta и запуск робота ЕГАИС на магазине 90043"
-
-2. **Классифицировать диалог** в одну из категорий:
-   - **"полезный"** — есть техническая проблема и/или решение, инструкция
-   - **"задача"** — служебное поручение без технического контекста (например, "напиши учётку", "проверь базу")
-   - **"оффтоп"** — пустые диалоги, приветствия, нетехническая переписка
-   - **"неясно"** — слишком мало информации для понимания
-
-3. **Кратко объяснить** почему выбрана эта категория (1 предложение)
-
-## Контекст:
-
-Это чат между руководителем (Стас) и техподдержкой (ЕГАИС/1С).
-Технические термины: ЕГАИС, УТМ, робот, марки, 1С, Jakarta, база, магазин (номера магазинов), FTP.
-
-## Формат ответа:
-
-Верни результат в виде **JSON массива**:
-
-```json
-[
-  {
-    "id": 1,
-    "original_title": "...",
-    "new_title": "...",
-    "category": "полезный|задача|оффтоп|неясно",
-    "reason": "Почему такая категория (1 предложение)"
-  },
-  ...
-]
-```
-
-**ВАЖНО:** Ответь ТОЛЬКО JSON массивом, без дополнительных комментариев до или после.
-
----
-
-## Диалоги для обработки:
-
-"""
-
-    # Добавляем диалоги в формате JSON для удобства
-    prompt += "```json\n"
-    prompt += json.dumps(dialogues, ensure_ascii=False, indent=2)
-    prompt += "\n```\n"
-
-    return prompt
-
-
-def main():
-    """Основная функция"""
-
-    MD_FILE = "data/docs/руководитель_инструкции.md"
-    OUTPUT_JSON = "temp_claude_dialogues.json"
-    OUTPUT_PROMPT = "temp_claude_prompt.txt"
-
-    # Количество диалогов для теста
-    TEST_LIMIT = 50  # Начнём с 50 диалогов
-
-    print(f"🔍 Парсинг диалогов из {MD_FILE}...")
-    dialogues = parse_markdown_dialogues(MD_FILE, limit=TEST_LIMIT)
-    print(f"   Извлечено диалогов: {len(dialogues)}")
-
-    # Сохраняем диалоги в JSON
-    print(f"💾 Сохранение диалогов в {OUTPUT_JSON}...")
-    with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
-        json.dump(dialogues, f, ensure_ascii=False, indent=2)
-
-    # Создаём промпт для Claude
-    print(f"📝 Создание промпта для Claude...")
-    prompt = create_claude_prompt(dialogues)
-
-    # Сохраняем промпт
-    with open(OUTPUT_PROMPT, 'w', encoding='utf-8') as f:
-        f.write(prompt)
-
-    print(f"\n✅ Готово!")
-    print(f"   Файл с промптом: {OUTPUT_PROMPT}")
-    print(f"   Размер промпта: {len(prompt)} символов (~{len(prompt)//4} токенов)")
-    print(f"\n📋 Следующие шаги:")
-    print(f"   1. Открой файл: {OUTPUT_PROMPT}")
-    print(f"   2. Скопируй весь текст")
-    print(f"   3. Перейди на https://claude.ai")
-    print(f"   4. Вставь промпт в новый чат")
-    print(f"   5. Дождись ответа от Claude")
-    print(f"   6. Скопируй JSON ответ и сохрани в файл 'claude_response.json'")
-
-
-if __name__ == "__main__":
-    main()
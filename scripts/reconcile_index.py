@@ -0,0 +1,39 @@
+"""
+Скрипт для поиска и исправления расхождений между SQLite и ChromaDB
+
+Проверяет флаг active у всех чанков и записей индекса инструкций
+относительно таблицы instructions, находит чанки без инструкции, инструкции
+без чанков и инструкции, которых нет в индексе инструкций.
+
+Запуск:
+    python scripts/reconcile_index.py            # исправить расхождения
+    python scripts/reconcile_index.py --dry-run  # только отчёт
+"""
+import os
+import sys
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.index_sync import reconcile_active_flags
+
+
+if __name__ == "__main__":
+    dry_run = "--dry-run" in sys.argv
+
+    report = reconcile_active_flags(fix=not dry_run)
+
+    print(f"Проверено чанков: {report['checked_chunks']}")
+    print(f"Чанков с неверным флагом active: {report['mismatched_chunks']}")
+    if not dry_run:
+        print(f"Исправлено чанков: {report['fixed_chunks']}")
+    print(f"Чанков без инструкции в SQLite: {len(report['orphan_chunks'])}")
+    print(f"Инструкций без чанков в ChromaDB: {len(report['instructions_without_chunks'])}")
+    print(f"Записей индекса инструкций с неверным флагом active: {report['mismatched_index_entries']}")
+    if not dry_run:
+        print(f"Исправлено записей индекса инструкций: {report['fixed_index_entries']}")
+    print(f"Записей индекса без инструкции в SQLite: {len(report['orphan_index_entries'])}")
+    missing = report['instructions_missing_from_index']
+    print(f"Инструкций с чанками, но без записи в индексе инструкций: {len(missing)}")
+    if missing or report['orphan_index_entries']:
+        print("   Перестройте индекс: python scripts/build_instruction_index.py")
@@ -0,0 +1,129 @@
+"""
+Скрипт переиндексации: заново считает эмбеддинги всех чанков
+
+Нужен после смены модели эмбеддингов, префиксов e5 / нормировки
+(EMBEDDING_* в src/config.py) или параметров индекса (VECTOR_SPACE, HNSW_*):
+ChromaDB применяет их только при создании коллекции. Тексты и метаданные
+чанков берутся из текущего хранилища, документы заново не разбираются.
+
+Если включено сжатие эмбеддингов, после смены модели или префиксов
+переобучите проекцию: scripts/compress_index.py.
+
+Новые векторы пишутся во временное хранилище (TMP_COLLECTION), затем оно
+подменяет основное. Прерванный запуск продолжается: уже пересчитанные
+чанки временного хранилища не кодируются заново, а если прервалась
+подмена (основное хранилище уже очищено), она выполняется повторно из
+временного хранилища — оно удаляется только после успешного копирования
+(src/vector_store.py: swap_store).
+
+Запуск:
+    python scripts/reembed_index.py
+    python scripts/reembed_index.py --restart   # начать заново, удалив временное хранилище
+"""
+import argparse
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.build_instruction_index import build_instruction_index
+from src.config import EMBEDDING_MODEL_NAME
+from src.embedding_compression import get_embedding_codec, store_full_vectors
+from src.embeddings import EmbeddingModel
+from src.index_lock import index_write_lock
+from src.metadata_manager import MetadataManager
+from src.vector_store import get_vector_store, swap_pending, swap_store
+
+# Чанков за один проход: чтение, эмбеддинги и запись
+BATCH_SIZE = 5000
+TMP_COLLECTION = "documents_reembed"
+
+
+def swap_in() -> int:
+    print("🔁 Подмена основного хранилища (при сбое перезапустите скрипт — подмена продолжится)")
+    return swap_store(TMP_COLLECTION, batch_size=BATCH_SIZE)
+
+
+def reembed_index(restart: bool = False):
+    if swap_pending(TMP_COLLECTION):
+        # Прошлый запуск прервался во время подмены: основное хранилище неполное,
+        # единственная полная копия — временное хранилище, его нельзя удалять
+        print(f"⚠️  Предыдущая подмена не завершена, продолжаем из {TMP_COLLECTION}")
+        if restart:
+            print("   --restart не применён: сначала завершается подмена, затем запустите скрипт снова")
+        print(f"✅ Переиндексировано чанков: {swap_in()}")
+        build_instruction_index()
+        return
+
+    target = get_vector_store(TMP_COLLECTION)
+    if restart:
+        target.drop()
+        target = get_vector_store(TMP_COLLECTION)
+
+    embedding_model = EmbeddingModel(EMBEDDING_MODEL_NAME)
+    codec = get_embedding_codec()
+    metadata_manager = MetadataManager()
+    known_instructions = set(metadata_manager.get_active_flags())
+
+    collection = get_vector_store()
+    total = collection.count()
+    print(f"Чанков в хранилище: {total}")
+    if total == 0:
+        return
+    if target.count():
+        print(f"Продолжаем прерванный запуск: во временном хранилище уже {target.count()} чанков (--restart — начать заново)")
+
+    start = time.time()
+    written = 0
+    for offset in range(0, total, BATCH_SIZE):
+        batch = collection.get(include=['documents', 'metadatas'], limit=BATCH_SIZE, offset=offset)
+        rows = [
+            (chunk_id, text, metadata)
+            for chunk_id, text, metadata in zip(batch['ids'], batch['documents'], batch['metadatas'])
+            if metadata.get('instruction_id') in known_instructions
+        ]
+        # Чанки, пересчитанные прерванным запуском
+        done = set(target.get(ids=[row[0] for row in rows], include=['metadatas'])['ids']) if rows else set()
+        written += len(done)
+        rows = [row for row in rows if row[0] not in done]
+        if not rows:
+            continue
+        chunk_ids, texts, metadatas = (list(column) for column in zip(*rows))
+
+        full_embeddings = embedding_model.encode_passages(texts)
+        if codec.stores_full_vectors:
+            with metadata_manager.pool.transaction() as conn:
+                store_full_vectors(
+                    conn.cursor(),
+                    chunk_ids,
+                    [metadata['instruction_id'] for metadata in metadatas],
+                    full_embeddings,
+                    codec.quantization
+                )
+        target.add(
+            ids=chunk_ids,
+            embeddings=codec.reduce(full_embeddings).tolist(),
+            metadatas=metadatas,
+            documents=texts
+        )
+        written += len(chunk_ids)
+        print(f"   {written}/{total} ({time.time() - start:.0f} с)")
+
+    swap_in()
+    print(f"✅ Переиндексировано чанков: {written}")
+    if written < total:
+        print(f"Удалено чанков без инструкции в SQLite: {total - written}")
+
+    build_instruction_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пересчёт эмбеддингов всех чанков")
+    parser.add_argument("--restart", action="store_true", help="Удалить временное хранилище прерванного запуска")
+    args = parser.parse_args()
+
+    # Снимок (src/backup.py) не должен застать индекс наполовину перестроенным
+    with index_write_lock():
+        reembed_index(args.restart)
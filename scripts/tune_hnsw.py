@@ -0,0 +1,161 @@
+"""
+Подбор параметров индекса HNSW на векторах нашего корпуса
+
+Для каждой комбинации (пространство, M, construction_ef, search_ef) строит
+коллекцию ChromaDB в памяти и сравнивает её top-k с точным поиском:
+recall@k, время построения, задержка запроса p50/p99. Для сравнения
+печатается задержка точного перебора numpy (NumpyVectorStore).
+
+Запросы — либо тексты из файла (по одному на строку, кодируются с
+префиксом "query: "), либо случайные векторы корпуса (сам вектор из
+выдачи исключается).
+
+Запуск:
+    python scripts/tune_hnsw.py
+    python scripts/tune_hnsw.py --queries-file data/test_queries.txt --k 5
+    python scripts/tune_hnsw.py --space cosine ip --m 8 16 32 --search-ef 16 32 64 128
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+import uuid
+
+import chromadb
+import numpy as np
+
+# Добавляем корневую директорию проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import EMBEDDING_MODEL_NAME
+from src.vector_store import get_vector_store, hnsw_metadata
+
+BATCH_SIZE = 5000
+
+
+def load_corpus(limit: int) -> np.ndarray:
+    """Векторы чанков из текущего хранилища (не больше limit)"""
+    collection = get_vector_store()
+    vectors = []
+    total = min(collection.count(), limit)
+    for offset in range(0, total, BATCH_SIZE):
+        batch = collection.get(include=['embeddings'], limit=min(BATCH_SIZE, total - offset), offset=offset)
+        vectors.extend(batch['embeddings'])
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def load_queries(corpus: np.ndarray, queries_file: str, n_queries: int):
+    """
+    Векторы запросов и номер "своего" вектора корпуса для каждого (-1 — нет)
+    """
+    if queries_file:
+        from src.embeddings import EmbeddingModel
+        with open(queries_file, encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+        vectors = EmbeddingModel(EMBEDDING_MODEL_NAME).encode_queries(texts)
+        return np.asarray(vectors, dtype=np.float32), np.full(len(texts), -1)
+
+    rng = np.random.default_rng(0)
+    positions = rng.choice(len(corpus), size=min(n_queries, len(corpus)), replace=False)
+    return corpus[positions], positions
+
+
+def exact_distances(space: str, corpus: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """Расстояния как в ChromaDB: l2 — квадрат, cosine/ip — 1 - сходство"""
+    dots = queries @ corpus.T
+    if space == 'l2':
+        return (queries ** 2).sum(1)[:, None] - 2 * dots + (corpus ** 2).sum(1)[None, :]
+    if space == 'cosine':
+        norms = np.linalg.norm(queries, axis=1)[:, None] * np.linalg.norm(corpus, axis=1)[None, :]
+        norms[norms == 0] = 1.0
+        return 1.0 - dots / norms
+    return 1.0 - dots
+
+
+def exact_top_k(distances: np.ndarray, own: np.ndarray, k: int) -> list:
+    distances = distances.copy()
+    mask = own >= 0
+    distances[np.arange(len(own))[mask], own[mask]] = np.inf
+    top = np.argpartition(distances, k, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def percentile_ms(latencies, q) -> float:
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def benchmark_exact(space: str, corpus: np.ndarray, queries: np.ndarray, k: int):
+    """Задержка точного перебора (как NumpyVectorStore без IVF)"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        distances = exact_distances(space, corpus, query[None, :])[0]
+        np.argpartition(distances, k)[:k]
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(args):
+    corpus = load_corpus(args.limit)
+    if len(corpus) <= args.k:
+        print("❌ Слишком мало векторов в хранилище")
+        return
+    queries, own = load_queries(corpus, args.queries_file, args.queries)
+    print(f"Векторов: {len(corpus)} × {corpus.shape[1]}, запросов: {len(queries)}, k={args.k}\n")
+
+    client = chromadb.EphemeralClient()
+    header = f"{'space':<7} {'M':>3} {'c_ef':>5} {'s_ef':>5} {'build, с':>9} {'recall@' + str(args.k):>9} {'p50, мс':>8} {'p99, мс':>8}"
+
+    for space in args.space:
+        truth = exact_top_k(exact_distances(space, corpus, queries), own, args.k)
+        latencies = benchmark_exact(space, corpus, queries, args.k)
+        print(f"[{space}] точный перебор numpy: p50 {percentile_ms(latencies, 50):.2f} мс, "
+              f"p99 {percentile_ms(latencies, 99):.2f} мс")
+        print(header)
+
+        for m, construction_ef, search_ef in itertools.product(args.m, args.construction_ef, args.search_ef):
+            name = f"tune_{uuid.uuid4().hex[:8]}"
+            collection = client.create_collection(
+                name, metadata=hnsw_metadata(space, m, construction_ef, search_ef)
+            )
+
+            start = time.perf_counter()
+            for offset in range(0, len(corpus), BATCH_SIZE):
+                collection.add(
+                    ids=[str(i) for i in range(offset, min(offset + BATCH_SIZE, len(corpus)))],
+                    embeddings=corpus[offset:offset + BATCH_SIZE].tolist()
+                )
+            build_time = time.perf_counter() - start
+
+            latencies = []
+            hits = 0
+            for query, own_position, expected in zip(queries, own, truth):
+                start = time.perf_counter()
+                result = collection.query(query_embeddings=[query.tolist()], n_results=args.k + 1, include=[])
+                latencies.append(time.perf_counter() - start)
+                found = [int(i) for i in result['ids'][0] if int(i) != own_position][:args.k]
+                hits += len(expected.intersection(found))
+
+            recall = hits / (len(queries) * args.k)
+            print(f"{space:<7} {m:>3} {construction_ef:>5} {search_ef:>5} {build_time:>9.1f} {recall:>9.3f} "
+                  f"{percentile_ms(latencies, 50):>8.2f} {percentile_ms(latencies, 99):>8.2f}")
+            client.delete_collection(name)
+        print()
+
+    print("💡 Выбранные значения задайте в src/config.py (VECTOR_SPACE, HNSW_*) и запустите scripts/reembed_index.py")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Подбор параметров HNSW: recall@k и задержка против точного поиска")
+    parser.add_argument("--space", nargs="+", default=["cosine"], choices=["cosine", "ip", "l2"])
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200, help="Число запросов из корпуса")
+    parser.add_argument("--queries-file", help="Файл с текстами запросов (по одному на строку)")
+    parser.add_argument("--limit", type=int, default=100000, help="Максимум векторов корпуса")
+    args = parser.parse_args()
+
+    run(args)
@@ -2,17 +2,19 @@ import streamlit as st
 import os
 import sys
 import re
-from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.rag_pipeline import create_rag_pipeline
-from src.docs_parser import parse_document, prepare_text_for_chunking
-from src.chunker import split_text
-from src.embeddings import EmbeddingModel
-from src.storage import get_chroma
+from src.vector_store import get_vector_store, get_instruction_store
+from src.instruction_index import delete_instructions
+from src.ingest_jobs import get_ingest_worker, STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED
 from src.metadata_manager import MetadataManager
-from src.config import EMBEDDING_MODEL_NAME, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+from src.index_sync import set_instructions_active
+from src.index_lock import index_write_lock
+from src.backup import create_snapshot, list_snapshots
+from src.llm_scheduler import LLMRequestCancelled, LLMRequestTimeout
+from src.config import KB_PAGE_SIZE, READ_ONLY, INGEST_JOB_POLL_INTERVAL
 
 
 def render_answer_with_images(answer_text: str, available_images: list):
@@ -99,6 +101,29 @@ def display_answer_with_inline_images(answer: str, images: list, instruction_tit
                                 st.warning(f"⚠️ Не удалось загрузить изображение: {image_path}")
 
 
+def make_session_cancel_check():
+    """
+    Проверка отмены для текущей сессии Streamlit
+
+    Запрос к LLM выполняется в потоке скрипта сессии. Если вкладка браузера
+    закрыта, сессия удаляется из runtime — тогда генерацию нужно прервать.
+    """
+    try:
+        from streamlit.runtime import get_instance
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+        runtime = get_instance()
+    except Exception:
+        return None
+
+    if ctx is None:
+        return None
+
+    session_id = ctx.session_id
+    return lambda: not runtime.is_active_session(session_id)
+
+
 st.set_page_config(
     page_title="RAG Поиск по инструкциям",
     page_icon="📚",
@@ -111,6 +136,36 @@ def get_rag_pipeline():
     return create_rag_pipeline()
 
 
+JOB_STATUS_LABELS = {
+    STATUS_QUEUED: "⏳ В очереди",
+    STATUS_RUNNING: "⚙️ Обрабатывается",
+    STATUS_DONE: "✅ Готово",
+    STATUS_FAILED: "❌ Ошибка",
+}
+
+
+@st.fragment(run_every=INGEST_JOB_POLL_INTERVAL)
+def render_ingest_jobs():
+    """Статус фоновых задач загрузки (обновляется без перезапуска страницы)"""
+    queue = get_ingest_worker().queue
+    jobs = queue.list_jobs(limit=10)
+    if not jobs:
+        st.caption("Задач загрузки пока нет")
+        return
+
+    for job in jobs:
+        filename = os.path.basename(job['file_path'])
+        progress = f"{job['done_items']}/{job['total_items']} инструкций, {job['chunks']} чанков" if job['total_items'] else ""
+        st.write(f"{JOB_STATUS_LABELS.get(job['status'], job['status'])} **{filename}** {progress}")
+
+        if job['status'] == STATUS_RUNNING and job['total_items']:
+            st.progress(job['done_items'] / job['total_items'])
+        elif job['status'] == STATUS_FAILED:
+            st.caption(f"Ошибка: {job['error']}")
+            if st.button("🔁 Повторить", key=f"retry_job_{job['id']}", disabled=READ_ONLY):
+                queue.retry(job['id'])
+
+
 def main():
     """Главная функция приложения"""
     
@@ -135,6 +190,11 @@ def main():
         st.markdown("---")
         st.markdown("### ⚙️ Настройки поиска")
         top_k = st.slider("Количество результатов", 1, 10, 3)
+        bypass_llm_cache = st.checkbox(
+            "Генерировать ответ заново",
+            value=False,
+            help="Не брать ответ из кэша, даже если такой вопрос с тем же контекстом уже задавали"
+        )
 
     # Основные вкладки
     tab1, tab2, tab3 = st.tabs(["🔍 Поиск", "📄 Загрузка документов", "📊 База знаний"])
@@ -147,13 +207,33 @@ def main():
             placeholder="Например: Как решить ошибку фильтра?"
         )
 
+        search_tags = st.multiselect(
+            "Искать только по тегам",
+            options=MetadataManager().get_all_tags(),
+            default=[],
+            help="Поиск только среди инструкций, у которых есть хотя бы один из выбранных тегов"
+        )
+
         if st.button("🔍 Найти", type="primary"):
             if not query:
                 st.warning("⚠️ Введите вопрос")
             else:
                 with st.spinner("Поиск и генерация ответа..."):
+                    queue_status = st.empty()
+
+                    def show_queue_position(position: int):
+                        queue_status.info(f"⏳ Запрос в очереди к LLM, позиция: {position}")
+
                     try:
-                        result = rag.query(query, top_k=top_k)
+                        result = rag.query(
+                            query,
+                            top_k=top_k,
+                            is_cancelled=make_session_cancel_check(),
+                            on_queue_position=show_queue_position,
+                            use_cache=not bypass_llm_cache,
+                            tags=search_tags
+                        )
+                        queue_status.empty()
 
                         # Отображение ответа с изображениями
                         st.markdown("### 💬 Ответ:")
@@ -199,16 +279,25 @@ def main():
                                                 st.caption(f"⚠️ Изображение: {img_path} (не удалось загрузить)")
                         else:
                             st.info("Источники не найдены")
-                    
+
+                    except LLMRequestTimeout:
+                        queue_status.empty()
+                        st.warning("⚠️ Сервер перегружен: ответ не получен вовремя. Попробуйте ещё раз позже.")
+                    except LLMRequestCancelled:
+                        queue_status.empty()
                     except Exception as e:
                         st.error(f"❌ Ошибка при поиске: {e}")
 
     with tab2:
         st.header("Загрузка новых документов")
+        if READ_ONLY:
+            st.info("🔒 Узел только для чтения: документы загружаются на узле загрузки "
+                    "и переносятся сюда пакетом индекса (scripts/index_bundle.py)")
 
         uploaded_file = st.file_uploader(
             "Выберите файл (.docx, .md, .txt)",
-            type=['docx', 'md', 'txt']
+            type=['docx', 'md', 'txt'],
+            disabled=READ_ONLY
         )
 
         # Тип документа
@@ -244,7 +333,7 @@ def main():
         custom_tags = [t.strip() for t in custom_tags_input.split(',') if t.strip()]
         all_tags = selected_tags + custom_tags
 
-        if st.button("📤 Загрузить документ", type="primary"):
+        if st.button("📤 Загрузить документ", type="primary", disabled=READ_ONLY):
             if uploaded_file is None:
                 st.warning("⚠️ Выберите файл для загрузки")
             else:
@@ -254,101 +343,28 @@ def main():
                     with open(file_path, "wb") as f:
                         f.write(uploaded_file.getbuffer())
 
-                    with st.spinner("Обработка документа..."):
-                        # Парсинг документа (одна или несколько инструкций)
-                        instructions = parse_document(
-                            file_path=file_path,
-                            source_type=source_type,
-                            tags=all_tags,
-                            author=author
-                        )
-
-                        st.info(f"Найдено инструкций: {len(instructions)}")
-
-                        # Инициализация
-                        metadata_manager = MetadataManager()
-                        embedding_model = EmbeddingModel(EMBEDDING_MODEL_NAME)
-                        client, collection = get_chroma()
-
-                        # Обработка каждой инструкции
-                        for instruction in instructions:
-                            st.write(f"Обработка: **{instruction['title']}**")
-
-                            # Подготовка текста с заголовком
-                            text_with_header = prepare_text_for_chunking(
-                                instruction['text'],
-                                instruction['title']
-                            )
-
-                            # Разбиение на чанки
-                            chunks = split_text(
-                                text_with_header,
-                                max_length=CHUNK_SIZE_TOKENS * 4,
-                                overlap=CHUNK_OVERLAP_TOKENS * 4
-                            )
-
-                            # Создание эмбеддингов
-                            embeddings = embedding_model.encode(chunks)
-
-                            # Добавление в ChromaDB
-                            chunk_ids = []
-                            metadatas = []
-                            created_at = datetime.now().isoformat()
-
-                            for i, chunk in enumerate(chunks):
-                                chunk_id = f"{instruction['id']}_chunk_{i}"
-                                chunk_ids.append(chunk_id)
-
-                                metadata = {
-                                    'instruction_id': instruction['id'],
-                                    'doc_id': instruction['doc_id'],
-                                    'title': instruction['title'],
-                                    'filename': uploaded_file.name,
-                                    'file_path': file_path,
-                                    'chunk_index': i,
-                                    'total_chunks': len(chunks),
-                                    'active': True,
-                                    'author': author,
-                                    'tags': ','.join(all_tags),
-                                    'created_at': created_at,
-                                    'images': ','.join(instruction.get('images', []))
-                                }
-                                metadatas.append(metadata)
-
-                            collection.add(
-                                documents=chunks,
-                                embeddings=embeddings.tolist(),
-                                metadatas=metadatas,
-                                ids=chunk_ids
-                            )
-
-                            # Сохранение метаданных в БД
-                            metadata_manager.add_instruction(
-                                instruction_id=instruction['id'],
-                                doc_id=instruction['doc_id'],
-                                title=instruction['title'],
-                                file_path=file_path,
-                                file_format=instruction['file_format'],
-                                source_type=instruction['source_type'],
-                                separator_index=instruction['separator_index'],
-                                author=author,
-                                tags=all_tags,
-                                images=instruction['images']
-                            )
-
-                            st.success(f"✓ {instruction['title']} ({len(chunks)} чанков)")
-
-                        st.success(f"🎉 Загрузка завершена! Добавлено инструкций: {len(instructions)}")
-                        st.balloons()
-
-                        # Очистка кеша
-                        st.cache_resource.clear()
+                    # Разбор, эмбеддинги и запись выполняет фоновый воркер (src/ingest_jobs.py):
+                    # закрытие вкладки или перезапуск страницы загрузку не прерывают.
+                    # Поиск сам увидит новое поколение индекса (RAGPipeline.refresh_index)
+                    get_ingest_worker().queue.enqueue(
+                        file_path=file_path,
+                        source_type=source_type,
+                        tags=all_tags,
+                        author=author
+                    )
+                    st.success(f"📥 {uploaded_file.name} поставлен в очередь загрузки")
 
                 except Exception as e:
                     st.error(f"❌ Ошибка при загрузке: {e}")
                     import traceback
                     st.code(traceback.format_exc())
 
+        st.markdown("### 📋 Задачи загрузки")
+        if READ_ONLY:
+            st.caption("Фоновая загрузка на узле только для чтения отключена")
+        else:
+            render_ingest_jobs()
+
     with tab3:
         st.header("Управление базой знаний")
 
@@ -367,7 +383,7 @@ def main():
         st.markdown("---")
 
         # Фильтры
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
             show_inactive = st.checkbox("Показать неактуальные", value=False)
         with col2:
@@ -375,16 +391,43 @@ def main():
                 "Фильтр по тегу",
                 options=["Все"] + metadata_manager.get_all_tags()
             )
+        with col3:
+            title_query = st.text_input("Поиск по названию", placeholder="часть названия")
+
+        list_filters = {
+            'active': None if show_inactive else True,
+            'tag': None if filter_tag == "Все" else filter_tag,
+            'title_contains': title_query.strip() or None
+        }
+
+        # Курсоры keyset-пагинации: сбрасываются при смене фильтров
+        if st.session_state.get('kb_filters') != list_filters:
+            st.session_state['kb_filters'] = list_filters
+            st.session_state['kb_cursors'] = [None]
+        cursors = st.session_state['kb_cursors']
+
+        # Получение одной страницы инструкций
+        total_found = metadata_manager.count_instructions(**list_filters)
+        instructions, next_cursor = metadata_manager.list_instructions(
+            **list_filters,
+            limit=KB_PAGE_SIZE,
+            after=cursors[-1]
+        )
 
-        # Получение инструкций
-        if filter_tag == "Все":
-            instructions = metadata_manager.get_all_instructions(active_only=not show_inactive)
-        else:
-            instructions = metadata_manager.get_instructions_by_tag(filter_tag)
-            if not show_inactive:
-                instructions = [i for i in instructions if i['active']]
-
-        st.markdown(f"### Найдено инструкций: {len(instructions)}")
+        st.markdown(f"### Найдено инструкций: {total_found}")
+
+        page_count = max(1, -(-total_found // KB_PAGE_SIZE))
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            if st.button("← Назад", disabled=len(cursors) == 1, key="kb_prev"):
+                cursors.pop()
+                st.rerun()
+        with col_page:
+            st.caption(f"Страница {len(cursors)} из {page_count}")
+        with col_next:
+            if st.button("Вперёд →", disabled=next_cursor is None, key="kb_next"):
+                cursors.append(next_cursor)
+                st.rerun()
 
         # Отображение инструкций
         for inst in instructions:
@@ -407,52 +450,87 @@ def main():
 
                 with col2:
                     if inst['active']:
-                        if st.button("Пометить неактуальной", key=f"deactivate_{inst['id']}"):
-                            if metadata_manager.mark_instruction_inactive(inst['id']):
+                        if st.button("Пометить неактуальной", key=f"deactivate_{inst['id']}", disabled=READ_ONLY):
+                            if set_instructions_active([inst['id']], False, metadata_manager):
                                 st.success("Помечена как неактуальная")
                                 st.rerun()
                             else:
                                 st.error("Ошибка")
+                    else:
+                        if st.button("Вернуть в актуальные", key=f"activate_{inst['id']}", disabled=READ_ONLY):
+                            if set_instructions_active([inst['id']], True, metadata_manager):
+                                st.success("Инструкция снова актуальна")
+                                st.rerun()
+                            else:
+                                st.error("Ошибка")
 
-                    if st.button("🗑️ Удалить", key=f"delete_{inst['id']}", type="secondary"):
+                    if st.button("🗑️ Удалить", key=f"delete_{inst['id']}", type="secondary", disabled=READ_ONLY):
                         try:
-                            # Удаляем из метаданных SQLite
-                            if metadata_manager.delete_instruction(inst['id']):
-                                # Удаляем чанки из ChromaDB
-                                client, collection = get_chroma()
-                                # Получаем все чанки этой инструкции
-                                results = collection.get(
-                                    where={"instruction_id": inst['id']}
-                                )
+                            with index_write_lock():
+                                # Удаляем из метаданных SQLite
+                                deleted = metadata_manager.delete_instruction(inst['id'])
+                                results = None
+                                if deleted:
+                                    # Удаляем чанки из ChromaDB
+                                    collection = get_vector_store()
+                                    # Получаем все чанки этой инструкции
+                                    results = collection.get(
+                                        where={"instruction_id": inst['id']}
+                                    )
+                                    delete_instructions([inst['id']])
+                                    if results and results['ids']:
+                                        collection.delete(ids=results['ids'])
+                            if not deleted:
+                                st.error("❌ Ошибка при удалении метаданных")
+                            else:
                                 if results and results['ids']:
-                                    collection.delete(ids=results['ids'])
                                     st.success(f"✅ Удалена инструкция и {len(results['ids'])} чанков")
                                 else:
                                     st.success("✅ Удалена инструкция (чанки не найдены)")
                                 st.rerun()
-                            else:
-                                st.error("❌ Ошибка при удалении метаданных")
                         except Exception as e:
                             st.error(f"❌ Ошибка при удалении: {e}")
 
         st.markdown("---")
 
+        # Резервные копии
+        with st.expander("💾 Резервные копии", expanded=False):
+            st.caption("Снимок базы знаний делается без остановки приложения. "
+                       "Восстановление: python scripts/backup_index.py restore <id> (при остановленном приложении)")
+
+            if st.button("💾 Создать снимок", disabled=READ_ONLY):
+                try:
+                    with st.spinner("Создание снимка..."):
+                        snapshot = create_snapshot()
+                    st.success(f"✅ Снимок {snapshot['id']} создан")
+                except Exception as e:
+                    st.error(f"❌ Ошибка при создании снимка: {e}")
+
+            for snapshot in reversed(list_snapshots()[-5:]):
+                label = f" — {snapshot['label']}" if snapshot.get('label') else ""
+                st.write(f"`{snapshot['id']}` {snapshot['stats']['bytes'] / 1024 ** 2:.1f} МБ{label}")
+
         # Опасная зона
         with st.expander("⚠️ Опасная зона", expanded=False):
-            st.warning("Эти действия необратимы!")
+            st.warning("Перед очисткой создаётся снимок базы (см. «Резервные копии»)")
 
-            if st.button("🗑️ Очистить всю базу (ChromaDB + метаданные)", type="secondary"):
+            if st.button("🗑️ Очистить всю базу (ChromaDB + метаданные)", type="secondary", disabled=READ_ONLY):
                 try:
-                    # Очищаем ChromaDB
-                    client, collection = get_chroma()
-                    client.delete_collection("documents")
+                    snapshot = create_snapshot("перед очисткой базы")
 
-                    # Очищаем метаданные SQLite
-                    metadata_manager = MetadataManager()
-                    metadata_manager.clear_all_data()
+                    with index_write_lock():
+                        # Очищаем ChromaDB
+                        get_vector_store().drop()
+                        try:
+                            get_instruction_store().drop()
+                        except Exception:
+                            pass  # индекс инструкций ещё не создавался
+
+                        # Очищаем метаданные SQLite
+                        metadata_manager = MetadataManager()
+                        metadata_manager.clear_all_data()
 
-                    st.success("✅ База данных полностью очищена (ChromaDB + метаданные)")
-                    st.cache_resource.clear()
+                    st.success(f"✅ База данных полностью очищена (ChromaDB + метаданные), снимок: {snapshot['id']}")
                     st.rerun()
                 except Exception as e:
                     st.error(f"❌ Ошибка при очистке: {e}")
@@ -0,0 +1,359 @@
+"""
+Резервные копии базы знаний: снимки и восстановление
+
+В снимок входят хранилище векторов (CHROMA_DIR и/или VECTOR_STORE_DIR),
+metadata.db, изображения инструкций и проекция сжатия эмбеддингов.
+Снимок создаётся без остановки приложения:
+- на время снимка берётся index_write_lock (src/index_lock.py) — запись
+  в базу ждёт, поиск продолжает работать;
+- файлы SQLite (metadata.db, chroma.sqlite3, records.db хранилища numpy)
+  копируются через backup API SQLite — это согласованная копия с учётом WAL;
+- остальные файлы (сегменты HNSW, матрицы .npy, изображения) читаются как есть.
+
+Хранение инкрементальное и адресуется содержимым: файлы режутся на блоки
+BACKUP_CHUNK_SIZE, каждый блок лежит в objects/ под своим SHA-256 один раз
+на все снимки, снимок — манифест в snapshots/ со списком блоков каждого
+файла. Ежедневный снимок большого индекса добавляет только изменившиеся
+блоки, а файлы с тем же размером и mtime, что в прошлом снимке, не
+перечитываются вовсе.
+
+Восстановление собирает файлы из блоков рядом с текущими и подменяет их
+переименованием; прежнее состояние остаётся в *.before_restore.
+Приложение на время восстановления нужно остановить: ChromaDB держит
+индекс в памяти.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Dict, Iterator, Tuple
+
+from src.config import (
+    BACKUP_DIR,
+    BACKUP_CHUNK_SIZE,
+    BACKUP_KEEP,
+    CHROMA_DIR,
+    VECTOR_STORE_DIR,
+    VECTOR_STORE_BACKEND,
+    METADATA_DB,
+    IMAGES_DIR,
+    EMBEDDING_PROJECTION_FILE
+)
+from src.index_lock import file_lock, index_write_lock
+
+# Содержимое снимка: имя в манифесте -> путь. При восстановлении берётся
+# текущий путь из config.py, поэтому снимки переносимы между машинами.
+SNAPSHOT_ROOTS = {
+    'metadata.db': METADATA_DB,
+    'chroma_db': CHROMA_DIR,
+    'vector_store': VECTOR_STORE_DIR,
+    'images': IMAGES_DIR,
+    'embedding_projection.npz': EMBEDDING_PROJECTION_FILE,
+}
+
+OBJECTS_DIR = os.path.join(BACKUP_DIR, 'objects')
+SNAPSHOTS_DIR = os.path.join(BACKUP_DIR, 'snapshots')
+BACKUP_LOCK_FILE = os.path.join(BACKUP_DIR, 'backup.lock')
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+# Журналы SQLite не копируются: их содержимое уже в копии через backup API
+SKIPPED_SUFFIXES = ('-wal', '-shm', '-journal')
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(OBJECTS_DIR, digest[:2], digest)
+
+
+def _is_sqlite(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+def _sqlite_backup(source_path: str, target_path: str):
+    """Согласованная копия базы SQLite (работает при открытых подключениях)"""
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def _store_chunks(path: str) -> Tuple[List[str], int]:
+    """
+    Запись файла блоками в objects/
+
+    Returns:
+        Tuple (SHA-256 блоков по порядку, байт новых блоков)
+    """
+    chunks = []
+    added = 0
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(BACKUP_CHUNK_SIZE)
+            if not data:
+                break
+            digest = hashlib.sha256(data).hexdigest()
+            object_path = _object_path(digest)
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                tmp_path = f'{object_path}.tmp'
+                with open(tmp_path, 'wb') as out:
+                    out.write(data)
+                os.replace(tmp_path, object_path)
+                added += len(data)
+            chunks.append(digest)
+    return chunks, added
+
+
+def _iter_files(root_path: str) -> Iterator[Tuple[str, str]]:
+    """(путь относительно корня через '/', абсолютный путь) файлов корня снимка"""
+    if os.path.isfile(root_path):
+        yield '', root_path
+        return
+    for directory, _, files in os.walk(root_path):
+        for name in sorted(files):
+            if name.endswith(SKIPPED_SUFFIXES):
+                continue
+            path = os.path.join(directory, name)
+            yield os.path.relpath(path, root_path).replace(os.sep, '/'), path
+
+
+def _remove(path: str):
+    """Удаление файла или каталога вместе с журналами SQLite"""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    for file_path in [path] + [path + suffix for suffix in SKIPPED_SUFFIXES]:
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+
+
+def list_snapshots() -> List[Dict]:
+    """Манифесты снимков от старых к новым"""
+    if not os.path.isdir(SNAPSHOTS_DIR):
+        return []
+    snapshots = []
+    for name in os.listdir(SNAPSHOTS_DIR):
+        if name.endswith('.json'):
+            with open(os.path.join(SNAPSHOTS_DIR, name), encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+    return sorted(snapshots, key=lambda snapshot: snapshot['created_at'])
+
+
+def load_snapshot(snapshot_id: str) -> Dict:
+    path = os.path.join(SNAPSHOTS_DIR, f'{snapshot_id}.json')
+    if not os.path.exists(path):
+        raise ValueError(f"Снимок не найден: {snapshot_id}")
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def create_snapshot(label: str = None) -> Dict:
+    """
+    Снимок базы знаний без остановки приложения
+
+    Args:
+        label: Подпись снимка (например, "перед очисткой базы")
+
+    Returns:
+        Манифест снимка ('id', 'created_at', 'stats', ...)
+    """
+    os.makedirs(SNAPSHOTS_DIR, exist_ok=True)
+    # Порядок блокировок: сначала BACKUP_LOCK_FILE, затем index_write_lock
+    with file_lock(BACKUP_LOCK_FILE):
+        snapshots = list_snapshots()
+        previous = {}
+        if snapshots:
+            for root, info in snapshots[-1]['roots'].items():
+                for rel, entry in info['files'].items():
+                    previous[(root, rel)] = entry
+
+        stats = {'files': 0, 'bytes': 0, 'added_bytes': 0, 'locked_seconds': 0.0}
+        roots = {}
+        sqlite_copies = []
+        staging = tempfile.mkdtemp(prefix='snapshot_', dir=BACKUP_DIR)
+        try:
+            with index_write_lock():
+                started = time.time()
+                for root, root_path in SNAPSHOT_ROOTS.items():
+                    if not os.path.exists(root_path):
+                        continue
+                    files = {}
+                    for rel, path in _iter_files(root_path):
+                        if _is_sqlite(path):
+                            copy_path = os.path.join(staging, f'{len(sqlite_copies)}.db')
+                            _sqlite_backup(path, copy_path)
+                            entry = {}
+                            sqlite_copies.append((entry, copy_path))
+                        else:
+                            stat = os.stat(path)
+                            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                            cached = previous.get((root, rel))
+                            if cached and cached.get('mtime_ns') == stat.st_mtime_ns and cached['size'] == stat.st_size:
+                                entry['chunks'] = cached['chunks']
+                            else:
+                                entry['chunks'], added = _store_chunks(path)
+                                stats['added_bytes'] += added
+                        files[rel] = entry
+                    roots[root] = {'type': 'file' if os.path.isfile(root_path) else 'dir', 'files': files}
+                stats['locked_seconds'] = round(time.time() - started, 2)
+
+            # Копии SQLite уже согласованы — блоки из них пишутся без блокировки записи
+            for entry, copy_path in sqlite_copies:
+                entry['size'] = os.path.getsize(copy_path)
+                entry['chunks'], added = _store_chunks(copy_path)
+                stats['added_bytes'] += added
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        for info in roots.values():
+            stats['files'] += len(info['files'])
+            stats['bytes'] += sum(entry['size'] for entry in info['files'].values())
+
+        snapshot_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+        existing = {snapshot['id'] for snapshot in snapshots}
+        suffix = 1
+        while snapshot_id in existing:
+            suffix += 1
+            snapshot_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{suffix}"
+
+        manifest = {
+            'id': snapshot_id,
+            'label': label,
+            'created_at': datetime.now().isoformat(),
+            'backend': VECTOR_STORE_BACKEND,
+            'chunk_size': BACKUP_CHUNK_SIZE,
+            'stats': stats,
+            'roots': roots
+        }
+        manifest_path = os.path.join(SNAPSHOTS_DIR, f'{snapshot_id}.json')
+        with open(f'{manifest_path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(f'{manifest_path}.tmp', manifest_path)
+
+    print(f"✅ Снимок {snapshot_id}: {stats['files']} файлов, {stats['bytes'] / 1024 ** 2:.1f} МБ, "
+          f"новых данных {stats['added_bytes'] / 1024 ** 2:.1f} МБ "
+          f"(запись ждала {stats['locked_seconds']:.1f} с)")
+    return manifest
+
+
+def _assemble(chunks: List[str], path: str, verify: bool):
+    """Сборка файла из блоков"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as out:
+        for digest in chunks:
+            with open(_object_path(digest), 'rb') as f:
+                data = f.read()
+            if verify and hashlib.sha256(data).hexdigest() != digest:
+                raise ValueError(f"Повреждён блок {digest}")
+            out.write(data)
+
+
+def restore_snapshot(snapshot_id: str, verify: bool = True) -> Dict:
+    """
+    Восстановление базы знаний из снимка (приложение должно быть остановлено)
+
+    Все файлы сначала собираются в *.restore рядом с текущими, затем
+    подменяются переименованием. Текущее состояние сохраняется
+    в *.before_restore (до следующего восстановления).
+
+    Args:
+        verify: Проверять SHA-256 блоков при сборке
+
+    Returns:
+        Манифест восстановленного снимка
+    """
+    manifest = load_snapshot(snapshot_id)
+
+    with index_write_lock():
+        staged = []
+        try:
+            for root, info in manifest['roots'].items():
+                target = SNAPSHOT_ROOTS.get(root)
+                if target is None:
+                    print(f"⚠️  Неизвестная часть снимка пропущена: {root}")
+                    continue
+                staging = f'{target}.restore'
+                _remove(staging)
+                if info['type'] == 'dir':
+                    os.makedirs(staging)
+                for rel, entry in info['files'].items():
+                    path = os.path.join(staging, *rel.split('/')) if rel else staging
+                    _assemble(entry['chunks'], path, verify)
+                staged.append((target, staging))
+        except Exception:
+            for _, staging in staged:
+                _remove(staging)
+            raise
+
+        for target, staging in staged:
+            previous = f'{target}.before_restore'
+            _remove(previous)
+            if os.path.exists(target):
+                os.rename(target, previous)
+            # Журнал WAL старой базы не должен примениться к восстановленной
+            for suffix in SKIPPED_SUFFIXES:
+                if os.path.exists(target + suffix):
+                    os.replace(target + suffix, previous + suffix)
+            os.rename(staging, target)
+
+    print(f"✅ Восстановлен снимок {snapshot_id} от {manifest['created_at']}")
+    if manifest.get('backend') != VECTOR_STORE_BACKEND:
+        print(f"⚠️  Снимок сделан с хранилищем {manifest.get('backend')}, "
+              f"в настройках {VECTOR_STORE_BACKEND}")
+    return manifest
+
+
+def verify_snapshot(snapshot_id: str) -> List[str]:
+    """SHA-256 отсутствующих или повреждённых блоков снимка"""
+    manifest = load_snapshot(snapshot_id)
+    bad = []
+    for info in manifest['roots'].values():
+        for entry in info['files'].values():
+            for digest in entry['chunks']:
+                object_path = _object_path(digest)
+                if not os.path.exists(object_path):
+                    bad.append(digest)
+                    continue
+                with open(object_path, 'rb') as f:
+                    if hashlib.sha256(f.read()).hexdigest() != digest:
+                        bad.append(digest)
+    return bad
+
+
+def prune_snapshots(keep: int = BACKUP_KEEP) -> Dict:
+    """
+    Удаление старых снимков и блоков, на которые не ссылается ни один оставшийся
+
+    Returns:
+        {'removed_snapshots', 'removed_objects', 'freed_bytes'}
+    """
+    keep = max(1, keep)
+    report = {'removed_snapshots': 0, 'removed_objects': 0, 'freed_bytes': 0}
+    with file_lock(BACKUP_LOCK_FILE):
+        snapshots = list_snapshots()
+        for snapshot in snapshots[:-keep]:
+            os.remove(os.path.join(SNAPSHOTS_DIR, f"{snapshot['id']}.json"))
+            report['removed_snapshots'] += 1
+
+        referenced = set()
+        for snapshot in snapshots[-keep:]:
+            for info in snapshot['roots'].values():
+                for entry in info['files'].values():
+                    referenced.update(entry['chunks'])
+
+        if os.path.isdir(OBJECTS_DIR):
+            for directory, _, files in os.walk(OBJECTS_DIR):
+                for name in files:
+                    if name in referenced:
+                        continue
+                    path = os.path.join(directory, name)
+                    report['freed_bytes'] += os.path.getsize(path)
+                    os.remove(path)
+                    report['removed_objects'] += 1
+    return report
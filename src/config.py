@@ -7,14 +7,104 @@ IMAGES_DIR = os.path.join(DATA_DIR, "images")
 BACKUP_DIR = os.path.join(DATA_DIR, "backups")
 
 CHROMA_DIR = os.path.join(BASE_DIR, "chroma_db")
+
+# Хранилище векторов (src/vector_store.py): "chroma" или "numpy" (.npy через mmap + SQLite)
+VECTOR_STORE_BACKEND = "chroma"
+VECTOR_STORE_DIR = os.path.join(DATA_DIR, "vector_store")
+NUMPY_INDEX_TYPE = "exact"  # "exact" или "ivf" (списки строит scripts/migrate_vector_store.py --ivf-lists)
+NUMPY_IVF_N_PROBE = 8       # просматриваемых списков IVF на запрос
 METADATA_DB = os.path.join(DATA_DIR, "metadata.db")
+SQLITE_POOL_SIZE = 8  # подключений к metadata.db на процесс
+
+# Резервные копии (src/backup.py): снимки из блоков, одинаковые блоки хранятся один раз
+BACKUP_CHUNK_SIZE = 4 * 1024 * 1024
+BACKUP_KEEP = 14  # снимков остаётся после scripts/backup_index.py prune
+INDEX_LOCK_FILE = os.path.join(DATA_DIR, "index.lock")  # блокировка записи (src/index_lock.py)
+INDEX_GENERATION_FILE = os.path.join(DATA_DIR, "index.generation")  # счётчик изменений базы
+
+# Узел поиска только для чтения (база приходит пакетом индекса, src/index_bundle.py)
+READ_ONLY = os.environ.get("RAG_READ_ONLY", "0") == "1"
+
 
 EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-large"
+EMBEDDING_QUERY_PREFIX = "query: "      # префиксы e5 (для моделей без "e5" в имени не добавляются)
+EMBEDDING_PASSAGE_PREFIX = "passage: "
+EMBEDDING_NORMALIZE = True              # единичные векторы: косинус = скалярное произведение
+
+# Индекс HNSW ChromaDB (параметры построения применяются при создании коллекции,
+# после изменения нужна переиндексация: scripts/reembed_index.py)
+VECTOR_SPACE = "cosine"      # "cosine", "ip" или "l2" — пространство коллекции чанков
+HNSW_M = 16                  # связей на узел графа
+HNSW_CONSTRUCTION_EF = 200   # ширина поиска при построении
+HNSW_SEARCH_EF = 64          # ширина поиска при запросе (>= числа кандидатов)
 CHUNK_SIZE_TOKENS = 500
 CHUNK_OVERLAP_TOKENS = 50
+INGEST_BATCH_SIZE = 64  # инструкций в одной пачке при загрузке
+
+# Фоновая загрузка документов (src/ingest_jobs.py): очередь задач в SQLite
+INGEST_JOBS_DB = os.path.join(DATA_DIR, "ingest_jobs.db")
+INGEST_JOB_POLL_INTERVAL = 2    # секунды: опрос очереди воркером и обновление статуса в интерфейсе
+INGEST_JOB_STALE_AFTER = 300    # секунды без отметки воркера — задача снова ставится в очередь
+INGEST_JOB_HEARTBEAT_INTERVAL = 30  # секунды: отметка воркера о работе над задачей (из отдельного потока)
+
+# Почти одинаковые чанки при загрузке (src/near_duplicates.py, MinHash + LSH)
+NEAR_DUPLICATE_MODE = "flag"       # "flag" — записать с пометкой duplicate_of (убирается при поиске), "off"
+NEAR_DUPLICATE_THRESHOLD = 0.85    # оценка сходства Жаккара по шинглам
+MINHASH_PERMUTATIONS = 128         # длина сигнатуры
+MINHASH_BANDS = 16                 # полос LSH (по 8 значений): кандидаты от ~0.7 сходства
+SHINGLE_SIZE = 3                   # слов в шингле
+
+# Компактное хранение эмбеддингов (src/embedding_compression.py)
+EMBEDDING_REDUCTION = None           # None, "pca" (обучается scripts/compress_index.py) или "truncate"
+EMBEDDING_REDUCED_DIM = 256          # размерность векторов в ChromaDB
+EMBEDDING_PROJECTION_FILE = os.path.join(DATA_DIR, "embedding_projection.npz")
+EMBEDDING_QUANTIZATION = "float16"   # полные векторы в metadata.db: float32, float16 или int8
+EMBEDDING_RESCORE = True             # пересчитывать лучших кандидатов по полным векторам
+EMBEDDING_RESCORE_CANDIDATES = 50
 TOP_K = 5
 
+# Двухэтапный поиск: лучшие инструкции по индексу инструкций, затем чанки только среди них
+HIERARCHICAL_SEARCH_ENABLED = True
+INSTRUCTION_CANDIDATES = 10  # инструкций, среди чанков которых ищется top_k
+
+# Переранжирование cross-encoder (CPU): пул кандидатов -> лучшие TOP_K
+RERANK_ENABLED = False
+RERANK_MODEL_NAME = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # мультиязычная
+RERANK_CANDIDATES = 50
+RERANK_BATCH_SIZE = 16
+RERANK_TIME_BUDGET = 2.0   # секунды; при превышении остаётся порядок векторного поиска
+RERANK_CACHE_SIZE = 10000  # оценок пар (запрос, чанк) в памяти
+
+# Диверсификация результатов (MMR) по эмбеддингам кандидатов
+MMR_ENABLED = True
+MMR_CANDIDATES = 20          # пул кандидатов для отбора top_k
+MMR_LAMBDA = 0.5             # 1.0 — только релевантность, 0.0 — только разнообразие
+MMR_MAX_PER_INSTRUCTION = 2  # не больше чанков одной инструкции в контексте
+
+KB_PAGE_SIZE = 25  # инструкций на странице вкладки "База знаний"
+
 LLM_MODEL_NAME = "qwen2.5:14b-instruct-q4_K_M"
 LLM_MAX_TOKENS = 1024
+# Контекст модели, токенов (промпт + ответ): передаётся в Ollama как num_ctx, иначе
+# Ollama берёт свой короткий контекст по умолчанию и молча обрезает начало промпта.
+# Для бэкенда "openai" контекст задаётся при запуске сервера и должен быть не меньше
+LLM_CONTEXT_TOKENS = 8192
+
+# Бэкенд LLM: "ollama", "openai" (llama.cpp server, vLLM) или "stub" (заглушка для нагрузочных тестов)
+LLM_BACKEND = os.environ.get("RAG_LLM_BACKEND", "ollama")
+LLM_OPENAI_BASE_URL = "http://localhost:8080/v1"
+LLM_OPENAI_API_KEY = ""
+LLM_STUB_LATENCY = 0.5            # задержка до первого токена, секунды
+LLM_STUB_TOKENS_PER_SECOND = 20   # скорость генерации заглушки
+
+# Кэш ответов LLM на диске
+LLM_CACHE_ENABLED = True
+LLM_CACHE_DB = os.path.join(DATA_DIR, "llm_cache.db")
+LLM_CACHE_TTL = 7 * 24 * 60 * 60  # секунды (0 — без ограничения)
+LLM_CACHE_MAX_ENTRIES = 5000
+
+# Планировщик LLM запросов (общий для всех сессий)
+LLM_MAX_CONCURRENT_REQUESTS = 1   # одновременных генераций в Ollama
+LLM_REQUEST_TIMEOUT = 180         # дедлайн запроса (ожидание + генерация), секунды
 
 LOG_FILE = os.path.join(BASE_DIR, "logs", "app.log")
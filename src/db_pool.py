@@ -0,0 +1,125 @@
+"""
+Пул подключений к SQLite
+
+Одна база (metadata.db) читается из всех сессий Streamlit одновременно.
+Вместо sqlite3.connect на каждый вызов подключения переиспользуются:
+- режим WAL — чтения не блокируются записью
+- настроенные PRAGMA (кэш страниц, mmap, busy_timeout, внешние ключи)
+- миграции схемы применяются один раз при создании пула
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from src.config import SQLITE_POOL_SIZE
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA cache_size = -20000',     # ~20 МБ кэша страниц на подключение
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA mmap_size = 268435456',   # 256 МБ
+)
+
+
+class SQLitePool:
+    """Потокобезопасный пул подключений к одной базе SQLite"""
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = SQLITE_POOL_SIZE,
+        on_init: Optional[Callable[[sqlite3.Connection], None]] = None
+    ):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+        if on_init is not None:
+            with self.connection() as conn:
+                on_init(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Новое подключение с настроенными PRAGMA"""
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Для доступа к колонкам по имени
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        # Встроенный lower() SQLite меняет регистр только у ASCII
+        conn.create_function(
+            'py_lower', 1,
+            lambda value: value.lower() if isinstance(value, str) else value,
+            deterministic=True
+        )
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        return self._idle.get()
+
+    def _release(self, conn: sqlite3.Connection):
+        # Незавершённая транзакция не должна достаться следующему потоку
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Подключение из пула (возвращается в пул по выходу из блока)"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Подключение с транзакцией: commit при успехе, rollback при исключении"""
+        with self.connection() as conn:
+            yield conn
+            conn.commit()
+
+
+_pools: Dict[str, SQLitePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str, on_init: Optional[Callable[[sqlite3.Connection], None]] = None) -> SQLitePool:
+    """
+    Общий для процесса пул для файла базы
+
+    Args:
+        db_path: Путь к файлу SQLite
+        on_init: Вызывается один раз при создании пула (например, миграции схемы)
+    """
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = SQLitePool(db_path, on_init=on_init)
+            _pools[db_path] = pool
+        return pool
@@ -0,0 +1,227 @@
+"""
+Компактное хранение эмбеддингов
+
+e5-large даёт векторы 1024 × float32 (4 КБ на чанк), и весь индекс HNSW
+ChromaDB держит в памяти. Чтобы индекс помещался в RAM небольшой VM:
+
+1. В ChromaDB пишутся векторы пониженной размерности: PCA, обученный на
+   корпусе, или простое усечение (для Matryoshka-моделей).
+2. Полные векторы хранятся на диске в metadata.db (таблица chunk_vectors)
+   в float16 или int8, и лучшие кандидаты поиска пересчитываются по ним
+   (rescoring) — это возвращает точность полной размерности.
+
+ChromaDB хранит векторы только во float32, поэтому квантизация применяется
+к полным векторам в SQLite, а экономия памяти индекса — за счёт размерности.
+Проекция обучается и индекс перестраивается scripts/compress_index.py,
+качество проверяется scripts/benchmark_embedding_compression.py.
+"""
+import os
+import sqlite3
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.config import (
+    EMBEDDING_REDUCTION,
+    EMBEDDING_REDUCED_DIM,
+    EMBEDDING_PROJECTION_FILE,
+    EMBEDDING_QUANTIZATION,
+    EMBEDDING_RESCORE
+)
+
+QUANTIZATIONS = ('float32', 'float16', 'int8')
+REDUCTION_METHODS = ('pca', 'truncate')
+
+# Переменных в одном запросе SQLite при чтении векторов
+SQL_IN_BATCH = 500
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Нормировка строк матрицы на единичную длину"""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class Projection:
+    """Понижение размерности эмбеддингов: PCA или усечение"""
+
+    def __init__(self, method: str, dim: int, components: np.ndarray = None, mean: np.ndarray = None):
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"Неизвестный метод понижения размерности: {method}")
+        self.method = method
+        self.dim = dim
+        self.components = components
+        self.mean = mean
+
+    @classmethod
+    def fit(cls, embeddings: Sequence[Sequence[float]], dim: int, method: str = 'pca') -> 'Projection':
+        """
+        Обучение проекции на векторах корпуса
+
+        Args:
+            embeddings: Полные эмбеддинги (выборка корпуса, n × full_dim)
+            dim: Целевая размерность
+            method: 'pca' или 'truncate' (обучение не требуется)
+        """
+        if method == 'truncate':
+            return cls('truncate', dim)
+
+        matrix = normalize(np.asarray(embeddings, dtype=np.float32))
+        if dim > min(matrix.shape):
+            raise ValueError(f"Для PCA до {dim} измерений нужно не меньше {dim} векторов")
+        mean = matrix.mean(axis=0)
+        # Главные компоненты — правые сингулярные векторы центрированной матрицы
+        _, _, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+        return cls('pca', dim, components=vt[:dim].astype(np.float32), mean=mean.astype(np.float32))
+
+    def transform(self, embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        """Полные эмбеддинги -> нормированные векторы размерности dim"""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if self.method == 'truncate':
+            reduced = matrix[..., :self.dim]
+        else:
+            reduced = (normalize(matrix) - self.mean) @ self.components.T
+        return normalize(reduced)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {'method': np.array(self.method), 'dim': np.array(self.dim)}
+        if self.components is not None:
+            arrays['components'] = self.components
+            arrays['mean'] = self.mean
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'Projection':
+        with np.load(path) as data:
+            return cls(
+                str(data['method']),
+                int(data['dim']),
+                components=data['components'] if 'components' in data else None,
+                mean=data['mean'] if 'mean' in data else None
+            )
+
+
+def quantize(vectors: np.ndarray, quantization: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Скалярная квантизация векторов
+
+    Returns:
+        Tuple (коды, масштаб каждого вектора — только для int8, иначе единицы)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if quantization == 'float32':
+        return vectors, scales
+    if quantization == 'float16':
+        return vectors.astype(np.float16), scales
+    if quantization == 'int8':
+        # Симметричная квантизация с отдельным масштабом на вектор
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Неизвестный тип квантизации: {quantization}")
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray, quantization: str) -> np.ndarray:
+    """Обратное преобразование quantize (приближённые float32 векторы)"""
+    vectors = np.asarray(codes).astype(np.float32)
+    if quantization == 'int8':
+        vectors *= np.asarray(scales, dtype=np.float32)[:, None]
+    return vectors
+
+
+def store_full_vectors(
+    cursor: sqlite3.Cursor,
+    chunk_ids: List[str],
+    instruction_ids: List[str],
+    embeddings: Sequence[Sequence[float]],
+    quantization: str = EMBEDDING_QUANTIZATION
+):
+    """
+    Запись полных векторов чанков в chunk_vectors (в текущей транзакции вызывающего)
+
+    Векторы нормируются перед квантизацией — для пересчёта нужен только косинус.
+    """
+    if not chunk_ids:
+        return
+    codes, scales = quantize(normalize(np.asarray(embeddings, dtype=np.float32)), quantization)
+    cursor.executemany(
+        '''
+        INSERT OR REPLACE INTO chunk_vectors (chunk_id, instruction_id, dtype, scale, vector)
+        VALUES (?, ?, ?, ?, ?)
+        ''',
+        [
+            (chunk_id, instruction_id, quantization, float(scale), code.tobytes())
+            for chunk_id, instruction_id, scale, code in zip(chunk_ids, instruction_ids, scales, codes)
+        ]
+    )
+
+
+def load_full_vectors(conn: sqlite3.Connection, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+    """Полные (деквантизованные) векторы чанков; отсутствующих чанков в ответе нет"""
+    vectors = {}
+    for start in range(0, len(chunk_ids), SQL_IN_BATCH):
+        batch = chunk_ids[start:start + SQL_IN_BATCH]
+        placeholders = ','.join('?' * len(batch))
+        rows = conn.execute(
+            f'SELECT chunk_id, dtype, scale, vector FROM chunk_vectors WHERE chunk_id IN ({placeholders})',
+            batch
+        ).fetchall()
+        for chunk_id, dtype, scale, blob in rows:
+            codes = np.frombuffer(blob, dtype=np.dtype(dtype))[None, :]
+            vectors[chunk_id] = dequantize(codes, np.array([scale]), dtype)[0]
+    return vectors
+
+
+class EmbeddingCodec:
+    """
+    Преобразование эмбеддингов между моделью, ChromaDB и хранилищем полных векторов
+
+    Без проекции (EMBEDDING_REDUCTION = None) векторы пишутся в ChromaDB как есть.
+    """
+
+    def __init__(
+        self,
+        projection: Optional[Projection] = None,
+        quantization: str = EMBEDDING_QUANTIZATION,
+        rescore: bool = EMBEDDING_RESCORE
+    ):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Неизвестный тип квантизации: {quantization}")
+        self.projection = projection
+        self.quantization = quantization
+        self.rescore = rescore
+
+    @property
+    def enabled(self) -> bool:
+        return self.projection is not None
+
+    @property
+    def stores_full_vectors(self) -> bool:
+        """Хранить полные векторы и пересчитывать по ним кандидатов"""
+        return self.enabled and self.rescore
+
+    def reduce(self, embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        """Эмбеддинги модели -> векторы для ChromaDB"""
+        if not self.enabled:
+            return np.asarray(embeddings, dtype=np.float32)
+        return self.projection.transform(embeddings)
+
+
+def get_embedding_codec() -> EmbeddingCodec:
+    """Кодек по настройкам из config.py"""
+    if EMBEDDING_REDUCTION is None:
+        return EmbeddingCodec()
+
+    if EMBEDDING_REDUCTION == 'truncate':
+        return EmbeddingCodec(Projection('truncate', EMBEDDING_REDUCED_DIM))
+
+    if not os.path.exists(EMBEDDING_PROJECTION_FILE):
+        print(f"⚠️  Файл проекции {EMBEDDING_PROJECTION_FILE} не найден — "
+              f"эмбеддинги хранятся без сжатия. Запустите scripts/compress_index.py")
+        return EmbeddingCodec()
+
+    return EmbeddingCodec(Projection.load(EMBEDDING_PROJECTION_FILE))
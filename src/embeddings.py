@@ -1,7 +1,41 @@
+from typing import List
+
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from src.config import EMBEDDING_QUERY_PREFIX, EMBEDDING_PASSAGE_PREFIX, EMBEDDING_NORMALIZE
+
+
 class EmbeddingModel:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
+    """
+    Модель эмбеддингов
+
+    Модели семейства e5 обучены с префиксами "query: " для запросов и
+    "passage: " для документов — без них качество поиска заметно падает.
+    Векторы нормируются, чтобы косинус совпадал со скалярным произведением.
+    """
+
+    def __init__(
+        self,
+        model_name="all-MiniLM-L6-v2",
+        query_prefix: str = None,
+        passage_prefix: str = None,
+        normalize: bool = EMBEDDING_NORMALIZE
+    ):
         self.model = SentenceTransformer(model_name)
-    def encode(self, texts):
-        return self.model.encode(texts, convert_to_numpy=True)
+        is_e5 = "e5" in model_name.lower()
+        self.query_prefix = query_prefix if query_prefix is not None else (EMBEDDING_QUERY_PREFIX if is_e5 else "")
+        self.passage_prefix = passage_prefix if passage_prefix is not None else (EMBEDDING_PASSAGE_PREFIX if is_e5 else "")
+        self.normalize = normalize
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Эмбеддинги текстов как есть (без префиксов)"""
+        return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=self.normalize)
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Эмбеддинги поисковых запросов"""
+        return self.encode([self.query_prefix + query for query in queries])
+
+    def encode_passages(self, passages: List[str]) -> np.ndarray:
+        """Эмбеддинги индексируемых текстов (чанков)"""
+        return self.encode([self.passage_prefix + passage for passage in passages])
@@ -0,0 +1,121 @@
+"""
+Keyword-поиск на SQLite FTS5
+
+Альтернатива HybridSearcher.search_bm25: вместо корпуса и токенов в памяти
+каждого процесса используется полнотекстовый индекс в metadata.db
+(таблицы chunk_texts + chunks_fts, см. MIGRATIONS в metadata_manager.py).
+Ранжирование — встроенная функция bm25(). Индекс обновляется в той же
+транзакции, что и метаданные инструкций, а при удалении инструкции тексты
+её чанков удаляются каскадно.
+"""
+import sqlite3
+from typing import List, Dict
+
+from src.config import METADATA_DB
+from src.metadata_manager import MetadataManager
+from src.tokenizer import tokenize_russian
+
+# Веса колонок для bm25(): совпадение в названии важнее совпадения в тексте
+TITLE_WEIGHT = 2.0
+TEXT_WEIGHT = 1.0
+
+# Основы короче этого ищутся точным совпадением, а не по префиксу
+MIN_PREFIX_LENGTH = 3
+
+
+def build_match_query(query: str) -> str:
+    """
+    Запрос пользователя -> выражение FTS5 MATCH
+
+    Слова запроса проходят общий конвейер src/tokenizer.py (стоп-слова,
+    стемминг). Индекс хранит слова как есть, поэтому основа ищется по
+    префиксу: "накладн"* находит "накладная", "накладной", "накладные".
+    Каждый токен берётся в кавычки (чтобы спецсимволы не ломали синтаксис),
+    токены объединяются через OR — как в BM25, где документ набирает score
+    за любое совпавшее слово.
+    """
+    tokens = tokenize_russian(query)
+    return ' OR '.join(
+        f'"{token}"*' if len(token) >= MIN_PREFIX_LENGTH else f'"{token}"'
+        for token in dict.fromkeys(tokens)
+    )
+
+
+def index_chunks(
+    cursor: sqlite3.Cursor,
+    chunk_ids: List[str],
+    instruction_ids: List[str],
+    titles: List[str],
+    texts: List[str]
+):
+    """
+    Добавление текстов чанков в индекс (в текущей транзакции вызывающего)
+
+    Вызывается из before_commit в MetadataManager.add_instructions_bulk,
+    поэтому индекс фиксируется вместе с метаданными.
+    """
+    # Не INSERT OR REPLACE: при REPLACE триггер удаления из chunks_fts не срабатывает
+    cursor.executemany('DELETE FROM chunk_texts WHERE chunk_id = ?', [(c,) for c in chunk_ids])
+    cursor.executemany(
+        'INSERT INTO chunk_texts (chunk_id, instruction_id, title, text) VALUES (?, ?, ?, ?)',
+        list(zip(chunk_ids, instruction_ids, titles, texts))
+    )
+
+
+class FTSSearcher:
+    """
+    Keyword-поиск по индексу FTS5
+
+    Результаты в том же формате, что и HybridSearcher.search_bm25
+    ({doc_id, text, bm25_score}), поэтому подходят для HybridSearcher.combine_scores.
+    """
+
+    def __init__(self, db_path: str = METADATA_DB):
+        # Пул подключений metadata.db (с применёнными миграциями схемы)
+        self.pool = MetadataManager(db_path).pool
+
+    def search_bm25(self, query: str, top_k: int = 10, active_only: bool = True) -> List[Dict]:
+        """
+        Keyword-based поиск через FTS5
+
+        Returns:
+            List of {doc_id, text, bm25_score, metadata}
+        """
+        match_query = build_match_query(query)
+        if not match_query:
+            return []
+
+        sql = f'''
+            SELECT
+                c.chunk_id, c.instruction_id, c.title, c.text,
+                bm25(chunks_fts, {TITLE_WEIGHT}, {TEXT_WEIGHT}) AS score
+            FROM chunks_fts
+            JOIN chunk_texts c ON c.rowid = chunks_fts.rowid
+            JOIN instructions i ON i.id = c.instruction_id
+            WHERE chunks_fts MATCH ?
+        '''
+        if active_only:
+            sql += ' AND i.active = 1'
+        sql += ' ORDER BY score LIMIT ?'
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, (match_query, top_k)).fetchall()
+
+        # bm25() в FTS5 отрицательный: чем меньше, тем релевантнее
+        return [
+            {
+                'doc_id': row['chunk_id'],
+                'text': row['text'],
+                'bm25_score': -row['score'],
+                'metadata': {
+                    'instruction_id': row['instruction_id'],
+                    'title': row['title']
+                }
+            }
+            for row in rows
+        ]
+
+    def count(self) -> int:
+        """Число чанков в индексе"""
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM chunk_texts').fetchone()[0]
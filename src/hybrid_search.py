@@ -2,13 +2,8 @@ from typing import List, Dict
 from rank_bm25 import BM25Okapi
 import numpy as np
 
-
-def tokenize_russian(text: str) -> List[str]:
-    """Простая токенизация для русского текста"""
-    import re
-    # Приводим к нижнему регистру и разбиваем по пробелам/знакам
-    tokens = re.findall(r'\b\w+\b', text.lower())
-    return tokens
+# Токенизация со стеммингом и стоп-словами — общая для keyword-движков
+from src.tokenizer import tokenize_russian
 
 
 class HybridSearcher:
@@ -0,0 +1,258 @@
+"""
+Переносимый пакет индекса: экспорт с узла загрузки, импорт на узлы поиска
+
+Пакет — каталог с манифестом:
+- manifest.json — версия формата, модель и настройки эмбеддингов,
+  размерность, число записей, SHA-256 файлов
+- documents.npy / documents.jsonl — векторы чанков (float32, как в
+  хранилище) и их id, текст и метаданные построчно в том же порядке
+- instructions.npy / instructions.jsonl — то же для индекса инструкций
+- metadata.db — копия базы метаданных (инструкции, теги, FTS, полные
+  векторы для пересчёта), снятая backup API SQLite
+- embedding_projection.npz — проекция сжатия (если включено)
+- images/ — изображения инструкций
+
+Импорт заливает векторы пачками напрямую в хранилище, без эмбеддингов,
+поэтому он на порядки быстрее переиндексации. Узлы поиска запускаются
+с RAG_READ_ONLY=1 (config.READ_ONLY): загрузка и изменения базы в них
+отключены, новый пакет импортируется при остановленном узле.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+from typing import Dict
+
+import numpy as np
+
+from src.config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_QUERY_PREFIX,
+    EMBEDDING_PASSAGE_PREFIX,
+    EMBEDDING_NORMALIZE,
+    EMBEDDING_REDUCTION,
+    EMBEDDING_REDUCED_DIM,
+    EMBEDDING_PROJECTION_FILE,
+    VECTOR_SPACE,
+    METADATA_DB,
+    IMAGES_DIR
+)
+from src.index_lock import index_write_lock
+from src.storage import DOCUMENTS_COLLECTION, INSTRUCTIONS_COLLECTION
+from src.vector_store import VectorStore, NumpyVectorStore, get_vector_store
+
+BUNDLE_FORMAT = "rag-index-bundle"
+BUNDLE_VERSION = 1
+
+# Пачка чтения/записи хранилища
+BUNDLE_BATCH_SIZE = 5000
+
+# Настройки, от которых зависят векторы: на узле поиска должны совпадать
+_EMBEDDING_SETTINGS = {
+    'embedding_model': EMBEDDING_MODEL_NAME,
+    'query_prefix': EMBEDDING_QUERY_PREFIX,
+    'passage_prefix': EMBEDDING_PASSAGE_PREFIX,
+    'normalize': EMBEDDING_NORMALIZE,
+    'reduction': EMBEDDING_REDUCTION,
+    # без сжатия размерность задаёт модель, EMBEDDING_REDUCED_DIM не используется
+    'reduced_dim': EMBEDDING_REDUCED_DIM if EMBEDDING_REDUCTION is not None else None,
+}
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(4 * 1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _export_store(store: VectorStore, bundle_dir: str, name: str) -> Dict:
+    """Векторы хранилища в <name>.npy, записи — в <name>.jsonl (тот же порядок)"""
+    total = store.count()
+    vectors = None
+    written = 0
+    with open(os.path.join(bundle_dir, f'{name}.jsonl'), 'w', encoding='utf-8') as records:
+        for offset in range(0, total, BUNDLE_BATCH_SIZE):
+            batch = store.get(
+                include=['documents', 'metadatas', 'embeddings'],
+                limit=BUNDLE_BATCH_SIZE,
+                offset=offset
+            )
+            embeddings = np.asarray(batch['embeddings'], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(bundle_dir, f'{name}.npy'),
+                    mode='w+',
+                    dtype=np.float32,
+                    shape=(total, embeddings.shape[1])
+                )
+            vectors[written:written + len(embeddings)] = embeddings
+            for record_id, document, metadata in zip(batch['ids'], batch['documents'], batch['metadatas']):
+                records.write(json.dumps({'id': record_id, 'document': document, 'metadata': metadata},
+                                         ensure_ascii=False) + '\n')
+            written += len(embeddings)
+
+    dimension = 0
+    if vectors is not None:
+        dimension = vectors.shape[1]
+        vectors.flush()
+        del vectors
+    return {'count': written, 'dimension': dimension}
+
+
+def export_bundle(bundle_dir: str) -> Dict:
+    """
+    Экспорт базы знаний в пакет
+
+    Запись в базу на время экспорта блокируется (index_write_lock),
+    поэтому векторы и metadata.db согласованы.
+
+    Returns:
+        Манифест пакета
+    """
+    if os.path.exists(bundle_dir) and os.listdir(bundle_dir):
+        raise ValueError(f"Каталог пакета не пуст: {bundle_dir}")
+    os.makedirs(bundle_dir, exist_ok=True)
+
+    with index_write_lock():
+        stores = {
+            DOCUMENTS_COLLECTION: _export_store(get_vector_store(), bundle_dir, DOCUMENTS_COLLECTION),
+            INSTRUCTIONS_COLLECTION: _export_store(
+                get_vector_store(INSTRUCTIONS_COLLECTION), bundle_dir, INSTRUCTIONS_COLLECTION
+            ),
+        }
+
+        source = sqlite3.connect(METADATA_DB, timeout=30)
+        target = sqlite3.connect(os.path.join(bundle_dir, 'metadata.db'))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+        if EMBEDDING_REDUCTION == 'pca' and os.path.exists(EMBEDDING_PROJECTION_FILE):
+            shutil.copy2(EMBEDDING_PROJECTION_FILE, os.path.join(bundle_dir, 'embedding_projection.npz'))
+        if os.path.isdir(IMAGES_DIR):
+            shutil.copytree(IMAGES_DIR, os.path.join(bundle_dir, 'images'))
+
+    files = {}
+    for directory, _, names in os.walk(bundle_dir):
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            files[os.path.relpath(path, bundle_dir).replace(os.sep, '/')] = _sha256(path)
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': BUNDLE_VERSION,
+        'created_at': datetime.now().isoformat(),
+        **_EMBEDDING_SETTINGS,
+        'vector_space': VECTOR_SPACE,
+        'stores': stores,
+        'files': files
+    }
+    with open(os.path.join(bundle_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Пакет {bundle_dir}: {stores[DOCUMENTS_COLLECTION]['count']} чанков, "
+          f"{stores[INSTRUCTIONS_COLLECTION]['count']} инструкций")
+    return manifest
+
+
+def load_manifest(bundle_dir: str, verify: bool = True) -> Dict:
+    """
+    Манифест пакета с проверкой формата и (опционально) контрольных сумм
+
+    Raises:
+        ValueError: не пакет индекса, неподдерживаемая версия или повреждённый файл
+    """
+    manifest_path = os.path.join(bundle_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"Нет manifest.json в {bundle_dir}")
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"{bundle_dir} — не пакет индекса")
+    if manifest.get('version') != BUNDLE_VERSION:
+        raise ValueError(f"Версия пакета {manifest.get('version')} не поддерживается (ожидается {BUNDLE_VERSION})")
+
+    if verify:
+        for name, digest in manifest['files'].items():
+            path = os.path.join(bundle_dir, *name.split('/'))
+            if not os.path.exists(path) or _sha256(path) != digest:
+                raise ValueError(f"Файл пакета отсутствует или повреждён: {name}")
+    return manifest
+
+
+def _import_store(store: VectorStore, bundle_dir: str, name: str) -> int:
+    """Заливка <name>.npy + <name>.jsonl в пустое хранилище"""
+    vectors_path = os.path.join(bundle_dir, f'{name}.npy')
+    if not os.path.exists(vectors_path):
+        return 0
+    vectors = np.load(vectors_path, mmap_mode='r')
+    batch_size = BUNDLE_BATCH_SIZE
+
+    written = 0
+    with open(os.path.join(bundle_dir, f'{name}.jsonl'), encoding='utf-8') as records:
+        while written < len(vectors):
+            batch = [json.loads(next(records)) for _ in range(min(batch_size, len(vectors) - written))]
+            embeddings = vectors[written:written + len(batch)]
+            store.add(
+                ids=[record['id'] for record in batch],
+                embeddings=embeddings if isinstance(store, NumpyVectorStore) else embeddings.tolist(),
+                metadatas=[record['metadata'] for record in batch],
+                documents=[record['document'] for record in batch]
+            )
+            written += len(batch)
+    return written
+
+
+def import_bundle(bundle_dir: str, verify: bool = True, force: bool = False) -> Dict:
+    """
+    Загрузка пакета на узел: текущая база знаний заменяется содержимым пакета
+
+    Args:
+        verify: Проверять SHA-256 файлов пакета
+        force: Импортировать, даже если настройки эмбеддингов не совпадают
+
+    Returns:
+        Манифест пакета
+
+    Raises:
+        ValueError: пакет повреждён или собран с другими настройками эмбеддингов
+    """
+    manifest = load_manifest(bundle_dir, verify)
+
+    mismatched = [key for key, value in _EMBEDDING_SETTINGS.items() if manifest.get(key) != value]
+    if mismatched and not force:
+        details = ", ".join(f"{key}: {manifest.get(key)!r} ≠ {_EMBEDDING_SETTINGS[key]!r}" for key in mismatched)
+        raise ValueError(f"Пакет собран с другими настройками эмбеддингов ({details})")
+    if manifest.get('vector_space') != VECTOR_SPACE:
+        print(f"⚠️  Пакет собран с пространством {manifest.get('vector_space')}, в настройках {VECTOR_SPACE}")
+
+    with index_write_lock():
+        for name in (DOCUMENTS_COLLECTION, INSTRUCTIONS_COLLECTION):
+            get_vector_store(name).drop()
+            count = _import_store(get_vector_store(name), bundle_dir, name)
+            print(f"   {name}: {count} записей")
+
+        # backup API поверх открытой базы: подключения пула видят новое содержимое
+        source = sqlite3.connect(os.path.join(bundle_dir, 'metadata.db'))
+        target = sqlite3.connect(METADATA_DB, timeout=30)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+        projection_path = os.path.join(bundle_dir, 'embedding_projection.npz')
+        if os.path.exists(projection_path):
+            shutil.copy2(projection_path, EMBEDDING_PROJECTION_FILE)
+        images_dir = os.path.join(bundle_dir, 'images')
+        if os.path.isdir(images_dir):
+            shutil.copytree(images_dir, IMAGES_DIR, dirs_exist_ok=True)
+
+    print(f"✅ Импортирован пакет от {manifest['created_at']}")
+    return manifest
@@ -0,0 +1,104 @@
+"""
+Блокировка записи в базу знаний
+
+Изменение инструкции затрагивает несколько хранилищ (хранилище векторов,
+индекс инструкций, metadata.db). Все такие записи выполняются под
+index_write_lock, а снимок (src/backup.py) берёт ту же блокировку —
+поэтому он видит хранилища в согласованном состоянии. Блокировка действует
+между потоками приложения и между процессами (приложение, скрипты
+обслуживания, резервное копирование по расписанию).
+
+При выходе из блокировки увеличивается поколение индекса (index_generation):
+по нему долгоживущие компоненты (RAGPipeline в приложении) узнают, что
+база изменилась — в том числе другим процессом, — и обновляют только
+производное состояние, не перезагружая модели.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from src.config import INDEX_LOCK_FILE, INDEX_GENERATION_FILE, READ_ONLY
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Монопольная блокировка файла (ждёт, пока её не отпустит другой процесс)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK сдаётся через ~10 секунд — ждём дальше
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def index_generation() -> int:
+    """Текущее поколение индекса (0 — база ещё не менялась)"""
+    try:
+        with open(INDEX_GENERATION_FILE, encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _bump_generation():
+    """Следующее поколение (вызывается под файловой блокировкой)"""
+    tmp_path = INDEX_GENERATION_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(str(index_generation() + 1))
+    os.replace(tmp_path, INDEX_GENERATION_FILE)
+
+
+_thread_lock = threading.RLock()
+_depth = 0  # вложенность в потоке-владельце (файл блокируется один раз)
+
+
+@contextmanager
+def index_write_lock() -> Iterator[None]:
+    """
+    Блокировка записи в хранилища базы знаний
+
+    Повторный вход из того же потока разрешён (скрипт перестройки индекса
+    вызывает build_instruction_index под той же блокировкой). Поколение
+    индекса увеличивается при выходе из внешней блокировки.
+
+    Raises:
+        PermissionError: узел только для чтения (RAG_READ_ONLY=1)
+    """
+    global _depth
+    if READ_ONLY:
+        raise PermissionError("Узел только для чтения (RAG_READ_ONLY=1): изменения базы запрещены")
+    with _thread_lock:
+        if _depth:
+            _depth += 1
+            try:
+                yield
+            finally:
+                _depth -= 1
+            return
+
+        with file_lock(INDEX_LOCK_FILE):
+            _depth = 1
+            try:
+                yield
+            finally:
+                _depth = 0
+                # И после ошибки: часть хранилищ могла успеть измениться
+                _bump_generation()
@@ -0,0 +1,199 @@
+"""
+Согласование метаданных SQLite и ChromaDB
+
+Флаг active хранится в двух местах: в таблице instructions (SQLite) и
+в метаданных каждого чанка и записи индекса инструкций (ChromaDB, по нему
+фильтрует поиск). Изменения
+активности должны проходить через этот модуль, иначе неактуальные инструкции
+продолжают находиться поиском.
+"""
+from typing import List, Dict
+
+from src.index_lock import index_write_lock
+from src.metadata_manager import MetadataManager
+from src.instruction_index import set_active as set_instruction_index_active
+from src.vector_store import get_vector_store, get_instruction_store
+
+# Размер пачки при чтении/обновлении чанков в ChromaDB
+CHROMA_BATCH_SIZE = 500
+
+
+def _get_chunks_by_instructions(collection, instruction_ids: List[str]) -> Dict:
+    """Все чанки указанных инструкций (id + метаданные)"""
+    ids = []
+    metadatas = []
+    for start in range(0, len(instruction_ids), CHROMA_BATCH_SIZE):
+        batch_ids = instruction_ids[start:start + CHROMA_BATCH_SIZE]
+        results = collection.get(
+            where={"instruction_id": {"$in": batch_ids}},
+            include=['metadatas']
+        )
+        ids.extend(results['ids'])
+        metadatas.extend(results['metadatas'])
+    return {'ids': ids, 'metadatas': metadatas}
+
+
+def _update_chunks_active(collection, chunk_ids: List[str], metadatas: List[Dict], active: bool):
+    """Запись флага active в метаданные чанков пачками"""
+    for start in range(0, len(chunk_ids), CHROMA_BATCH_SIZE):
+        collection.update_metadata(
+            ids=chunk_ids[start:start + CHROMA_BATCH_SIZE],
+            metadatas=[
+                {**metadata, 'active': active}
+                for metadata in metadatas[start:start + CHROMA_BATCH_SIZE]
+            ]
+        )
+
+
+def set_instructions_active(
+    instruction_ids: List[str],
+    active: bool,
+    metadata_manager: MetadataManager = None,
+    collection=None,
+    instruction_collection=None
+) -> bool:
+    """
+    Активация/деактивация инструкций в SQLite и во всех их чанках ChromaDB
+
+    Сначала обновляются чанки (операция идемпотентна), затем SQLite одной
+    транзакцией. Если SQLite не удалось обновить, чанки возвращаются в прежнее
+    состояние. Оставшееся расхождение исправляет reconcile_active_flags.
+
+    Args:
+        instruction_ids: ID инструкций
+        active: Новое значение флага
+        metadata_manager: Менеджер метаданных (по умолчанию создаётся новый)
+        collection: Хранилище чанков (по умолчанию get_vector_store())
+        instruction_collection: Коллекция индекса инструкций
+
+    Returns:
+        True если оба хранилища обновлены
+    """
+    if not instruction_ids:
+        return True
+
+    metadata_manager = metadata_manager or MetadataManager()
+    if collection is None:
+        collection = get_vector_store()
+    if instruction_collection is None:
+        instruction_collection = get_instruction_store()
+
+    with index_write_lock():
+        chunks = {'ids': [], 'metadatas': []}
+        previous_entries = {}
+        try:
+            chunks = _get_chunks_by_instructions(collection, instruction_ids)
+            _update_chunks_active(collection, chunks['ids'], chunks['metadatas'], active)
+            previous_entries = set_instruction_index_active(instruction_collection, list(instruction_ids), active)
+        except Exception as e:
+            print(f"❌ Ошибка при обновлении чанков ChromaDB: {e}")
+            return False
+
+        if not metadata_manager.set_instructions_active(instruction_ids, active):
+            # Откатываем чанки к исходным метаданным
+            try:
+                for start in range(0, len(chunks['ids']), CHROMA_BATCH_SIZE):
+                    collection.update_metadata(
+                        ids=chunks['ids'][start:start + CHROMA_BATCH_SIZE],
+                        metadatas=chunks['metadatas'][start:start + CHROMA_BATCH_SIZE]
+                    )
+                if previous_entries:
+                    instruction_collection.update_metadata(
+                        ids=list(previous_entries),
+                        metadatas=list(previous_entries.values())
+                    )
+            except Exception as e:
+                print(f"⚠️  Не удалось откатить чанки ChromaDB: {e}")
+            return False
+
+        return True
+
+
+def reconcile_active_flags(
+    fix: bool = True,
+    metadata_manager: MetadataManager = None,
+    collection=None,
+    instruction_collection=None
+) -> Dict:
+    """
+    Поиск и исправление расхождений между SQLite и ChromaDB
+
+    SQLite считается источником истины для флага active. Проверяются чанки
+    и записи индекса инструкций.
+
+    Args:
+        fix: Исправлять найденные расхождения (False — только отчёт)
+
+    Returns:
+        Отчёт: {'checked_chunks', 'mismatched_chunks', 'fixed_chunks',
+                'orphan_chunks', 'instructions_without_chunks',
+                'mismatched_index_entries', 'fixed_index_entries',
+                'orphan_index_entries', 'instructions_missing_from_index'}
+    """
+    metadata_manager = metadata_manager or MetadataManager()
+    if collection is None:
+        collection = get_vector_store()
+    if instruction_collection is None:
+        instruction_collection = get_instruction_store()
+
+    flags = metadata_manager.get_active_flags()
+
+    mismatched = {True: ([], []), False: ([], [])}
+    orphan_chunks = []
+    seen_instructions = set()
+    checked = 0
+
+    total = collection.count()
+    for offset in range(0, total, CHROMA_BATCH_SIZE):
+        batch = collection.get(include=['metadatas'], limit=CHROMA_BATCH_SIZE, offset=offset)
+        for chunk_id, metadata in zip(batch['ids'], batch['metadatas']):
+            checked += 1
+            instruction_id = metadata.get('instruction_id')
+            if instruction_id not in flags:
+                orphan_chunks.append(chunk_id)
+                continue
+
+            seen_instructions.add(instruction_id)
+            expected = flags[instruction_id]
+            if bool(metadata.get('active')) != expected:
+                mismatched[expected][0].append(chunk_id)
+                mismatched[expected][1].append(metadata)
+
+    # Индекс инструкций: флаг active, записи удалённых и отсутствующие инструкции
+    mismatched_entries = {True: [], False: []}
+    orphan_entries = []
+    indexed = set()
+    total = instruction_collection.count()
+    for offset in range(0, total, CHROMA_BATCH_SIZE):
+        batch = instruction_collection.get(include=['metadatas'], limit=CHROMA_BATCH_SIZE, offset=offset)
+        for instruction_id, metadata in zip(batch['ids'], batch['metadatas']):
+            if instruction_id not in flags:
+                orphan_entries.append(instruction_id)
+                continue
+            indexed.add(instruction_id)
+            if bool(metadata.get('active')) != flags[instruction_id]:
+                mismatched_entries[flags[instruction_id]].append(instruction_id)
+
+    fixed = 0
+    fixed_entries = 0
+    if fix:
+        with index_write_lock():
+            for active, (chunk_ids, metadatas) in mismatched.items():
+                if chunk_ids:
+                    _update_chunks_active(collection, chunk_ids, metadatas, active)
+                    fixed += len(chunk_ids)
+            for active, instruction_ids in mismatched_entries.items():
+                if instruction_ids:
+                    fixed_entries += len(set_instruction_index_active(instruction_collection, instruction_ids, active))
+
+    return {
+        'checked_chunks': checked,
+        'mismatched_chunks': sum(len(ids) for ids, _ in mismatched.values()),
+        'fixed_chunks': fixed,
+        'orphan_chunks': orphan_chunks,
+        'instructions_without_chunks': [i for i in flags if i not in seen_instructions],
+        'mismatched_index_entries': sum(len(ids) for ids in mismatched_entries.values()),
+        'fixed_index_entries': fixed_entries,
+        'orphan_index_entries': orphan_entries,
+        'instructions_missing_from_index': [i for i in seen_instructions if i not in indexed]
+    }
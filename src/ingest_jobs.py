@@ -0,0 +1,396 @@
+"""
+Фоновая загрузка документов: очередь задач в SQLite и воркер
+
+Кнопка загрузки в приложении только сохраняет файл и ставит задачу в
+очередь (data/ingest_jobs.db). Разбор → чанкинг → эмбеддинги → запись
+выполняет воркер — поток приложения (get_ingest_worker) или отдельный
+процесс (scripts/ingest_worker.py). Закрытая вкладка браузера или
+перезапуск скрипта Streamlit загрузку не прерывают.
+
+Контрольные точки — по инструкциям: результат разбора документа
+сохраняется в ingest_job_items, после записи каждой пачки её инструкции
+отмечаются выполненными. После сбоя задача продолжается с первой
+невыполненной инструкции; инструкции, пачка которых успела записаться
+до отметки, узнаются по id в metadata.db и повторно не загружаются.
+Пока задача выполняется, отдельный поток воркера раз в
+INGEST_JOB_HEARTBEAT_INTERVAL отмечает её — в том числе во время долгого
+расчёта эмбеддингов одной пачки. Задача, воркер которой давно не
+отмечался (INGEST_JOB_STALE_AFTER, процесс упал или завис), снова ставится
+в очередь; прежний воркер, если он жив, теряет её: статус задачи
+меняет только воркер, за которым она закреплена.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import List, Dict, Optional
+
+from src.config import (
+    INGEST_JOBS_DB,
+    INGEST_BATCH_SIZE,
+    INGEST_JOB_POLL_INTERVAL,
+    INGEST_JOB_STALE_AFTER,
+    INGEST_JOB_HEARTBEAT_INTERVAL,
+    EMBEDDING_MODEL_NAME
+)
+from src.db_pool import get_pool
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def _init_jobs_db(conn):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id TEXT PRIMARY KEY,
+            file_path TEXT NOT NULL,
+            source_type TEXT NOT NULL,
+            tags TEXT NOT NULL,          -- JSON
+            author TEXT,
+            status TEXT NOT NULL,
+            error TEXT,
+            worker_id TEXT,
+            heartbeat_at REAL,           -- time.time() последней отметки воркера
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status, created_at);
+        CREATE TABLE IF NOT EXISTS ingest_job_items (
+            job_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            instruction_id TEXT NOT NULL,
+            title TEXT,
+            data TEXT NOT NULL,          -- инструкция (JSON, формат docs_parser.parse_document)
+            done INTEGER NOT NULL DEFAULT 0,
+            chunks INTEGER,
+            PRIMARY KEY (job_id, position),
+            FOREIGN KEY (job_id) REFERENCES ingest_jobs(id) ON DELETE CASCADE
+        );
+    ''')
+    conn.commit()
+
+
+# Задачи с прогрессом по контрольным точкам
+JOB_SELECT = '''
+    SELECT
+        j.*,
+        (SELECT COUNT(*) FROM ingest_job_items i WHERE i.job_id = j.id) AS total_items,
+        (SELECT COUNT(*) FROM ingest_job_items i WHERE i.job_id = j.id AND i.done = 1) AS done_items,
+        (SELECT COALESCE(SUM(i.chunks), 0) FROM ingest_job_items i WHERE i.job_id = j.id) AS chunks
+    FROM ingest_jobs j
+'''
+
+
+class IngestJobQueue:
+    """Очередь задач загрузки (общая для процессов через SQLite)"""
+
+    def __init__(self, db_path: str = INGEST_JOBS_DB):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.pool = get_pool(db_path, on_init=_init_jobs_db)
+
+    def enqueue(self, file_path: str, source_type: str, tags: List[str] = None, author: str = "Admin") -> str:
+        """Новая задача; возвращает её id"""
+        job_id = str(uuid.uuid4())
+        with self.pool.transaction() as conn:
+            conn.execute(
+                '''
+                INSERT INTO ingest_jobs (id, file_path, source_type, tags, author, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''',
+                (job_id, file_path, source_type, json.dumps(tags or [], ensure_ascii=False), author,
+                 STATUS_QUEUED, datetime.now().isoformat())
+            )
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """
+        Следующая задача для воркера (None — очередь пуста)
+
+        Задача захватывается одним UPDATE, поэтому два воркера (поток
+        приложения и отдельный процесс) не получат одну и ту же.
+        """
+        now = time.time()
+        with self.pool.transaction() as conn:
+            # Воркер задачи давно не отмечался (процесс упал) — задачу можно продолжить
+            conn.execute(
+                'UPDATE ingest_jobs SET status = ?, worker_id = NULL WHERE status = ? AND heartbeat_at < ?',
+                (STATUS_QUEUED, STATUS_RUNNING, now - INGEST_JOB_STALE_AFTER)
+            )
+            conn.execute(
+                '''
+                UPDATE ingest_jobs
+                SET status = ?, worker_id = ?, heartbeat_at = ?, started_at = COALESCE(started_at, ?)
+                WHERE id = (
+                    SELECT id FROM ingest_jobs WHERE status = ? ORDER BY created_at, rowid LIMIT 1
+                )
+                ''',
+                (STATUS_RUNNING, worker_id, now, datetime.now().isoformat(), STATUS_QUEUED)
+            )
+            row = conn.execute(
+                'SELECT * FROM ingest_jobs WHERE status = ? AND worker_id = ?',
+                (STATUS_RUNNING, worker_id)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Отметка воркера; False — задача за ним больше не закреплена"""
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(
+                'UPDATE ingest_jobs SET heartbeat_at = ? WHERE id = ? AND status = ? AND worker_id = ?',
+                (time.time(), job_id, STATUS_RUNNING, worker_id)
+            )
+            return cursor.rowcount > 0
+
+    def finish(self, job_id: str, worker_id: str, error: str = None) -> bool:
+        """
+        Задача выполнена (error=None) или завершилась ошибкой
+
+        Returns:
+            False — задача уже передана другому воркеру, статус не изменён
+        """
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(
+                '''
+                UPDATE ingest_jobs SET status = ?, error = ?, worker_id = NULL, finished_at = ?
+                WHERE id = ? AND status = ? AND worker_id = ?
+                ''',
+                (STATUS_FAILED if error else STATUS_DONE, error, datetime.now().isoformat(),
+                 job_id, STATUS_RUNNING, worker_id)
+            )
+            return cursor.rowcount > 0
+
+    def retry(self, job_id: str) -> bool:
+        """Повтор задачи с ошибкой (продолжится с невыполненных инструкций)"""
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(
+                'UPDATE ingest_jobs SET status = ?, error = NULL, finished_at = NULL WHERE id = ? AND status = ?',
+                (STATUS_QUEUED, job_id, STATUS_FAILED)
+            )
+            return cursor.rowcount > 0
+
+    def save_items(self, job_id: str, instructions: List[Dict]):
+        """Результат разбора документа — контрольные точки задачи"""
+        with self.pool.transaction() as conn:
+            conn.executemany(
+                '''
+                INSERT INTO ingest_job_items (job_id, position, instruction_id, title, data)
+                VALUES (?, ?, ?, ?, ?)
+                ''',
+                [
+                    (job_id, position, instruction['id'], instruction['title'],
+                     json.dumps(instruction, ensure_ascii=False))
+                    for position, instruction in enumerate(instructions)
+                ]
+            )
+
+    def get_items(self, job_id: str) -> List[Dict]:
+        """Инструкции задачи по порядку: {instruction, done}"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                'SELECT data, done FROM ingest_job_items WHERE job_id = ? ORDER BY position',
+                (job_id,)
+            ).fetchall()
+        return [{'instruction': json.loads(row['data']), 'done': bool(row['done'])} for row in rows]
+
+    def mark_done(self, job_id: str, chunk_counts: Dict[str, Optional[int]]):
+        """Отметка записанных инструкций {instruction_id: число чанков}"""
+        with self.pool.transaction() as conn:
+            conn.executemany(
+                'UPDATE ingest_job_items SET done = 1, chunks = ? WHERE job_id = ? AND instruction_id = ?',
+                [(chunks, job_id, instruction_id) for instruction_id, chunks in chunk_counts.items()]
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self.pool.connection() as conn:
+            row = conn.execute(JOB_SELECT + ' WHERE j.id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(self, limit: int = 10) -> List[Dict]:
+        """Последние задачи (новые первыми) с прогрессом"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(JOB_SELECT + ' ORDER BY j.created_at DESC LIMIT ?', (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+
+def process_job(
+    queue: IngestJobQueue,
+    job: Dict,
+    embedding_model,
+    metadata_manager=None,
+    batch_size: int = INGEST_BATCH_SIZE,
+    lost: threading.Event = None
+):
+    """
+    Выполнение задачи с контрольными точками по инструкциям
+
+    Args:
+        lost: Событие "задача передана другому воркеру" (ставит _Heartbeat);
+            проверяется перед каждой пачкой
+
+    Returns:
+        Число чанков, записанных в этом запуске
+
+    Raises:
+        RuntimeError: задача передана другому воркеру
+    """
+    from src.docs_parser import parse_document
+    from src.ingestion import ingest_instructions
+    from src.metadata_manager import MetadataManager
+
+    metadata_manager = metadata_manager or MetadataManager()
+
+    items = queue.get_items(job['id'])
+    if not items:
+        instructions = parse_document(
+            file_path=job['file_path'],
+            source_type=job['source_type'],
+            tags=json.loads(job['tags']),
+            author=job['author']
+        )
+        queue.save_items(job['id'], instructions)
+        items = queue.get_items(job['id'])
+
+    pending = [item['instruction'] for item in items if not item['done']]
+
+    # Пачка записалась, а отметка — нет (сбой между ними): такие инструкции уже в базе
+    known = metadata_manager.get_active_flags()
+    recovered = {instruction['id']: None for instruction in pending if instruction['id'] in known}
+    if recovered:
+        queue.mark_done(job['id'], recovered)
+        pending = [instruction for instruction in pending if instruction['id'] not in recovered]
+
+    total_chunks = 0
+    for start in range(0, len(pending), batch_size):
+        if lost is not None and lost.is_set():
+            raise RuntimeError("Задача передана другому воркеру")
+        batch = pending[start:start + batch_size]
+        chunk_counts = {}
+
+        def collect(instruction, chunk_count):
+            chunk_counts[instruction['id']] = chunk_count
+
+        total_chunks += ingest_instructions(
+            batch,
+            embedding_model=embedding_model,
+            metadata_manager=metadata_manager,
+            batch_size=batch_size,
+            on_progress=collect
+        )
+        queue.mark_done(job['id'], chunk_counts)
+
+    return total_chunks
+
+
+class _Heartbeat:
+    """Поток, отмечающий задачу раз в interval секунд, пока она выполняется"""
+
+    def __init__(self, queue: IngestJobQueue, job_id: str, worker_id: str, interval: float = INGEST_JOB_HEARTBEAT_INTERVAL):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"ingest-heartbeat-{job_id[:8]}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(self.job_id, self.worker_id):
+                    self.lost.set()
+                    return
+            except Exception as e:
+                # База занята — следующая попытка через interval, до INGEST_JOB_STALE_AFTER запас большой
+                print(f"⚠️  Не удалось отметить задачу {self.job_id}: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class IngestWorker:
+    """Воркер очереди загрузки: поток приложения или основной цикл scripts/ingest_worker.py"""
+
+    def __init__(self, queue: IngestJobQueue = None, poll_interval: float = INGEST_JOB_POLL_INTERVAL):
+        self.queue = queue or IngestJobQueue()
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread = None
+
+    def process(self, job: Dict):
+        """Выполнение захваченной задачи; ошибка сохраняется в задаче"""
+        from src.model_registry import get_embedding_model
+
+        print(f"📥 Задача загрузки {job['id']}: {os.path.basename(job['file_path'])}")
+        error = None
+        with _Heartbeat(self.queue, job['id'], self.worker_id) as heartbeat:
+            try:
+                chunks = process_job(
+                    self.queue,
+                    job,
+                    get_embedding_model(EMBEDDING_MODEL_NAME),
+                    lost=heartbeat.lost
+                )
+            except Exception as e:
+                error = str(e) or type(e).__name__
+
+        if not self.queue.finish(job['id'], self.worker_id, error=error):
+            print(f"⚠️  Задача {job['id']} передана другому воркеру, её статус не изменён")
+        elif error:
+            print(f"❌ Задача {job['id']} завершилась ошибкой: {error}")
+        else:
+            print(f"✅ Задача {job['id']} выполнена, чанков: {chunks}")
+
+    def run_pending(self) -> int:
+        """Выполнение задач, пока очередь не опустеет; возвращает их число"""
+        processed = 0
+        while not self._stop.is_set():
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                break
+            self.process(job)
+            processed += 1
+        return processed
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                # Ошибка очереди (например, база занята) не должна останавливать воркер
+                print(f"⚠️  Ошибка воркера загрузки: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Запуск в фоновом потоке"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name="ingest-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_worker: Optional[IngestWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_ingest_worker() -> IngestWorker:
+    """Общий для процесса воркер (запускается при первом вызове)"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = IngestWorker()
+            _worker.start()
+        return _worker
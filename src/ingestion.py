@@ -0,0 +1,229 @@
+"""
+Загрузка инструкций в базу знаний: чанкинг → эмбеддинги → ChromaDB + SQLite
+
+Инструкции обрабатываются пачками: эмбеддинги всей пачки считаются одним
+вызовом модели, чанки пишутся в ChromaDB одним add, метаданные — одной
+транзакцией SQLite. Если пачка не записалась в SQLite, её чанки удаляются
+из ChromaDB, чтобы хранилища не расходились.
+
+Вместе с чанками обновляется индекс инструкций (src/instruction_index.py)
+для двухэтапного поиска. При включённом сжатии эмбеддингов в ChromaDB
+пишутся векторы пониженной размерности, а полные — в metadata.db
+(src/embedding_compression.py).
+
+Почти одинаковые чанки (src/near_duplicates.py) не удаляются: они
+получают эмбеддинги и записываются, как остальные, с пометкой duplicate_of
+в метаданных. Поиск убирает дубль, только если среди кандидатов есть
+оригинал, поэтому после удаления или отключения оригинала текст дубля
+остаётся в поиске. Связь дубля с оригиналом сохраняется в metadata.db.
+"""
+import os
+from datetime import datetime
+from typing import List, Dict, Tuple, Callable
+
+from src.chunker import split_text
+from src.config import CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS, INGEST_BATCH_SIZE, NEAR_DUPLICATE_MODE
+from src.docs_parser import prepare_text_for_chunking
+from src.embedding_compression import EmbeddingCodec, get_embedding_codec, store_full_vectors
+from src.fts_search import index_chunks
+from src.index_lock import index_write_lock
+from src.instruction_index import upsert_instructions, delete_instructions
+from src.metadata_manager import MetadataManager
+from src.near_duplicates import find_near_duplicates, store_signatures, record_duplicates
+from src.storage import tag_metadata
+from src.vector_store import get_vector_store, get_instruction_store
+
+
+def build_chunks(instruction: Dict, created_at: str) -> Tuple[List[str], List[str], List[Dict]]:
+    """
+    Разбиение инструкции на чанки с метаданными для ChromaDB
+
+    Args:
+        instruction: Инструкция в формате docs_parser.parse_document;
+            необязательный ключ extra_metadata — скалярные поля источника
+            (например, дата и участники диалога Telegram), добавляются
+            в метаданные каждого чанка
+        created_at: Время загрузки (ISO)
+
+    Returns:
+        Tuple (id чанков, тексты чанков, метаданные чанков)
+    """
+    # Подготовка текста с заголовком
+    text_with_header = prepare_text_for_chunking(
+        instruction['text'],
+        instruction['title']
+    )
+
+    # Разбиение на чанки
+    chunks = split_text(
+        text_with_header,
+        max_length=CHUNK_SIZE_TOKENS * 4,
+        overlap=CHUNK_OVERLAP_TOKENS * 4
+    )
+
+    chunk_ids = []
+    metadatas = []
+    for i in range(len(chunks)):
+        chunk_ids.append(f"{instruction['id']}_chunk_{i}")
+        metadatas.append({
+            **(instruction.get('extra_metadata') or {}),
+            'instruction_id': instruction['id'],
+            'doc_id': instruction['doc_id'],
+            'title': instruction['title'],
+            'filename': os.path.basename(instruction['file_path']),
+            'file_path': instruction['file_path'],
+            'chunk_index': i,
+            'total_chunks': len(chunks),
+            'active': True,
+            'author': instruction.get('author', 'Admin'),
+            'created_at': created_at,
+            'images': ','.join(instruction.get('images', [])),
+            **tag_metadata(instruction.get('tags') or [])
+        })
+
+    return chunk_ids, chunks, metadatas
+
+
+def ingest_batch(
+    instructions: List[Dict],
+    embedding_model,
+    collection,
+    metadata_manager: MetadataManager,
+    instruction_collection=None,
+    codec: EmbeddingCodec = None,
+    near_duplicate_mode: str = NEAR_DUPLICATE_MODE
+) -> Dict[str, int]:
+    """
+    Запись одной пачки инструкций в ChromaDB и SQLite
+
+    Returns:
+        {instruction_id: число записанных чанков}
+
+    Raises:
+        RuntimeError: пачка не записана (оба хранилища откатываются)
+    """
+    created_at = datetime.now().isoformat()
+
+    all_ids, all_chunks, all_metadatas = [], [], []
+    chunk_counts = {}
+    for instruction in instructions:
+        chunk_ids, chunks, metadatas = build_chunks(instruction, created_at)
+        all_ids.extend(chunk_ids)
+        all_chunks.extend(chunks)
+        all_metadatas.extend(metadatas)
+        chunk_counts[instruction['id']] = len(chunks)
+
+    # Почти одинаковые чанки ищутся до эмбеддингов
+    signatures, duplicates = {}, {}
+    instruction_of = {chunk_id: m['instruction_id'] for chunk_id, m in zip(all_ids, all_metadatas)}
+    if near_duplicate_mode != 'off' and all_ids:
+        with metadata_manager.pool.connection() as conn:
+            signatures, duplicates = find_near_duplicates(conn, all_ids, all_chunks)
+
+    if duplicates:
+        for chunk_id, metadata in zip(all_ids, all_metadatas):
+            if chunk_id in duplicates:
+                metadata['duplicate_of'] = duplicates[chunk_id][0]
+        print(f"   ♻️  Почти одинаковых чанков: {len(duplicates)}")
+
+    codec = codec or EmbeddingCodec()
+
+    # Создание эмбеддингов всей пачки за один вызов
+    full_embeddings = embedding_model.encode_passages(all_chunks) if all_chunks else []
+    embeddings = codec.reduce(full_embeddings) if all_chunks else []
+
+    chroma_written = False
+
+    def write_chunks(cursor):
+        nonlocal chroma_written
+        # Индекс FTS5 пишется в той же транзакции SQLite
+        index_chunks(
+            cursor,
+            all_ids,
+            [m['instruction_id'] for m in all_metadatas],
+            [m['title'] for m in all_metadatas],
+            all_chunks
+        )
+        if codec.stores_full_vectors:
+            store_full_vectors(
+                cursor,
+                all_ids,
+                [m['instruction_id'] for m in all_metadatas],
+                full_embeddings,
+                codec.quantization
+            )
+        store_signatures(cursor, signatures, instruction_of)
+        record_duplicates(cursor, duplicates, instruction_of)
+        if all_ids:
+            chroma_written = True
+            collection.add(
+                documents=all_chunks,
+                embeddings=embeddings.tolist(),
+                metadatas=all_metadatas,
+                ids=all_ids
+            )
+            if instruction_collection is not None:
+                upsert_instructions(instruction_collection, all_metadatas, embeddings)
+
+    # Чанки пишутся внутри транзакции SQLite: ошибка ChromaDB откатывает метаданные и FTS
+    with index_write_lock():
+        if not metadata_manager.add_instructions_bulk(instructions, before_commit=write_chunks):
+            if chroma_written:
+                # commit SQLite не прошёл после записи чанков — убираем их
+                collection.delete(ids=all_ids)
+                if instruction_collection is not None:
+                    delete_instructions(list(chunk_counts), instruction_collection)
+            raise RuntimeError("Не удалось сохранить пачку инструкций")
+
+    return chunk_counts
+
+
+def ingest_instructions(
+    instructions: List[Dict],
+    embedding_model,
+    collection=None,
+    metadata_manager: MetadataManager = None,
+    instruction_collection=None,
+    codec: EmbeddingCodec = None,
+    batch_size: int = INGEST_BATCH_SIZE,
+    on_progress: Callable[[Dict, int], None] = None
+) -> int:
+    """
+    Загрузка инструкций пачками
+
+    Args:
+        instructions: Инструкции в формате docs_parser.parse_document
+        embedding_model: Модель эмбеддингов (EmbeddingModel)
+        collection: Хранилище чанков (по умолчанию get_vector_store())
+        metadata_manager: Менеджер метаданных (по умолчанию создаётся новый)
+        instruction_collection: Хранилище индекса инструкций (по умолчанию get_instruction_store())
+        codec: Сжатие эмбеддингов (по умолчанию по настройкам config.py)
+        batch_size: Инструкций в одной пачке
+        on_progress: Колбэк (инструкция, число чанков) после записи её пачки
+
+    Returns:
+        Общее число записанных чанков
+    """
+    metadata_manager = metadata_manager or MetadataManager()
+    if collection is None:
+        collection = get_vector_store()
+    if instruction_collection is None:
+        instruction_collection = get_instruction_store()
+    codec = codec or get_embedding_codec()
+
+    total_chunks = 0
+    for start in range(0, len(instructions), batch_size):
+        batch = instructions[start:start + batch_size]
+        chunk_counts = ingest_batch(
+            batch, embedding_model, collection, metadata_manager,
+            instruction_collection=instruction_collection,
+            codec=codec
+        )
+
+        for instruction in batch:
+            count = chunk_counts[instruction['id']]
+            total_chunks += count
+            if on_progress is not None:
+                on_progress(instruction, count)
+
+    return total_chunks
@@ -0,0 +1,124 @@
+"""
+Индекс уровня инструкций для двухэтапного поиска
+
+Хранилище "instructions" (src/vector_store.py) хранит один эмбеддинг на инструкцию —
+нормированное среднее эмбеддингов её чанков (чанки уже начинаются с
+заголовка "Документ: ...", поэтому название учитывается). Поиск сначала
+выбирает лучшие инструкции в этой коллекции, затем ищет чанки только
+среди них.
+
+Метаданные записи повторяют фильтруемые поля чанков (active, теги),
+поэтому к обеим коллекциям применяется один и тот же storage.build_where.
+"""
+from collections import OrderedDict
+from typing import List, Dict, Sequence
+
+import numpy as np
+
+from src.vector_store import get_instruction_store
+
+# Поля метаданных чанка, которые переносятся в запись инструкции
+_INSTRUCTION_FIELDS = ('instruction_id', 'doc_id', 'title', 'filename', 'active', 'created_at', 'tags')
+
+# Размер пачки при чтении/записи в ChromaDB
+CHROMA_BATCH_SIZE = 500
+
+
+def mean_pool(embeddings: Sequence[Sequence[float]]) -> List[float]:
+    """Нормированное среднее нормированных эмбеддингов"""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    centroid = (matrix / norms).mean(axis=0)
+    norm = np.linalg.norm(centroid)
+    if norm > 0:
+        centroid /= norm
+    return centroid.tolist()
+
+
+def build_instruction_entries(
+    metadatas: List[Dict],
+    embeddings: Sequence[Sequence[float]]
+) -> Dict[str, List]:
+    """
+    Записи индекса инструкций из чанков
+
+    Args:
+        metadatas: Метаданные чанков (как в ingestion.build_chunks)
+        embeddings: Эмбеддинги тех же чанков
+
+    Returns:
+        {'ids', 'embeddings', 'metadatas', 'documents'} для collection.add/upsert
+    """
+    grouped = OrderedDict()
+    for metadata, embedding in zip(metadatas, embeddings):
+        instruction_id = metadata['instruction_id']
+        if instruction_id not in grouped:
+            grouped[instruction_id] = (metadata, [])
+        grouped[instruction_id][1].append(embedding)
+
+    entries = {'ids': [], 'embeddings': [], 'metadatas': [], 'documents': []}
+    for instruction_id, (metadata, chunk_embeddings) in grouped.items():
+        # Теги переносятся целиком: и строка 'tags', и поля 'tag:...'
+        instruction_metadata = {
+            key: value for key, value in metadata.items()
+            if key in _INSTRUCTION_FIELDS or key.startswith('tag:')
+        }
+        instruction_metadata['total_chunks'] = len(chunk_embeddings)
+
+        entries['ids'].append(instruction_id)
+        entries['embeddings'].append(mean_pool(chunk_embeddings))
+        entries['metadatas'].append(instruction_metadata)
+        entries['documents'].append(metadata.get('title', ''))
+
+    return entries
+
+
+def upsert_instructions(collection, metadatas: List[Dict], embeddings: Sequence[Sequence[float]]) -> int:
+    """
+    Запись (или перезапись) инструкций в индекс по их чанкам
+
+    Returns:
+        Число записанных инструкций
+    """
+    entries = build_instruction_entries(metadatas, embeddings)
+    for start in range(0, len(entries['ids']), CHROMA_BATCH_SIZE):
+        end = start + CHROMA_BATCH_SIZE
+        collection.upsert(
+            ids=entries['ids'][start:end],
+            embeddings=entries['embeddings'][start:end],
+            metadatas=entries['metadatas'][start:end],
+            documents=entries['documents'][start:end]
+        )
+    return len(entries['ids'])
+
+
+def delete_instructions(instruction_ids: List[str], collection=None):
+    """Удаление инструкций из индекса (отсутствующие id игнорируются)"""
+    if not instruction_ids:
+        return
+    if collection is None:
+        collection = get_instruction_store()
+    collection.delete(ids=list(instruction_ids))
+
+
+def set_active(collection, instruction_ids: List[str], active: bool) -> Dict[str, Dict]:
+    """
+    Запись флага active в записи инструкций
+
+    Returns:
+        Исходные метаданные изменённых записей {id: metadata} — для отката
+    """
+    previous = {}
+    for start in range(0, len(instruction_ids), CHROMA_BATCH_SIZE):
+        batch = collection.get(ids=instruction_ids[start:start + CHROMA_BATCH_SIZE], include=['metadatas'])
+        previous.update(zip(batch['ids'], batch['metadatas']))
+
+    ids = list(previous)
+    for start in range(0, len(ids), CHROMA_BATCH_SIZE):
+        batch_ids = ids[start:start + CHROMA_BATCH_SIZE]
+        collection.update_metadata(
+            ids=batch_ids,
+            metadatas=[{**previous[i], 'active': active} for i in batch_ids]
+        )
+    return previous
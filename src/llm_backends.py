@@ -0,0 +1,248 @@
+"""
+Бэкенды LLM для LLMClient
+
+- OllamaBackend — локальный Ollama (по умолчанию)
+- OpenAICompatibleBackend — любой сервер с OpenAI-совместимым API
+  (llama.cpp server, vLLM и т.п.)
+- StubBackend — детерминированная заглушка внутри процесса с настраиваемой
+  задержкой и скоростью генерации (бенчмарки и нагрузочные тесты без модели)
+
+Выбор бэкенда — LLM_BACKEND в src/config.py.
+"""
+import hashlib
+import json
+import time
+import urllib.request
+from typing import List, Dict, Callable
+
+from src.config import (
+    LLM_BACKEND,
+    LLM_MODEL_NAME,
+    LLM_CONTEXT_TOKENS,
+    LLM_OPENAI_BASE_URL,
+    LLM_OPENAI_API_KEY,
+    LLM_STUB_LATENCY,
+    LLM_STUB_TOKENS_PER_SECOND
+)
+
+
+class LLMBackend:
+    """Базовый интерфейс бэкенда LLM"""
+
+    name = "base"
+
+    def list_models(self) -> List[str]:
+        """Список доступных моделей"""
+        raise NotImplementedError
+
+    def chat(
+        self,
+        model: str,
+        messages: List[Dict],
+        max_tokens: int,
+        temperature: float,
+        should_stop: Callable[[], bool] = None
+    ) -> str:
+        """
+        Генерация ответа по списку сообщений
+
+        Args:
+            model: Имя модели
+            messages: Сообщения в формате [{'role': ..., 'content': ...}]
+            max_tokens: Максимальное количество токенов в ответе
+            temperature: Параметр случайности
+            should_stop: Проверка отмены; если задана, ответ читается потоком
+                и генерация прерывается, как только она вернёт True
+
+        Returns:
+            Текст ответа (частичный, если генерация прервана)
+        """
+        raise NotImplementedError
+
+
+class OllamaBackend(LLMBackend):
+    """Локальный Ollama"""
+
+    name = "ollama"
+
+    def __init__(self, context_tokens: int = LLM_CONTEXT_TOKENS):
+        import ollama
+        self._ollama = ollama
+        self.context_tokens = context_tokens
+
+    def list_models(self) -> List[str]:
+        models = self._ollama.list()
+        # Ollama возвращает словарь с ключом 'models', который содержит список моделей
+        # Каждая модель - это словарь с разными ключами в зависимости от версии
+        available_models = []
+        for m in models.get('models', []):
+            # Пытаемся получить имя модели из разных возможных ключей
+            model_name = m.get('name') or m.get('model') or str(m)
+            available_models.append(model_name)
+        return available_models
+
+    def chat(self, model, messages, max_tokens, temperature, should_stop=None) -> str:
+        options = {
+            'num_ctx': self.context_tokens,
+            'num_predict': max_tokens,
+            'temperature': temperature
+        }
+
+        if should_stop is None:
+            response = self._ollama.chat(
+                model=model,
+                messages=messages,
+                options=options
+            )
+            return response['message']['content']
+
+        # Потоковый режим: закрытие генератора обрывает HTTP-соединение,
+        # и Ollama прекращает генерацию брошенного запроса
+        parts = []
+        stream = self._ollama.chat(
+            model=model,
+            messages=messages,
+            options=options,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if should_stop():
+                    print("⚠️  Генерация прервана (отмена или дедлайн)")
+                    break
+                parts.append(chunk['message']['content'])
+        finally:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+
+        return ''.join(parts)
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Сервер с OpenAI-совместимым API (/v1/chat/completions)"""
+
+    name = "openai"
+
+    def __init__(self, base_url: str = LLM_OPENAI_BASE_URL, api_key: str = LLM_OPENAI_API_KEY):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+
+    def _request(self, path: str, payload: Dict = None):
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=data,
+            headers=headers,
+            method='POST' if payload is not None else 'GET'
+        )
+        return urllib.request.urlopen(request)
+
+    def list_models(self) -> List[str]:
+        with self._request('/models') as response:
+            body = json.loads(response.read().decode('utf-8'))
+        return [m.get('id') for m in body.get('data', [])]
+
+    def chat(self, model, messages, max_tokens, temperature, should_stop=None) -> str:
+        payload = {
+            'model': model,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'stream': should_stop is not None
+        }
+
+        if should_stop is None:
+            with self._request('/chat/completions', payload) as response:
+                body = json.loads(response.read().decode('utf-8'))
+            return body['choices'][0]['message']['content']
+
+        # Потоковый режим (Server-Sent Events): строки вида "data: {...}"
+        parts = []
+        with self._request('/chat/completions', payload) as response:
+            for raw_line in response:
+                if should_stop():
+                    print("⚠️  Генерация прервана (отмена или дедлайн)")
+                    break
+
+                line = raw_line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+
+                delta = json.loads(data)['choices'][0].get('delta', {})
+                parts.append(delta.get('content') or '')
+
+        return ''.join(parts)
+
+
+class StubBackend(LLMBackend):
+    """
+    Детерминированная заглушка LLM
+
+    Ответ зависит только от входных сообщений. Время ответа моделируется
+    задержкой до первого токена (latency) и скоростью генерации (tokens_per_second).
+    """
+
+    name = "stub"
+
+    # Длина ответа заглушки в токенах (если max_tokens не меньше)
+    ANSWER_TOKENS = 120
+
+    def __init__(
+        self,
+        latency: float = LLM_STUB_LATENCY,
+        tokens_per_second: float = LLM_STUB_TOKENS_PER_SECOND
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+
+    def list_models(self) -> List[str]:
+        # Заглушка подменяет модель из конфигурации
+        return [LLM_MODEL_NAME]
+
+    def _make_tokens(self, messages: List[Dict], max_tokens: int) -> List[str]:
+        """Детерминированный набор токенов из текста последнего сообщения"""
+        prompt = messages[-1]['content'] if messages else ""
+        digest = hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8]
+        words = prompt.split() or ["ответ"]
+
+        count = min(self.ANSWER_TOKENS, max_tokens)
+        tokens = [f"[STUB {digest}]"]
+        tokens.extend(words[i % len(words)] for i in range(max(count - 1, 0)))
+        return tokens
+
+    def chat(self, model, messages, max_tokens, temperature, should_stop=None) -> str:
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        parts = []
+        for token in self._make_tokens(messages, max_tokens):
+            if should_stop is not None and should_stop():
+                break
+            if delay:
+                time.sleep(delay)
+            parts.append(token)
+
+        return ' '.join(parts)
+
+
+_BACKENDS = {
+    OllamaBackend.name: OllamaBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def get_llm_backend(name: str = LLM_BACKEND) -> LLMBackend:
+    """Создание бэкенда LLM по имени ('ollama', 'openai', 'stub')"""
+    if name not in _BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд LLM: {name}. Доступные: {list(_BACKENDS)}")
+    return _BACKENDS[name]()
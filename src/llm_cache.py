@@ -0,0 +1,141 @@
+"""
+Кэш ответов LLM на диске (SQLite)
+
+Ключ — хэш полностью сформированных сообщений (system + user), модели
+и параметров генерации. Одинаковый запрос с тем же контекстом не генерируется
+повторно: ночные регрессионные прогоны и частые вопросы берутся из кэша.
+
+Вытеснение: по TTL (created_at) и по размеру (самые давно использованные записи).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import List, Dict, Optional
+
+from src.config import LLM_CACHE_DB, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+
+
+class LLMResponseCache:
+    """Постоянный кэш ответов LLM"""
+
+    def __init__(
+        self,
+        db_path: str = LLM_CACHE_DB,
+        ttl: int = LLM_CACHE_TTL,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES
+    ):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._init_db()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Получение подключения к БД"""
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        """Создание таблицы кэша"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._get_connection()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_accessed_at REAL NOT NULL,
+                    hits INTEGER DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(last_accessed_at)')
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], options: Dict) -> str:
+        """Отпечаток запроса: сообщения + модель + параметры генерации"""
+        payload = json.dumps(
+            {'model': model, 'messages': messages, 'options': options},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Ответ из кэша или None (отсутствует / истёк TTL)"""
+        now = time.time()
+        conn = self._get_connection()
+        try:
+            row = conn.execute(
+                'SELECT response, created_at FROM llm_cache WHERE key = ?',
+                (key,)
+            ).fetchone()
+            if not row:
+                return None
+
+            response, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                conn.commit()
+                return None
+
+            conn.execute(
+                'UPDATE llm_cache SET last_accessed_at = ?, hits = hits + 1 WHERE key = ?',
+                (now, key)
+            )
+            conn.commit()
+            return response
+        finally:
+            conn.close()
+
+    def set(self, key: str, model: str, response: str):
+        """Сохранение ответа и вытеснение устаревших записей"""
+        now = time.time()
+        conn = self._get_connection()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_accessed_at, hits)
+                VALUES (?, ?, ?, ?, ?, 0)
+            ''', (key, model, response, now, now))
+            self._evict(conn, now)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Удаление истёкших записей и записей сверх лимита"""
+        if self.ttl:
+            conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl,))
+
+        if self.max_entries:
+            conn.execute('''
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache
+                    ORDER BY last_accessed_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+
+    def clear(self):
+        """Полная очистка кэша"""
+        conn = self._get_connection()
+        try:
+            conn.execute('DELETE FROM llm_cache')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_stats(self) -> Dict:
+        """Статистика кэша"""
+        conn = self._get_connection()
+        try:
+            entries, hits = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_cache'
+            ).fetchone()
+        finally:
+            conn.close()
+        return {'entries': entries, 'hits': hits}
@@ -1,43 +1,127 @@
 """
-LLM клиент для работы с Ollama (llama3:8b)
+LLM клиент для работы с локальной моделью
+
+Сам вызов модели выполняет бэкенд из src/llm_backends.py
+(Ollama, OpenAI-совместимый сервер или заглушка для нагрузочных тестов).
+Готовые ответы хранятся в кэше на диске (src/llm_cache.py).
 """
-import ollama
-from src.config import LLM_MODEL_NAME, LLM_MAX_TOKENS
+from typing import Callable, List, Dict, Optional
+from src.config import LLM_MODEL_NAME, LLM_MAX_TOKENS, LLM_CACHE_ENABLED
+from src.llm_backends import LLMBackend, get_llm_backend
+from src.llm_cache import LLMResponseCache
+
+
+RAG_SYSTEM_PROMPT = """Ты — помощник по поиску информации в базе знаний инструкций.
+
+ВАЖНЫЕ ПРАВИЛА:
+1. Используй ТОЛЬКО информацию из предоставленного контекста
+2. Если в контексте нет ответа на вопрос — честно скажи "В базе знаний нет информации по этому вопросу"
+3. Не придумывай информацию, которой нет в контексте
+4. Отвечай четко, структурированно, по делу
+5. Если в контексте есть упоминания изображений в формате [[image: путь]] — обязательно упомяни об этом в ответе, например: "См. изображение для визуального примера" или "На изображении показано..."
+6. Изображения из контекста будут автоматически показаны пользователю отдельно, но ты должен упомянуть их наличие в своем ответе
+7. Отвечай на русском языке"""
+
+# Низкая температура для точности
+RAG_TEMPERATURE = 0.3
+
+
+def build_rag_prompt(query: str, context: str) -> str:
+    """Пользовательский промпт RAG: контекст + вопрос"""
+    return f"""КОНТЕКСТ ИЗ БАЗЫ ЗНАНИЙ:
+{context}
+
+---
+
+ВОПРОС ПОЛЬЗОВАТЕЛЯ:
+{query}
+
+---
+
+ОТВЕТ (используй только информацию из контекста выше):"""
 
 
 class LLMClient:
     """
-    Клиент для взаимодействия с локальной LLM через Ollama
+    Клиент для взаимодействия с локальной LLM
     """
 
-    def __init__(self, model_name: str = LLM_MODEL_NAME):
+    def __init__(
+        self,
+        model_name: str = LLM_MODEL_NAME,
+        backend: LLMBackend = None,
+        cache: LLMResponseCache = None
+    ):
         self.model_name = model_name
+        self.backend = backend or get_llm_backend()
+        if cache is None and LLM_CACHE_ENABLED:
+            cache = LLMResponseCache()
+        self.cache = cache
         self._verify_model()
 
     def _verify_model(self):
         """Проверка доступности модели"""
         try:
-            models = ollama.list()
-            # Ollama возвращает словарь с ключом 'models', который содержит список моделей
-            # Каждая модель - это словарь с разными ключами в зависимости от версии
-            available_models = []
-            for m in models.get('models', []):
-                # Пытаемся получить имя модели из разных возможных ключей
-                model_name = m.get('name') or m.get('model') or str(m)
-                available_models.append(model_name)
+            available_models = self.backend.list_models()
 
             if self.model_name not in available_models:
-                print(f"⚠️  Модель {self.model_name} не найдена в списке.")
+                print(f"⚠️  Модель {self.model_name} не найдена в списке ({self.backend.name}).")
                 print(f"   Доступные модели: {available_models}")
         except Exception as e:
             print(f"⚠️  Предупреждение: не удалось проверить модель: {e}")
 
-    def generate(
+    @staticmethod
+    def _build_messages(prompt: str, system_prompt: str = None) -> List[Dict]:
+        """Формирование списка сообщений для модели"""
+        messages = []
+
+        if system_prompt:
+            messages.append({
+                'role': 'system',
+                'content': system_prompt
+            })
+
+        messages.append({
+            'role': 'user',
+            'content': prompt
+        })
+
+        return messages
+
+    def _cache_key(self, messages: List[Dict], max_tokens: int, temperature: float) -> str:
+        """Ключ кэша для сообщений и параметров генерации"""
+        return LLMResponseCache.make_key(
+            model=f"{self.backend.name}:{self.model_name}",
+            messages=messages,
+            options={'max_tokens': max_tokens, 'temperature': temperature}
+        )
+
+    def get_cached(
         self,
         prompt: str,
         system_prompt: str = None,
         max_tokens: int = LLM_MAX_TOKENS,
         temperature: float = 0.7
+    ) -> Optional[str]:
+        """Ответ из кэша без обращения к модели (None, если его нет)"""
+        if self.cache is None:
+            return None
+
+        messages = self._build_messages(prompt, system_prompt)
+        try:
+            return self.cache.get(self._cache_key(messages, max_tokens, temperature))
+        except Exception as e:
+            print(f"⚠️  Ошибка чтения кэша LLM: {e}")
+            return None
+
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: str = None,
+        max_tokens: int = LLM_MAX_TOKENS,
+        temperature: float = 0.7,
+        should_stop: Callable[[], bool] = None,
+        use_cache: bool = True
     ) -> str:
         """
         Генерация ответа от LLM
@@ -47,45 +131,69 @@ class LLMClient:
             system_prompt: Системная инструкция (опционально)
             max_tokens: Максимальное количество токенов в ответе
             temperature: Параметр случайности (0.0 - детерминированный, 1.0 - креативный)
+            should_stop: Проверка отмены; если задана, ответ читается потоком
+                и генерация прерывается, как только она вернёт True
+            use_cache: Использовать кэш ответов (False — всегда генерировать заново)
 
         Returns:
             Ответ модели в виде строки
         """
-        messages = []
-
-        if system_prompt:
-            messages.append({
-                'role': 'system',
-                'content': system_prompt
-            })
-
-        messages.append({
-            'role': 'user',
-            'content': prompt
-        })
+        messages = self._build_messages(prompt, system_prompt)
+
+        cache_key = None
+        if use_cache and self.cache is not None:
+            cache_key = self._cache_key(messages, max_tokens, temperature)
+            try:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                print(f"⚠️  Ошибка чтения кэша LLM: {e}")
 
         try:
-            response = ollama.chat(
+            answer = self.backend.chat(
                 model=self.model_name,
                 messages=messages,
-                options={
-                    'num_predict': max_tokens,
-                    'temperature': temperature
-                }
+                max_tokens=max_tokens,
+                temperature=temperature,
+                should_stop=should_stop
             )
 
-            return response['message']['content']
-
         except Exception as e:
             error_msg = f"Ошибка при генерации ответа: {e}"
             print(f"❌ {error_msg}")
             return f"[ОШИБКА] {error_msg}"
 
-    def generate_rag_answer(
+        # Прерванный (неполный) ответ в кэш не попадает
+        if cache_key is not None and not (should_stop is not None and should_stop()):
+            try:
+                self.cache.set(cache_key, self.model_name, answer)
+            except Exception as e:
+                print(f"⚠️  Ошибка записи в кэш LLM: {e}")
+
+        return answer
+
+    def get_cached_rag_answer(
         self,
         query: str,
         context: str,
         max_tokens: int = LLM_MAX_TOKENS
+    ) -> Optional[str]:
+        """Готовый RAG ответ из кэша (None, если его нет)"""
+        return self.get_cached(
+            prompt=build_rag_prompt(query, context),
+            system_prompt=RAG_SYSTEM_PROMPT,
+            max_tokens=max_tokens,
+            temperature=RAG_TEMPERATURE
+        )
+
+    def generate_rag_answer(
+        self,
+        query: str,
+        context: str,
+        max_tokens: int = LLM_MAX_TOKENS,
+        should_stop: Callable[[], bool] = None,
+        use_cache: bool = True
     ) -> str:
         """
         Генерация ответа в режиме RAG (с контекстом из базы знаний)
@@ -94,42 +202,24 @@ class LLMClient:
             query: Вопрос пользователя
             context: Контекст из векторной базы (найденные документы)
             max_tokens: Максимальное количество токенов
+            should_stop: Проверка отмены генерации (см. generate)
+            use_cache: Использовать кэш ответов
 
         Returns:
             Ответ модели на основе контекста
         """
-        system_prompt = """Ты — помощник по поиску информации в базе знаний инструкций.
-
-ВАЖНЫЕ ПРАВИЛА:
-1. Используй ТОЛЬКО информацию из предоставленного контекста
-2. Если в контексте нет ответа на вопрос — честно скажи "В базе знаний нет информации по этому вопросу"
-3. Не придумывай информацию, которой нет в контексте
-4. Отвечай четко, структурированно, по делу
-5. Если в контексте есть упоминания изображений в формате [[image: путь]] — обязательно упомяни об этом в ответе, например: "См. изображение для визуального примера" или "На изображении показано..."
-6. Изображения из контекста будут автоматически показаны пользователю отдельно, но ты должен упомянуть их наличие в своем ответе
-7. Отвечай на русском языке"""
-
-        prompt = f"""КОНТЕКСТ ИЗ БАЗЫ ЗНАНИЙ:
-{context}
-
----
-
-ВОПРОС ПОЛЬЗОВАТЕЛЯ:
-{query}
-
----
-
-ОТВЕТ (используй только информацию из контекста выше):"""
-
         return self.generate(
-            prompt=prompt,
-            system_prompt=system_prompt,
+            prompt=build_rag_prompt(query, context),
+            system_prompt=RAG_SYSTEM_PROMPT,
             max_tokens=max_tokens,
-            temperature=0.3  # Низкая температура для точности
+            temperature=RAG_TEMPERATURE,
+            should_stop=should_stop,
+            use_cache=use_cache
         )
 
 
 # Удобная функция для быстрого создания клиента
-def get_llm_client(model_name: str = LLM_MODEL_NAME) -> LLMClient:
-    """Создание и возврат LLM клиента"""
-    return LLMClient(model_name=model_name)
+def get_llm_client(model_name: str = LLM_MODEL_NAME, backend_name: str = None) -> LLMClient:
+    """Создание и возврат LLM клиента (backend_name=None — бэкенд из конфигурации)"""
+    backend = get_llm_backend(backend_name) if backend_name else None
+    return LLMClient(model_name=model_name, backend=backend)
@@ -0,0 +1,176 @@
+"""
+Планировщик запросов к LLM
+
+Общий для всего процесса (все сессии Streamlit) ограничитель нагрузки на Ollama:
+- не более LLM_MAX_CONCURRENT_REQUESTS одновременных генераций
+- очередь с приоритетами (внутри одного приоритета — FIFO)
+- дедлайн на ожидание в очереди и на саму генерацию
+- отмена запроса, если сессия пользователя закрыта
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Optional, Any
+
+from src.config import LLM_MAX_CONCURRENT_REQUESTS, LLM_REQUEST_TIMEOUT
+
+# Приоритеты: меньшее значение обслуживается раньше
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class LLMRequestCancelled(Exception):
+    """Запрос отменён (сессия закрыта или пользователь ушёл)"""
+
+
+class LLMRequestTimeout(Exception):
+    """Истёк дедлайн запроса"""
+
+
+class _Ticket:
+    """Место запроса в очереди"""
+
+    def __init__(self, priority: int, seq: int, deadline: Optional[float]):
+        self.priority = priority
+        self.seq = seq
+        self.deadline = deadline
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    """
+    Ограничивает число одновременных запросов к LLM и выстраивает остальные в очередь
+    """
+
+    # Как часто ожидающий запрос проверяет отмену и обновляет позицию (секунды)
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, max_concurrent: int = LLM_MAX_CONCURRENT_REQUESTS):
+        self.max_concurrent = max(1, max_concurrent)
+        self._cond = threading.Condition()
+        self._queue = []
+        self._active = 0
+        self._seq = itertools.count()
+
+    def run(
+        self,
+        fn: Callable[[Callable[[], bool]], Any],
+        priority: int = PRIORITY_NORMAL,
+        timeout: Optional[float] = LLM_REQUEST_TIMEOUT,
+        is_cancelled: Callable[[], bool] = None,
+        on_queue_position: Callable[[int], None] = None
+    ) -> Any:
+        """
+        Выполнение запроса через очередь
+
+        Args:
+            fn: Функция генерации. Получает should_stop() — флаг, который нужно
+                проверять во время генерации, чтобы прервать её при отмене/дедлайне
+            priority: Приоритет запроса (PRIORITY_HIGH/NORMAL/LOW)
+            timeout: Общий дедлайн запроса в секундах (None — без ограничения)
+            is_cancelled: Проверка отмены со стороны вызывающего (например, сессия закрыта)
+            on_queue_position: Колбэк с позицией в очереди (1 — следующий на выполнение)
+
+        Returns:
+            Результат fn
+
+        Raises:
+            LLMRequestCancelled: запрос отменён (в очереди или во время генерации)
+            LLMRequestTimeout: истёк дедлайн запроса
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        ticket = _Ticket(priority, next(self._seq), deadline)
+
+        def should_stop() -> bool:
+            if is_cancelled is not None and is_cancelled():
+                return True
+            return deadline is not None and time.monotonic() >= deadline
+
+        self._acquire(ticket, is_cancelled, on_queue_position)
+
+        try:
+            result = fn(should_stop)
+            # Генерация могла быть прервана — неполный ответ не возвращаем
+            if is_cancelled is not None and is_cancelled():
+                raise LLMRequestCancelled("Запрос отменён во время генерации")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise LLMRequestTimeout("Превышено время генерации ответа")
+            return result
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def _acquire(
+        self,
+        ticket: _Ticket,
+        is_cancelled: Optional[Callable[[], bool]],
+        on_queue_position: Optional[Callable[[int], None]]
+    ):
+        """Ожидание свободного слота"""
+        last_position = None
+
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while not (self._active < self.max_concurrent and self._queue[0] is ticket):
+                    if is_cancelled is not None and is_cancelled():
+                        raise LLMRequestCancelled("Запрос отменён до начала генерации")
+                    if ticket.deadline is not None and time.monotonic() >= ticket.deadline:
+                        raise LLMRequestTimeout("Превышено время ожидания в очереди LLM")
+
+                    position = self._position(ticket)
+                    if on_queue_position is not None and position != last_position:
+                        last_position = position
+                        # Колбэк вызывается без блокировки, чтобы не держать очередь
+                        self._cond.release()
+                        try:
+                            on_queue_position(position)
+                        finally:
+                            self._cond.acquire()
+                        continue
+
+                    self._cond.wait(self.POLL_INTERVAL)
+
+                heapq.heappop(self._queue)
+                self._active += 1
+            except BaseException:
+                self._remove(ticket)
+                raise
+
+    def _position(self, ticket: _Ticket) -> int:
+        """Позиция в очереди (1 — следующий)"""
+        return sum(1 for t in self._queue if t < ticket) + 1
+
+    def _remove(self, ticket: _Ticket):
+        """Удаление билета из очереди (отмена/таймаут)"""
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+        self._cond.notify_all()
+
+    def get_stats(self) -> dict:
+        """Текущая загрузка планировщика"""
+        with self._cond:
+            return {
+                'active': self._active,
+                'queued': len(self._queue),
+                'max_concurrent': self.max_concurrent
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Общий для процесса планировщик LLM запросов"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
@@ -2,9 +2,166 @@
 Модуль для управления метаданными инструкций в SQLite
 """
 import sqlite3
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Callable
 from datetime import datetime
 from src.config import METADATA_DB
+from src.db_pool import get_pool
+
+# Разделитель имён тегов в group_concat (в названиях тегов не встречается)
+TAG_SEPARATOR = '\x1f'
+
+# Максимум параметров в одном IN (...) — ниже лимита SQLITE_MAX_VARIABLE_NUMBER
+SQL_IN_BATCH = 500
+
+INSERT_IMAGE_SQL = '''
+    INSERT INTO instruction_images (
+        instruction_id, image_path, image_index, placeholder
+    )
+    VALUES (?, ?, ?, ?)
+'''
+
+# Миграции схемы: (версия, список SQL). Применённая версия хранится в PRAGMA user_version
+MIGRATIONS = [
+    (1, [
+        'CREATE INDEX IF NOT EXISTS idx_instruction_tags_tag_id ON instruction_tags(tag_id)',
+        'CREATE INDEX IF NOT EXISTS idx_instruction_images_instruction_id ON instruction_images(instruction_id)',
+        'CREATE INDEX IF NOT EXISTS idx_instructions_active_created ON instructions(active, created_at)',
+    ]),
+    # Тексты чанков и полнотекстовый индекс FTS5 (src/fts_search.py)
+    (2, [
+        '''
+        CREATE TABLE IF NOT EXISTS chunk_texts (
+            rowid INTEGER PRIMARY KEY,
+            chunk_id TEXT UNIQUE NOT NULL,
+            instruction_id TEXT NOT NULL,
+            title TEXT,
+            text TEXT,
+            FOREIGN KEY (instruction_id) REFERENCES instructions(id) ON DELETE CASCADE
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_chunk_texts_instruction_id ON chunk_texts(instruction_id)',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+            title, text,
+            content='chunk_texts', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS chunk_texts_ai AFTER INSERT ON chunk_texts BEGIN
+            INSERT INTO chunks_fts(rowid, title, text) VALUES (new.rowid, new.title, new.text);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS chunk_texts_ad AFTER DELETE ON chunk_texts BEGIN
+            INSERT INTO chunks_fts(chunks_fts, rowid, title, text) VALUES ('delete', old.rowid, old.title, old.text);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS chunk_texts_au AFTER UPDATE ON chunk_texts BEGIN
+            INSERT INTO chunks_fts(chunks_fts, rowid, title, text) VALUES ('delete', old.rowid, old.title, old.text);
+            INSERT INTO chunks_fts(rowid, title, text) VALUES (new.rowid, new.title, new.text);
+        END
+        ''',
+    ]),
+    # Keyset-пагинация списка инструкций (list_instructions)
+    (3, [
+        'CREATE INDEX IF NOT EXISTS idx_instructions_created_id ON instructions(created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_instructions_active_created_id ON instructions(active, created_at, id)',
+    ]),
+    # Полные (квантизованные) векторы чанков для пересчёта кандидатов (src/embedding_compression.py)
+    (4, [
+        '''
+        CREATE TABLE IF NOT EXISTS chunk_vectors (
+            chunk_id TEXT PRIMARY KEY,
+            instruction_id TEXT NOT NULL,
+            dtype TEXT NOT NULL,
+            scale REAL NOT NULL,
+            vector BLOB NOT NULL,
+            FOREIGN KEY (instruction_id) REFERENCES instructions(id) ON DELETE CASCADE
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_chunk_vectors_instruction_id ON chunk_vectors(instruction_id)',
+    ]),
+    # MinHash-сигнатуры, полосы LSH и найденные почти одинаковые чанки (src/near_duplicates.py)
+    (5, [
+        '''
+        CREATE TABLE IF NOT EXISTS chunk_minhash (
+            chunk_id TEXT PRIMARY KEY,
+            instruction_id TEXT NOT NULL,
+            signature BLOB NOT NULL,
+            FOREIGN KEY (instruction_id) REFERENCES instructions(id) ON DELETE CASCADE
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_chunk_minhash_instruction_id ON chunk_minhash(instruction_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS chunk_lsh (
+            bucket INTEGER NOT NULL,
+            chunk_id TEXT NOT NULL,
+            PRIMARY KEY (bucket, chunk_id),
+            FOREIGN KEY (chunk_id) REFERENCES chunk_minhash(chunk_id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_chunk_lsh_chunk_id ON chunk_lsh(chunk_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS chunk_duplicates (
+            chunk_id TEXT PRIMARY KEY,
+            instruction_id TEXT NOT NULL,
+            duplicate_of TEXT NOT NULL,
+            similarity REAL NOT NULL,
+            FOREIGN KEY (instruction_id) REFERENCES instructions(id) ON DELETE CASCADE
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_chunk_duplicates_instruction_id ON chunk_duplicates(instruction_id)',
+        'CREATE INDEX IF NOT EXISTS idx_chunk_duplicates_duplicate_of ON chunk_duplicates(duplicate_of)',
+    ]),
+]
+
+
+def apply_migrations(conn: sqlite3.Connection):
+    """Применение недостающих миграций схемы"""
+    has_schema = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'instructions'"
+    ).fetchone()
+    if not has_schema:
+        # База ещё не создана scripts/init_metadata_db.py
+        return
+
+    current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for version, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+
+
+# Список инструкций с тегами и числом изображений одним запросом (без N+1)
+INSTRUCTION_LIST_SELECT = f'''
+    SELECT
+        i.*,
+        (
+            SELECT group_concat(t.name, '{TAG_SEPARATOR}')
+            FROM instruction_tags it
+            JOIN tags t ON t.id = it.tag_id
+            WHERE it.instruction_id = i.id
+        ) AS tag_names,
+        (
+            SELECT COUNT(*)
+            FROM instruction_images im
+            WHERE im.instruction_id = i.id
+        ) AS image_count
+    FROM instructions i
+'''
+
+
+def _row_to_instruction(row: sqlite3.Row) -> Dict:
+    """Строка INSTRUCTION_LIST_SELECT -> словарь инструкции"""
+    instruction = dict(row)
+    tag_names = instruction.pop('tag_names')
+    instruction['tags'] = tag_names.split(TAG_SEPARATOR) if tag_names else []
+    return instruction
 
 
 class MetadataManager:
@@ -12,12 +169,11 @@ class MetadataManager:
 
     def __init__(self, db_path: str = METADATA_DB):
         self.db_path = db_path
+        self.pool = get_pool(db_path, on_init=apply_migrations)
 
-    def _get_connection(self) -> sqlite3.Connection:
-        """Получение подключения к БД"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Для доступа к колонкам по имени
-        return conn
+    def _connection(self):
+        """Подключение из пула (контекстный менеджер)"""
+        return self.pool.connection()
 
     # === Работа с инструкциями ===
 
@@ -52,74 +208,153 @@ class MetadataManager:
         Returns:
             True если успешно добавлено
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
-            # Добавляем инструкцию
-            cursor.execute('''
-                INSERT INTO instructions (
-                    id, doc_id, title, file_path, file_format,
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            try:
+                # Добавляем инструкцию
+                cursor.execute('''
+                    INSERT INTO instructions (
+                        id, doc_id, title, file_path, file_format,
+                        source_type, separator_index, author
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    instruction_id, doc_id, title, file_path, file_format,
                     source_type, separator_index, author
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                instruction_id, doc_id, title, file_path, file_format,
-                source_type, separator_index, author
-            ))
+                ))
+
+                # Добавляем теги
+                if tags:
+                    self._add_tags_to_instruction(cursor, instruction_id, tags)
 
-            # Добавляем теги
-            if tags:
-                self._add_tags_to_instruction(cursor, instruction_id, tags)
+                # Добавляем изображения
+                if images:
+                    self._add_images_to_instruction(cursor, instruction_id, images)
 
-            # Добавляем изображения
-            if images:
-                self._add_images_to_instruction(cursor, instruction_id, images)
+                conn.commit()
+                return True
 
-            conn.commit()
+            except Exception as e:
+                conn.rollback()
+                import traceback
+                print(f"Ошибка при добавлении инструкции: {e}")
+                print(f"Traceback: {traceback.format_exc()}")
+                return False
+
+    def add_instructions_bulk(
+        self,
+        instructions: List[Dict],
+        before_commit: Callable[[sqlite3.Cursor], None] = None
+    ) -> bool:
+        """
+        Добавление пачки инструкций одной транзакцией
+
+        Теги всей пачки создаются и разрешаются в id один раз, строки
+        вставляются через executemany, commit выполняется один раз.
+
+        Args:
+            instructions: Инструкции в формате docs_parser.parse_document
+                (id, doc_id, title, file_path, file_format, source_type,
+                separator_index, author, tags, images)
+            before_commit: Вызывается с курсором внутри транзакции перед commit
+                (запись соответствующих чанков в ChromaDB и индекс FTS5).
+                Исключение в нём откатывает всю пачку
+
+        Returns:
+            True если вся пачка добавлена
+        """
+        if not instructions:
             return True
 
-        except Exception as e:
-            conn.rollback()
-            import traceback
-            print(f"Ошибка при добавлении инструкции: {e}")
-            print(f"Traceback: {traceback.format_exc()}")
-            return False
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            try:
+                cursor.executemany('''
+                    INSERT INTO instructions (
+                        id, doc_id, title, file_path, file_format,
+                        source_type, separator_index, author
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [
+                    (
+                        inst['id'], inst['doc_id'], inst['title'], inst['file_path'],
+                        inst.get('file_format'), inst.get('source_type'),
+                        inst.get('separator_index'), inst.get('author', 'Admin')
+                    )
+                    for inst in instructions
+                ])
+
+                all_tags = {tag for inst in instructions for tag in (inst.get('tags') or [])}
+                tag_ids = self._resolve_tag_ids(cursor, all_tags)
+                cursor.executemany(
+                    'INSERT OR IGNORE INTO instruction_tags (instruction_id, tag_id) VALUES (?, ?)',
+                    [
+                        (inst['id'], tag_ids[tag])
+                        for inst in instructions
+                        for tag in (inst.get('tags') or [])
+                    ]
+                )
 
-        finally:
-            conn.close()
+                cursor.executemany(
+                    INSERT_IMAGE_SQL,
+                    [
+                        row
+                        for inst in instructions
+                        for row in self._image_rows(inst['id'], inst.get('images') or [])
+                    ]
+                )
 
-    def _add_tags_to_instruction(
-        self,
-        cursor: sqlite3.Cursor,
-        instruction_id: str,
-        tags: List[str]
-    ):
-        """Добавление тегов к инструкции"""
-        for tag_name in tags:
-            # Получаем или создаём тег
-            cursor.execute('SELECT id FROM tags WHERE name = ?', (tag_name,))
-            result = cursor.fetchone()
+                if before_commit is not None:
+                    before_commit(cursor)
 
-            if result:
-                tag_id = result[0]
-            else:
-                cursor.execute('INSERT INTO tags (name) VALUES (?)', (tag_name,))
-                tag_id = cursor.lastrowid
+                conn.commit()
+                return True
 
-            # Связываем тег с инструкцией
-            cursor.execute(
-                'INSERT OR IGNORE INTO instruction_tags (instruction_id, tag_id) VALUES (?, ?)',
-                (instruction_id, tag_id)
-            )
+            except Exception as e:
+                conn.rollback()
+                import traceback
+                print(f"Ошибка при пакетном добавлении инструкций: {e}")
+                print(f"Traceback: {traceback.format_exc()}")
+                return False
 
-    def _add_images_to_instruction(
+    @staticmethod
+    def _resolve_tag_ids(cursor: sqlite3.Cursor, tags) -> Dict[str, int]:
+        """Создание недостающих тегов и получение {имя: id} для всех переданных"""
+        tags = list(tags)
+        if not tags:
+            return {}
+
+        cursor.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)', [(t,) for t in tags])
+
+        tag_ids = {}
+        for start in range(0, len(tags), SQL_IN_BATCH):
+            batch = tags[start:start + SQL_IN_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'SELECT name, id FROM tags WHERE name IN ({placeholders})', batch)
+            tag_ids.update({row[0]: row[1] for row in cursor.fetchall()})
+        return tag_ids
+
+    def _add_tags_to_instruction(
         self,
         cursor: sqlite3.Cursor,
         instruction_id: str,
-        images: List
+        tags: List[str]
     ):
-        """Добавление изображений к инструкции"""
+        """Добавление тегов к инструкции"""
+        tag_ids = self._resolve_tag_ids(cursor, set(tags))
+
+        # Связываем теги с инструкцией
+        cursor.executemany(
+            'INSERT OR IGNORE INTO instruction_tags (instruction_id, tag_id) VALUES (?, ?)',
+            [(instruction_id, tag_ids[tag]) for tag in tags]
+        )
+
+    @staticmethod
+    def _image_rows(instruction_id: str, images: List) -> List[Tuple]:
+        """Строки instruction_images для списка изображений"""
+        rows = []
         for idx, img in enumerate(images):
             # Поддерживаем оба формата: строки и словари
             if isinstance(img, str):
@@ -131,192 +366,260 @@ class MetadataManager:
                 image_index = img.get('index', idx)
                 placeholder = img.get('placeholder', f"[[image: {img.get('path')}]]")
 
-            cursor.execute('''
-                INSERT INTO instruction_images (
-                    instruction_id, image_path, image_index, placeholder
-                )
-                VALUES (?, ?, ?, ?)
-            ''', (
-                instruction_id,
-                image_path,
-                image_index,
-                placeholder
-            ))
+            rows.append((instruction_id, image_path, image_index, placeholder))
+        return rows
+
+    def _add_images_to_instruction(
+        self,
+        cursor: sqlite3.Cursor,
+        instruction_id: str,
+        images: List
+    ):
+        """Добавление изображений к инструкции"""
+        cursor.executemany(INSERT_IMAGE_SQL, self._image_rows(instruction_id, images))
 
     def get_instruction(self, instruction_id: str) -> Optional[Dict]:
         """Получение инструкции по ID"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT * FROM instructions WHERE id = ?', (instruction_id,))
-        row = cursor.fetchone()
-
-        if not row:
-            conn.close()
-            return None
-
-        instruction = dict(row)
-
-        # Получаем теги
-        cursor.execute('''
-            SELECT t.name
-            FROM tags t
-            JOIN instruction_tags it ON t.id = it.tag_id
-            WHERE it.instruction_id = ?
-        ''', (instruction_id,))
-        instruction['tags'] = [row[0] for row in cursor.fetchall()]
-
-        # Получаем изображения
-        cursor.execute('''
-            SELECT image_path, image_index, placeholder
-            FROM instruction_images
-            WHERE instruction_id = ?
-            ORDER BY image_index
-        ''', (instruction_id,))
-        instruction['images'] = [dict(row) for row in cursor.fetchall()]
-
-        conn.close()
-        return instruction
+        with self._connection() as conn:
+            cursor = conn.cursor()
 
-    def get_all_instructions(self, active_only: bool = True) -> List[Dict]:
-        """Получение всех инструкций"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+            cursor.execute('SELECT * FROM instructions WHERE id = ?', (instruction_id,))
+            row = cursor.fetchone()
 
-        query = 'SELECT * FROM instructions'
-        if active_only:
-            query += ' WHERE active = 1'
-        query += ' ORDER BY created_at DESC'
+            if not row:
+                return None
 
-        cursor.execute(query)
-        instructions = [dict(row) for row in cursor.fetchall()]
+            instruction = dict(row)
 
-        # Добавляем теги к каждой инструкции
-        for inst in instructions:
+            # Получаем теги
             cursor.execute('''
                 SELECT t.name
                 FROM tags t
                 JOIN instruction_tags it ON t.id = it.tag_id
                 WHERE it.instruction_id = ?
-            ''', (inst['id'],))
-            inst['tags'] = [row[0] for row in cursor.fetchall()]
+            ''', (instruction_id,))
+            instruction['tags'] = [row[0] for row in cursor.fetchall()]
+
+            # Получаем изображения
+            cursor.execute('''
+                SELECT image_path, image_index, placeholder
+                FROM instruction_images
+                WHERE instruction_id = ?
+                ORDER BY image_index
+            ''', (instruction_id,))
+            instruction['images'] = [dict(row) for row in cursor.fetchall()]
+
+        return instruction
+
+    def get_all_instructions(self, active_only: bool = True) -> List[Dict]:
+        """Получение всех инструкций (с тегами и числом изображений)"""
+        query = INSTRUCTION_LIST_SELECT
+        if active_only:
+            query += ' WHERE i.active = 1'
+        query += ' ORDER BY i.created_at DESC'
 
-        conn.close()
-        return instructions
+        with self._connection() as conn:
+            rows = conn.execute(query).fetchall()
+
+        return [_row_to_instruction(row) for row in rows]
 
     def get_instructions_by_tag(self, tag_name: str) -> List[Dict]:
         """Получение инструкций по тегу"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT i.*
-            FROM instructions i
-            JOIN instruction_tags it ON i.id = it.instruction_id
-            JOIN tags t ON it.tag_id = t.id
-            WHERE t.name = ? AND i.active = 1
+        query = INSTRUCTION_LIST_SELECT + '''
+            WHERE i.active = 1 AND i.id IN (
+                SELECT it.instruction_id
+                FROM instruction_tags it
+                JOIN tags t ON it.tag_id = t.id
+                WHERE t.name = ?
+            )
             ORDER BY i.created_at DESC
-        ''', (tag_name,))
+        '''
+
+        with self._connection() as conn:
+            rows = conn.execute(query, (tag_name,)).fetchall()
+
+        return [_row_to_instruction(row) for row in rows]
+
+    @staticmethod
+    def _list_filters(
+        active: Optional[bool],
+        tag: Optional[str],
+        title_contains: Optional[str]
+    ) -> Tuple[List[str], List]:
+        """WHERE-условия и параметры для list_instructions/count_instructions"""
+        conditions = []
+        params = []
+
+        if active is not None:
+            conditions.append('i.active = ?')
+            params.append(1 if active else 0)
+
+        if tag:
+            conditions.append('''
+                i.id IN (
+                    SELECT it.instruction_id
+                    FROM instruction_tags it
+                    JOIN tags t ON it.tag_id = t.id
+                    WHERE t.name = ?
+                )
+            ''')
+            params.append(tag)
 
-        instructions = [dict(row) for row in cursor.fetchall()]
+        if title_contains:
+            # py_lower — регистронезависимо и для кириллицы (встроенный lower() только ASCII)
+            conditions.append('instr(py_lower(i.title), ?) > 0')
+            params.append(title_contains.lower())
 
-        # Добавляем теги
-        for inst in instructions:
-            cursor.execute('''
-                SELECT t.name
-                FROM tags t
-                JOIN instruction_tags it ON t.id = it.tag_id
-                WHERE it.instruction_id = ?
-            ''', (inst['id'],))
-            inst['tags'] = [row[0] for row in cursor.fetchall()]
+        return conditions, params
+
+    def list_instructions(
+        self,
+        active: Optional[bool] = True,
+        tag: str = None,
+        title_contains: str = None,
+        limit: int = 50,
+        after: Tuple[str, str] = None
+    ) -> Tuple[List[Dict], Optional[Tuple[str, str]]]:
+        """
+        Страница инструкций с фильтрами (keyset-пагинация)
+
+        Сортировка — от новых к старым по (created_at, id). Вместо OFFSET
+        следующая страница начинается строго после последней записи предыдущей,
+        поэтому стоимость запроса не растёт с номером страницы.
+
+        Args:
+            active: True — только активные, False — только неактуальные, None — все
+            tag: Только инструкции с этим тегом
+            title_contains: Подстрока названия (без учёта регистра)
+            limit: Размер страницы
+            after: Курсор (created_at, id) последней записи предыдущей страницы
+
+        Returns:
+            Tuple (инструкции страницы, курсор следующей страницы или None)
+        """
+        conditions, params = self._list_filters(active, tag, title_contains)
+
+        if after is not None:
+            conditions.append('(i.created_at < ? OR (i.created_at = ? AND i.id < ?))')
+            params.extend([after[0], after[0], after[1]])
+
+        query = INSTRUCTION_LIST_SELECT
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY i.created_at DESC, i.id DESC LIMIT ?'
+        # Одна лишняя строка показывает, есть ли следующая страница
+        params.append(limit + 1)
+
+        with self._connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        instructions = [_row_to_instruction(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = instructions[-1]
+            next_cursor = (last['created_at'], last['id'])
 
-        conn.close()
-        return instructions
+        return instructions, next_cursor
+
+    def count_instructions(
+        self,
+        active: Optional[bool] = True,
+        tag: str = None,
+        title_contains: str = None
+    ) -> int:
+        """Число инструкций под фильтрами list_instructions"""
+        conditions, params = self._list_filters(active, tag, title_contains)
+
+        query = 'SELECT COUNT(*) FROM instructions i'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+
+        with self._connection() as conn:
+            return conn.execute(query, params).fetchone()[0]
 
     def mark_instruction_inactive(self, instruction_id: str) -> bool:
-        """Пометить инструкцию как неактуальную"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
-            cursor.execute(
-                'UPDATE instructions SET active = 0, updated_at = ? WHERE id = ?',
-                (datetime.now().isoformat(), instruction_id)
-            )
-            conn.commit()
-            return True
-        except Exception as e:
-            conn.rollback()
-            print(f"Ошибка при пометке инструкции как неактуальной: {e}")
-            return False
-        finally:
-            conn.close()
+        """
+        Пометить инструкцию как неактуальную (только SQLite)
 
-    def delete_instruction(self, instruction_id: str) -> bool:
-        """Удаление инструкции (каскадно удалятся теги и изображения)"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        Для согласованного изменения SQLite и ChromaDB используйте
+        src/index_sync.py::set_instructions_active
+        """
+        return self.set_instructions_active([instruction_id], False)
 
-        try:
-            cursor.execute('DELETE FROM instructions WHERE id = ?', (instruction_id,))
-            conn.commit()
+    def set_instructions_active(self, instruction_ids: List[str], active: bool) -> bool:
+        """Изменение флага active у группы инструкций одной транзакцией"""
+        if not instruction_ids:
             return True
-        except Exception as e:
-            conn.rollback()
-            print(f"Ошибка при удалении инструкции: {e}")
-            return False
-        finally:
-            conn.close()
+
+        with self._connection() as conn:
+            try:
+                now = datetime.now().isoformat()
+                conn.executemany(
+                    'UPDATE instructions SET active = ?, updated_at = ? WHERE id = ?',
+                    [(1 if active else 0, now, instruction_id) for instruction_id in instruction_ids]
+                )
+                conn.commit()
+                return True
+            except Exception as e:
+                conn.rollback()
+                print(f"Ошибка при изменении активности инструкций: {e}")
+                return False
+
+    def get_active_flags(self) -> Dict[str, bool]:
+        """Флаг active всех инструкций: {instruction_id: active}"""
+        with self._connection() as conn:
+            rows = conn.execute('SELECT id, active FROM instructions').fetchall()
+
+        return {row[0]: bool(row[1]) for row in rows}
+
+    def delete_instruction(self, instruction_id: str) -> bool:
+        """Удаление инструкции (каскадно удалятся теги, изображения и тексты чанков в FTS)"""
+        with self._connection() as conn:
+            try:
+                conn.execute('DELETE FROM instructions WHERE id = ?', (instruction_id,))
+                conn.commit()
+                return True
+            except Exception as e:
+                conn.rollback()
+                print(f"Ошибка при удалении инструкции: {e}")
+                return False
 
     # === Работа с тегами ===
 
     def get_all_tags(self) -> List[str]:
         """Получение всех тегов"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT name FROM tags ORDER BY name')
-        tags = [row[0] for row in cursor.fetchall()]
+        with self._connection() as conn:
+            rows = conn.execute('SELECT name FROM tags ORDER BY name').fetchall()
 
-        conn.close()
-        return tags
+        return [row[0] for row in rows]
 
     def add_tag(self, tag_name: str, category: str = None) -> bool:
         """Добавление нового тега"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
-            cursor.execute(
-                'INSERT OR IGNORE INTO tags (name, category) VALUES (?, ?)',
-                (tag_name, category)
-            )
-            conn.commit()
-            return True
-        except Exception as e:
-            conn.rollback()
-            print(f"Ошибка при добавлении тега: {e}")
-            return False
-        finally:
-            conn.close()
+        with self._connection() as conn:
+            try:
+                conn.execute(
+                    'INSERT OR IGNORE INTO tags (name, category) VALUES (?, ?)',
+                    (tag_name, category)
+                )
+                conn.commit()
+                return True
+            except Exception as e:
+                conn.rollback()
+                print(f"Ошибка при добавлении тега: {e}")
+                return False
 
     # === Статистика ===
 
     def get_stats(self) -> Dict:
         """Получение статистики по базе"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT COUNT(*) FROM instructions WHERE active = 1')
-        active_count = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM instructions WHERE active = 0')
-        inactive_count = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM tags')
-        tags_count = cursor.fetchone()[0]
-
-        conn.close()
+        with self._connection() as conn:
+            active_count, inactive_count = conn.execute('''
+                SELECT
+                    COALESCE(SUM(active = 1), 0),
+                    COALESCE(SUM(active = 0), 0)
+                FROM instructions
+            ''').fetchone()
+            tags_count = conn.execute('SELECT COUNT(*) FROM tags').fetchone()[0]
 
         return {
             'active_instructions': active_count,
@@ -333,24 +636,27 @@ class MetadataManager:
         Returns:
             bool: True если успешно, False при ошибке
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        try:
-            # Удаляем все данные из таблиц (порядок важен из-за внешних ключей)
-            cursor.execute('DELETE FROM instruction_images')
-            cursor.execute('DELETE FROM instruction_tags')
-            cursor.execute('DELETE FROM instruction_history')
-            cursor.execute('DELETE FROM instructions')
-            # Не удаляем теги, чтобы они остались доступны для новых инструкций
-            # cursor.execute('DELETE FROM tags')
-
-            conn.commit()
-            print("✅ Все данные успешно удалены из базы метаданных")
-            return True
-        except Exception as e:
-            conn.rollback()
-            print(f"❌ Ошибка при очистке базы метаданных: {e}")
-            return False
-        finally:
-            conn.close()
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            try:
+                # Удаляем все данные из таблиц (порядок важен из-за внешних ключей)
+                cursor.execute('DELETE FROM instruction_images')
+                cursor.execute('DELETE FROM instruction_tags')
+                cursor.execute('DELETE FROM instruction_history')
+                cursor.execute('DELETE FROM chunk_texts')
+                cursor.execute('DELETE FROM chunk_vectors')
+                cursor.execute('DELETE FROM chunk_lsh')
+                cursor.execute('DELETE FROM chunk_minhash')
+                cursor.execute('DELETE FROM chunk_duplicates')
+                cursor.execute('DELETE FROM instructions')
+                # Не удаляем теги, чтобы они остались доступны для новых инструкций
+                # cursor.execute('DELETE FROM tags')
+
+                conn.commit()
+                print("✅ Все данные успешно удалены из базы метаданных")
+                return True
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Ошибка при очистке базы метаданных: {e}")
+                return False
@@ -0,0 +1,95 @@
+"""
+Maximal Marginal Relevance (MMR) — диверсификация результатов поиска
+
+Из пула кандидатов жадно выбираются документы, максимизирующие
+    λ · sim(запрос, документ) − (1 − λ) · max sim(документ, уже выбранные)
+Так почти одинаковые чанки (перекрытие, дубли диалогов Telegram) не занимают
+несколько мест в контексте LLM. Дополнительно ограничивается число чанков
+одной инструкции.
+
+Релевантность по умолчанию — косинус эмбеддингов запроса и кандидата;
+после переранжирования передаются оценки cross-encoder (scale_scores
+приводит их к [0, 1], как и сходство между кандидатами).
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def scale_scores(scores: Sequence[float]) -> np.ndarray:
+    """Оценки (например, логиты cross-encoder) в [0, 1] по min-max пула"""
+    values = np.asarray(scores, dtype=np.float32)
+    spread = values.max() - values.min() if len(values) else 0.0
+    if spread == 0:
+        return np.ones_like(values)
+    return (values - values.min()) / spread
+
+
+def mmr_select(
+    query_embedding: Sequence[float],
+    candidate_embeddings: Sequence[Sequence[float]],
+    k: int,
+    lambda_mult: float = 0.7,
+    groups: Optional[Sequence[str]] = None,
+    max_per_group: Optional[int] = None,
+    relevance: Optional[Sequence[float]] = None
+) -> List[int]:
+    """
+    Выбор k кандидатов по MMR
+
+    Args:
+        query_embedding: Эмбеддинг запроса
+        candidate_embeddings: Эмбеддинги кандидатов (n × dim)
+        k: Сколько выбрать
+        lambda_mult: 1.0 — только релевантность, 0.0 — только разнообразие
+        groups: Группа каждого кандидата (например, instruction_id)
+        max_per_group: Не больше стольких кандидатов из одной группы (None — без ограничения)
+        relevance: Релевантность кандидатов (например, scale_scores оценок
+            cross-encoder); None — косинус с query_embedding
+
+    Returns:
+        Индексы выбранных кандидатов в порядке выбора
+    """
+    embeddings = _normalize(np.asarray(candidate_embeddings, dtype=np.float32))
+    n = embeddings.shape[0]
+    if n == 0 or k <= 0:
+        return []
+
+    if relevance is None:
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        relevance = embeddings @ query
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = embeddings @ embeddings.T
+
+    # Максимальное сходство каждого кандидата с уже выбранными
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    group_counts = {}
+    selected = []
+
+    while len(selected) < k and available.any():
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[:, best])
+
+        if groups is not None and max_per_group:
+            group = groups[best]
+            group_counts[group] = group_counts.get(group, 0) + 1
+            if group_counts[group] >= max_per_group:
+                available &= np.array([g != group for g in groups])
+
+    return selected
@@ -0,0 +1,39 @@
+"""
+Общие для процесса экземпляры моделей
+
+Модель эмбеддингов (~560M параметров) и cross-encoder загружаются один раз
+на процесс и используются всеми компонентами: поиском (RAGPipeline),
+загрузкой документов в приложении, скриптами. Изменение базы знаний
+моделей не касается — компоненты следят за поколением индекса
+(src/index_lock.index_generation) и обновляют только производное состояние.
+"""
+import threading
+
+from src.config import EMBEDDING_MODEL_NAME, RERANK_MODEL_NAME
+
+_models = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(key: tuple, factory):
+    """Экземпляр по ключу; создаётся один раз даже при одновременных вызовах"""
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = factory()
+                _models[key] = model
+    return model
+
+
+def get_embedding_model(model_name: str = EMBEDDING_MODEL_NAME):
+    """Модель эмбеддингов (EmbeddingModel)"""
+    from src.embeddings import EmbeddingModel
+    return _get_or_create(('embedding', model_name), lambda: EmbeddingModel(model_name))
+
+
+def get_reranker(model_name: str = RERANK_MODEL_NAME):
+    """Cross-encoder для переранжирования (CrossEncoderReranker)"""
+    from src.reranker import CrossEncoderReranker
+    return _get_or_create(('reranker', model_name), lambda: CrossEncoderReranker(model_name))
@@ -0,0 +1,190 @@
+"""
+Поиск почти одинаковых чанков (MinHash + LSH)
+
+Инструкции из Telegram и повторно загруженные руководства дают много
+почти одинаковых чанков: они раздувают хранилище и вытесняют из top-k
+другие результаты. При загрузке (src/ingestion.py) для каждого чанка
+считается MinHash-сигнатура по словесным шинглам, кандидаты ищутся по
+полосам LSH среди уже загруженных чанков активных инструкций и среди
+предыдущих чанков той же пачки, сходство оценивается по сигнатурам.
+
+Таблицы в metadata.db (миграция 5 в metadata_manager.py):
+- chunk_minhash — сигнатуры проиндексированных чанков
+- chunk_lsh — ключи полос LSH -> чанк
+- chunk_duplicates — найденные дубли: чанк, его оригинал, сходство
+
+Дубли не удаляются, а записываются с пометкой duplicate_of в метаданных
+чанка: поиск (src/rag_pipeline.py) убирает дубль, только если оригинал
+тоже среди кандидатов. Удаление или отключение оригинала (например,
+после загрузки исправленного руководства) не теряет текст дубля.
+"""
+import hashlib
+import re
+import sqlite3
+import zlib
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from src.config import (
+    NEAR_DUPLICATE_THRESHOLD,
+    MINHASH_PERMUTATIONS,
+    MINHASH_BANDS,
+    SHINGLE_SIZE
+)
+from src.metadata_manager import SQL_IN_BATCH
+
+_TOKEN_RE = re.compile(r'\w+')
+
+# Универсальное хэширование (a * x + b) mod p: x < 2^32, a и b < 2^31 — без переполнения uint64
+_PRIME = np.uint64(4294967311)
+_MASK = np.uint64(0xFFFFFFFF)
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, 2 ** 31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+_ROWS_PER_BAND = MINHASH_PERMUTATIONS // MINHASH_BANDS
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """Хэши (crc32) словесных шинглов текста; короткий текст — один шингл"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    count = max(1, len(tokens) - SHINGLE_SIZE + 1)
+    shingles = {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(count)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """MinHash-сигнатура (uint32 × MINHASH_PERMUTATIONS); None для текста без слов"""
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return None
+    values = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME & _MASK
+    return values.min(axis=1).astype(np.uint32)
+
+
+def lsh_buckets(signature: np.ndarray) -> List[int]:
+    """Ключи полос LSH (int64 со знаком — помещается в INTEGER SQLite)"""
+    buckets = []
+    for band in range(MINHASH_BANDS):
+        rows = signature[band * _ROWS_PER_BAND:(band + 1) * _ROWS_PER_BAND]
+        digest = hashlib.blake2b(bytes([band]) + rows.tobytes(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'little', signed=True))
+    return buckets
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Оценка сходства Жаккара по сигнатурам"""
+    return float(np.mean(a == b))
+
+
+def _load_candidates(conn: sqlite3.Connection, buckets: List[int]) -> Dict[int, List[Tuple[str, np.ndarray]]]:
+    """Проиндексированные чанки активных инструкций в полосах buckets"""
+    index = {}
+    for start in range(0, len(buckets), SQL_IN_BATCH):
+        batch = buckets[start:start + SQL_IN_BATCH]
+        rows = conn.execute(
+            f'''
+            SELECT l.bucket, m.chunk_id, m.signature
+            FROM chunk_lsh l
+            JOIN chunk_minhash m ON m.chunk_id = l.chunk_id
+            JOIN instructions i ON i.id = m.instruction_id
+            WHERE i.active = 1 AND l.bucket IN ({','.join('?' * len(batch))})
+            ''',
+            batch
+        ).fetchall()
+        for bucket, chunk_id, signature in rows:
+            index.setdefault(bucket, []).append((chunk_id, np.frombuffer(signature, dtype=np.uint32)))
+    return index
+
+
+def find_near_duplicates(
+    conn: sqlite3.Connection,
+    chunk_ids: List[str],
+    texts: List[str],
+    threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> Tuple[Dict[str, np.ndarray], Dict[str, Tuple[str, float]]]:
+    """
+    Почти одинаковые чанки среди новых
+
+    Чанк сравнивается с проиндексированными чанками и с предыдущими
+    (не дублирующими) чанками того же списка.
+
+    Returns:
+        Tuple (сигнатуры чанков-оригиналов для store_signatures,
+               {id дубля: (id оригинала, сходство)})
+    """
+    signatures = [minhash_signature(text) for text in texts]
+    buckets = [lsh_buckets(signature) if signature is not None else [] for signature in signatures]
+    index = _load_candidates(conn, sorted({bucket for chunk_buckets in buckets for bucket in chunk_buckets}))
+
+    originals = {}
+    duplicates = {}
+    for chunk_id, signature, chunk_buckets in zip(chunk_ids, signatures, buckets):
+        if signature is None:
+            continue
+
+        best_id, best_score = None, 0.0
+        checked = set()
+        for bucket in chunk_buckets:
+            for candidate_id, candidate_signature in index.get(bucket, ()):
+                if candidate_id in checked or candidate_id == chunk_id:
+                    continue
+                checked.add(candidate_id)
+                score = similarity(signature, candidate_signature)
+                if score > best_score:
+                    best_id, best_score = candidate_id, score
+
+        if best_id is not None and best_score >= threshold:
+            duplicates[chunk_id] = (best_id, best_score)
+            continue
+
+        originals[chunk_id] = signature
+        for bucket in chunk_buckets:
+            index.setdefault(bucket, []).append((chunk_id, signature))
+
+    return originals, duplicates
+
+
+def store_signatures(cursor: sqlite3.Cursor, signatures: Dict[str, np.ndarray], instruction_of: Dict[str, str]):
+    """
+    Запись сигнатур и полос LSH чанков (в текущей транзакции вызывающего)
+
+    Args:
+        signatures: {chunk_id: сигнатура} (первый результат find_near_duplicates)
+        instruction_of: {chunk_id: instruction_id}
+    """
+    if not signatures:
+        return
+    cursor.executemany(
+        'INSERT OR REPLACE INTO chunk_minhash (chunk_id, instruction_id, signature) VALUES (?, ?, ?)',
+        [(chunk_id, instruction_of[chunk_id], signature.tobytes()) for chunk_id, signature in signatures.items()]
+    )
+    cursor.executemany(
+        'INSERT OR IGNORE INTO chunk_lsh (bucket, chunk_id) VALUES (?, ?)',
+        [
+            (bucket, chunk_id)
+            for chunk_id, signature in signatures.items()
+            for bucket in lsh_buckets(signature)
+        ]
+    )
+
+
+def record_duplicates(
+    cursor: sqlite3.Cursor,
+    duplicates: Dict[str, Tuple[str, float]],
+    instruction_of: Dict[str, str]
+):
+    """Запись найденных дублей в chunk_duplicates (в текущей транзакции вызывающего)"""
+    cursor.executemany(
+        '''
+        INSERT OR REPLACE INTO chunk_duplicates (chunk_id, instruction_id, duplicate_of, similarity)
+        VALUES (?, ?, ?, ?)
+        ''',
+        [
+            (chunk_id, instruction_of[chunk_id], original_id, score)
+            for chunk_id, (original_id, score) in duplicates.items()
+        ]
+    )
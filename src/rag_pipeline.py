@@ -1,9 +1,28 @@
 
-from typing import List, Dict, Tuple
-from src.embeddings import EmbeddingModel
-from src.storage import get_chroma
+from typing import List, Dict, Tuple, Callable
+import numpy as np
+from src.model_registry import get_embedding_model, get_reranker
+from src.index_lock import index_generation
+from src.storage import build_where
+from src.vector_store import get_vector_store, get_instruction_store
+from src.embedding_compression import get_embedding_codec, load_full_vectors, normalize
+from src.metadata_manager import MetadataManager
 from src.llm_client import get_llm_client
-from src.config import TOP_K, EMBEDDING_MODEL_NAME
+from src.llm_scheduler import get_llm_scheduler, PRIORITY_NORMAL
+from src.config import (
+    TOP_K,
+    EMBEDDING_MODEL_NAME,
+    HIERARCHICAL_SEARCH_ENABLED,
+    INSTRUCTION_CANDIDATES,
+    EMBEDDING_RESCORE_CANDIDATES,
+    RERANK_ENABLED,
+    RERANK_CANDIDATES,
+    MMR_ENABLED,
+    MMR_CANDIDATES,
+    MMR_LAMBDA,
+    MMR_MAX_PER_INSTRUCTION
+)
+from src.mmr import mmr_select, scale_scores
 from src.hybrid_search import HybridSearcher
 
 
@@ -11,20 +30,134 @@ class RAGPipeline:
     def __init__(
         self,
         embedding_model_name: str = EMBEDDING_MODEL_NAME,
-        top_k: int = TOP_K
+        top_k: int = TOP_K,
+        llm_backend: str = None,
+        rerank: bool = RERANK_ENABLED,
+        hierarchical: bool = HIERARCHICAL_SEARCH_ENABLED
     ):
         print("Инициализация RAG pipeline...")
-        self.embedding_model = EmbeddingModel(embedding_model_name)
-        self.client, self.collection = get_chroma()
-        self.llm_client = get_llm_client()
+        # Модели общие для процесса: загрузка документов их не перезагружает
+        self.embedding_model = get_embedding_model(embedding_model_name)
+        self.collection = get_vector_store()
+        self.instruction_collection = get_instruction_store()
+        self.metadata_manager = MetadataManager()
+        self.index_generation = index_generation()
+        self.hierarchical = hierarchical
+        self.instruction_index_complete = self.check_instruction_index()
+
+        # Сжатие эмбеддингов: векторы ChromaDB и полные векторы для пересчёта
+        self.codec = get_embedding_codec()
+        self.vector_pool = self.metadata_manager.pool if self.codec.stores_full_vectors else None
+        self.llm_client = get_llm_client(backend_name=llm_backend)
+        self.llm_scheduler = get_llm_scheduler()
         self.top_k = top_k
+
+        self.reranker = None
+        if rerank:
+            self.reranker = get_reranker()
+
         print("✅ RAG pipeline готов")
 
+    def refresh_index(self):
+        """
+        Обновление производного состояния, если база знаний изменилась
+
+        Сравнивается поколение индекса (src/index_lock.py). Модели и клиент
+        LLM остаются прежними, заново открываются хранилища (после очистки
+        базы коллекция ChromaDB создаётся заново) и кодек эмбеддингов:
+        scripts/compress_index.py и импорт пакета индекса меняют файл проекции.
+        """
+        generation = index_generation()
+        if generation == self.index_generation:
+            return
+        self.collection = get_vector_store()
+        self.instruction_collection = get_instruction_store()
+        self.codec = get_embedding_codec()
+        self.vector_pool = self.metadata_manager.pool if self.codec.stores_full_vectors else None
+        self.index_generation = generation
+        self.instruction_index_complete = self.check_instruction_index()
+
+    def check_instruction_index(self) -> bool:
+        """
+        Есть ли в индексе инструкций все инструкции из SQLite
+
+        Инструкции, загруженные до появления индекса, попадают в него только
+        после scripts/build_instruction_index.py. До этого двухэтапный поиск
+        скрыл бы их, поэтому используется обычный поиск по всем чанкам.
+        """
+        indexed = self.instruction_collection.count()
+        total = self.metadata_manager.count_instructions(active=None)
+        if indexed < total:
+            print(
+                f"⚠️  В индексе инструкций {indexed} из {total}: двухэтапный поиск отключён "
+                "до запуска scripts/build_instruction_index.py"
+            )
+            return False
+        return True
+
+    def rescore(self, query_embedding: List[float], documents: List[Dict]) -> Dict[str, List[float]]:
+        """
+        Пересчёт расстояний кандидатов по полным векторам из metadata.db
+
+        Документы сортируются по косинусному расстоянию полного запроса
+        к полным векторам чанков (поле 'distance' перезаписывается).
+        Если полного вектора нет хотя бы у одного кандидата (чанк загружен
+        до сжатия индекса), порядок ChromaDB сохраняется.
+
+        Returns:
+            {chunk_id: полный вектор} или пустой словарь, если пересчёта не было
+        """
+        with self.vector_pool.connection() as conn:
+            full_vectors = load_full_vectors(conn, [doc['id'] for doc in documents])
+        if len(full_vectors) < len(documents):
+            return {}
+
+        query_vector = normalize(np.asarray(query_embedding, dtype=np.float32))
+        for doc in documents:
+            doc['distance'] = float(1.0 - full_vectors[doc['id']] @ query_vector)
+        documents.sort(key=lambda doc: doc['distance'])
+        return {chunk_id: vector.tolist() for chunk_id, vector in full_vectors.items()}
+
+    def search_instructions(
+        self,
+        query_embedding: List[float],
+        n_results: int = INSTRUCTION_CANDIDATES,
+        where_filter: Dict = None
+    ) -> Dict[str, Dict]:
+        """
+        Первый этап поиска: лучшие инструкции по индексу инструкций
+
+        Returns:
+            {instruction_id: {'rank': 1.., 'distance': ...}} в порядке ранга;
+            пустой словарь, если индекс инструкций покрывает не все инструкции
+        """
+        if not self.instruction_index_complete:
+            return {}
+
+        results = self.instruction_collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=where_filter,
+            include=['distances']
+        )
+
+        ranking = {}
+        if results['ids'] and len(results['ids']) > 0:
+            for rank, (instruction_id, distance) in enumerate(zip(results['ids'][0], results['distances'][0]), 1):
+                ranking[instruction_id] = {'rank': rank, 'distance': distance}
+        return ranking
+
     def search_similar(
         self,
         query: str,
         top_k: int = None,
-        filter_active: bool = True
+        filter_active: bool = True,
+        tags: List[str] = None,
+        rerank: bool = True,
+        diversify: bool = MMR_ENABLED,
+        mmr_lambda: float = MMR_LAMBDA,
+        max_per_instruction: int = MMR_MAX_PER_INSTRUCTION,
+        hierarchical: bool = None
     ) -> List[Dict]:
         """
         Поиск похожих документов в векторной базе
@@ -33,24 +166,63 @@ class RAGPipeline:
             query: Поисковый запрос
             top_k: Количество результатов (если None, используется self.top_k)
             filter_active: Фильтровать только активные документы
+            tags: Искать только среди инструкций с любым из этих тегов
+            rerank: Переранжировать расширенный пул кандидатов cross-encoder'ом
+                (если он включён в конфигурации)
+            diversify: Отобрать top_k из пула кандидатов по MMR (меньше почти одинаковых чанков)
+            mmr_lambda: Баланс релевантности и разнообразия для MMR (1.0 — только релевантность)
+            max_per_instruction: Не больше стольких чанков одной инструкции (MMR)
+            hierarchical: Искать чанки только среди лучших инструкций по индексу
+                инструкций (None — по настройке пайплайна)
 
         Returns:
             Список найденных документов с метаданными и скорами
         """
         if top_k is None:
             top_k = self.top_k
-
-        # эмбеддинг запроса
-        query_embedding = self.embedding_model.encode([query])[0].tolist()
-
-        # подготовка фильтра
-        where_filter = {"active": True} if filter_active else None
+        if hierarchical is None:
+            hierarchical = self.hierarchical
+        self.refresh_index()
+
+        # эмбеддинг запроса (полный — для пересчёта, сжатый — для ChromaDB)
+        full_query_embedding = self.embedding_model.encode_queries([query])[0].tolist()
+        query_embedding = self.codec.reduce([full_query_embedding])[0].tolist()
+
+        # подготовка фильтра (выполняется внутри ChromaDB, до отбора top_k)
+        where_filter = build_where(active_only=filter_active, tags=tags)
+
+        # первый этап: лучшие инструкции, дальше поиск только по их чанкам
+        instruction_ranking = {}
+        if hierarchical:
+            instruction_ranking = self.search_instructions(query_embedding, INSTRUCTION_CANDIDATES, where_filter)
+            if instruction_ranking:
+                where_filter = build_where(
+                    active_only=filter_active,
+                    tags=tags,
+                    instruction_ids=list(instruction_ranking)
+                )
+
+        # при пересчёте, переранжировании и MMR берём расширенный пул кандидатов
+        use_rescore = self.codec.stores_full_vectors
+        use_reranker = rerank and self.reranker is not None
+        n_results = top_k
+        if use_rescore:
+            n_results = max(n_results, EMBEDDING_RESCORE_CANDIDATES)
+        if use_reranker:
+            n_results = max(n_results, RERANK_CANDIDATES)
+        if diversify:
+            n_results = max(n_results, MMR_CANDIDATES)
+
+        include = ['documents', 'metadatas', 'distances']
+        if diversify:
+            include.append('embeddings')
 
         # поиск в ChromaDB
         results = self.collection.query(
             query_embeddings=[query_embedding],
-            n_results=top_k,
-            where=where_filter if where_filter else {}
+            n_results=n_results,
+            where=where_filter,
+            include=include
         )
 
         # форматирование результатов
@@ -63,9 +235,47 @@ class RAGPipeline:
                     'distance': results['distances'][0][i] if results['distances'] else None,
                     'id': results['ids'][0][i] if results['ids'] else None
                 }
+                ranking = instruction_ranking.get(doc['metadata'].get('instruction_id'))
+                if ranking:
+                    doc['instruction_rank'] = ranking['rank']
+                    doc['instruction_distance'] = ranking['distance']
                 documents.append(doc)
 
-        return documents
+        # почти одинаковые чанки (NEAR_DUPLICATE_MODE = "flag"): дубль лишний, если в пуле есть оригинал
+        candidate_ids = {doc['id'] for doc in documents}
+        documents = [doc for doc in documents if doc['metadata'].get('duplicate_of') not in candidate_ids]
+
+        # векторы кандидатов для MMR: полные после пересчёта, иначе из ChromaDB
+        embedding_by_id = {}
+        mmr_query_embedding = query_embedding
+        if use_rescore and documents:
+            embedding_by_id = self.rescore(full_query_embedding, documents)
+            if embedding_by_id:
+                mmr_query_embedding = full_query_embedding
+        if diversify and not embedding_by_id and documents:
+            embedding_by_id = dict(zip(results['ids'][0], results['embeddings'][0]))
+
+        if use_reranker:
+            # при MMR переранжируется весь пул, отбор top_k делает MMR
+            documents = self.reranker.rerank(query, documents, len(documents) if diversify else top_k)
+
+        if diversify and documents:
+            # после переранжирования релевантность для MMR — оценки cross-encoder
+            relevance = None
+            if all('rerank_score' in doc for doc in documents):
+                relevance = scale_scores([doc['rerank_score'] for doc in documents])
+            selected = mmr_select(
+                mmr_query_embedding,
+                [embedding_by_id[doc['id']] for doc in documents],
+                k=top_k,
+                lambda_mult=mmr_lambda,
+                groups=[doc['metadata'].get('instruction_id') for doc in documents],
+                max_per_group=max_per_instruction,
+                relevance=relevance
+            )
+            documents = [documents[i] for i in selected]
+
+        return documents[:top_k]
 
     def format_context(self, documents: List[Dict]) -> Tuple[str, List[Dict], List[str], str]:
         """
@@ -97,15 +307,22 @@ class RAGPipeline:
             instruction_scores[instruction_id].append(distance)
             instruction_docs[instruction_id].append(doc)
 
-        # Находим instruction_id с наилучшим средним score (наименьший distance)
         best_instruction_id = None
-        best_avg_distance = float('inf')
-
-        for instruction_id, distances in instruction_scores.items():
-            avg_distance = sum(distances) / len(distances)
-            if avg_distance < best_avg_distance:
-                best_avg_distance = avg_distance
-                best_instruction_id = instruction_id
+        ranked_docs = [doc for doc in documents if 'instruction_rank' in doc]
+        if ranked_docs:
+            # Двухэтапный поиск: лучшая по индексу инструкций среди попавших в контекст
+            best_doc = min(ranked_docs, key=lambda doc: doc['instruction_rank'])
+            metadata = best_doc.get('metadata', {})
+            best_instruction_id = metadata.get('instruction_id', metadata.get('doc_id', ''))
+        else:
+            # Находим instruction_id с наилучшим средним score (наименьший distance)
+            best_avg_distance = float('inf')
+
+            for instruction_id, distances in instruction_scores.items():
+                avg_distance = sum(distances) / len(distances)
+                if avg_distance < best_avg_distance:
+                    best_avg_distance = avg_distance
+                    best_instruction_id = instruction_id
 
         for i, doc in enumerate(documents, 1):
             text = doc['text']
@@ -143,21 +360,38 @@ class RAGPipeline:
         context = "\n---\n".join(context_parts)
         return context, sources, all_images, best_instruction_id
 
-    def query(self, user_query: str, top_k: int = None) -> Dict:
+    def query(
+        self,
+        user_query: str,
+        top_k: int = None,
+        priority: int = PRIORITY_NORMAL,
+        is_cancelled: Callable[[], bool] = None,
+        on_queue_position: Callable[[int], None] = None,
+        use_cache: bool = True,
+        tags: List[str] = None
+    ) -> Dict:
         """
         Основной метод для выполнения RAG запроса
 
         Args:
             user_query: Вопрос пользователя
             top_k: Количество документов для поиска
+            priority: Приоритет запроса в очереди LLM
+            is_cancelled: Проверка отмены (например, сессия пользователя закрыта)
+            on_queue_position: Колбэк с позицией запроса в очереди LLM
+            use_cache: Использовать кэш ответов LLM (False — сгенерировать заново)
+            tags: Ограничить поиск инструкциями с любым из этих тегов
 
         Returns:
             Словарь с ответом, контекстом и источниками
+
+        Raises:
+            LLMRequestCancelled, LLMRequestTimeout: из планировщика LLM
         """
         print(f"\n🔍 Поиск по запросу: {user_query}")
 
         # 1. Поиск похожих документов
-        documents = self.search_similar(user_query, top_k=top_k)
+        documents = self.search_similar(user_query, top_k=top_k, tags=tags)
 
         if not documents:
             return {
@@ -172,12 +406,27 @@ class RAGPipeline:
         # 2. Форматирование контекста
         context, sources, images, best_instruction_id = self.format_context(documents)
 
-        # 3. Генерация ответа с помощью LLM
-        print("🤖 Генерация ответа...")
-        answer = self.llm_client.generate_rag_answer(
-            query=user_query,
-            context=context
-        )
+        # 3. Генерация ответа с помощью LLM (через общую очередь)
+        # Ответ из кэша не занимает место в очереди
+        answer = None
+        if use_cache:
+            answer = self.llm_client.get_cached_rag_answer(user_query, context)
+
+        if answer is not None:
+            print("💾 Ответ взят из кэша")
+        else:
+            print("🤖 Генерация ответа...")
+            answer = self.llm_scheduler.run(
+                lambda should_stop: self.llm_client.generate_rag_answer(
+                    query=user_query,
+                    context=context,
+                    should_stop=should_stop,
+                    use_cache=use_cache
+                ),
+                priority=priority,
+                is_cancelled=is_cancelled,
+                on_queue_position=on_queue_position
+            )
 
         print("✅ Ответ готов")
 
@@ -205,9 +454,11 @@ class RAGPipeline:
         Returns:
             Словарь со статистикой
         """
+        self.refresh_index()
         count = self.collection.count()
         return {
             'total_chunks': count,
+            'total_indexed_instructions': self.instruction_collection.count(),
             'collection_name': self.collection.name
         }
 
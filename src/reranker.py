@@ -0,0 +1,103 @@
+"""
+Переранжирование кандидатов cross-encoder моделью (CPU)
+
+Векторный поиск возвращает расширенный пул кандидатов (RERANK_CANDIDATES),
+cross-encoder оценивает пары (запрос, чанк) пачками, в контекст LLM попадают
+лучшие top_k. Оценки пар кэшируются в памяти. Если оценка не укладывается
+в бюджет времени, переранжирование пропускается и остаётся порядок
+векторного поиска.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+from src.config import (
+    RERANK_MODEL_NAME,
+    RERANK_BATCH_SIZE,
+    RERANK_TIME_BUDGET,
+    RERANK_CACHE_SIZE
+)
+
+
+class CrossEncoderReranker:
+    """Cross-encoder переранжирование с кэшем оценок и бюджетом времени"""
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL_NAME,
+        batch_size: int = RERANK_BATCH_SIZE,
+        time_budget: float = RERANK_TIME_BUDGET,
+        cache_size: int = RERANK_CACHE_SIZE
+    ):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device='cpu')
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _pair_key(query: str, text: str) -> str:
+        return hashlib.sha1(f"{query}\x00{text}".encode('utf-8')).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, key: str, score: float):
+        with self._lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(self, query: str, documents: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Переранжирование документов поиска
+
+        Args:
+            query: Поисковый запрос
+            documents: Кандидаты из search_similar (в порядке векторного поиска)
+            top_k: Сколько документов оставить
+
+        Returns:
+            top_k документов с полем 'rerank_score', отсортированных по нему.
+            При превышении бюджета времени — первые top_k в исходном порядке
+        """
+        if len(documents) <= 1:
+            return documents[:top_k]
+
+        started = time.perf_counter()
+        keys = [self._pair_key(query, doc['text']) for doc in documents]
+        scores = [self._cache_get(key) for key in keys]
+
+        pending = [i for i, score in enumerate(scores) if score is None]
+        for start in range(0, len(pending), self.batch_size):
+            if self.time_budget and time.perf_counter() - started > self.time_budget:
+                print(f"⚠️  Переранжирование пропущено: превышен бюджет {self.time_budget} с")
+                return documents[:top_k]
+
+            batch = pending[start:start + self.batch_size]
+            batch_scores = self.model.predict(
+                [(query, documents[i]['text']) for i in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                self._cache_put(keys[i], scores[i])
+
+        ranked = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        result = []
+        for i in ranked[:top_k]:
+            doc = dict(documents[i])
+            doc['rerank_score'] = scores[i]
+            result.append(doc)
+        return result
@@ -1,9 +1,75 @@
 import chromadb
 from chromadb.config import Settings
 import os
+from typing import List, Dict, Optional
 from src.config import CHROMA_DIR
 
-def get_chroma():
-    client = chromadb.PersistentClient(path=CHROMA_DIR)
-    collection = client.get_or_create_collection("documents")
-    return client, collection
+# Префикс ключей метаданных чанка, по которым фильтруются теги:
+# Chroma не умеет искать подстроку в строке 'tags', поэтому каждый тег
+# хранится отдельным булевым полем {"tag:ЕГАИС": True}
+TAG_KEY_PREFIX = "tag:"
+
+
+# Коллекция чанков
+DOCUMENTS_COLLECTION = "documents"
+
+# Коллекция уровня инструкций (один эмбеддинг на инструкцию, см. src/instruction_index.py)
+INSTRUCTIONS_COLLECTION = "instructions"
+
+
+def get_chroma_client():
+    """Клиент ChromaDB (коллекции открываются через src/vector_store.py)"""
+    return chromadb.PersistentClient(path=CHROMA_DIR)
+
+
+def tag_metadata(tags: List[str]) -> Dict:
+    """
+    Метаданные чанка для тегов: строка для отображения + фильтруемые поля
+
+    Args:
+        tags: Список тегов инструкции
+
+    Returns:
+        Словарь {'tags': 'a,b', 'tag:a': True, 'tag:b': True}
+    """
+    metadata = {'tags': ','.join(tags)}
+    for tag in tags:
+        metadata[f"{TAG_KEY_PREFIX}{tag}"] = True
+    return metadata
+
+
+def build_where(
+    active_only: bool = True,
+    tags: List[str] = None,
+    instruction_ids: List[str] = None
+) -> Optional[Dict]:
+    """
+    Построение where-фильтра Chroma
+
+    Args:
+        active_only: Только активные инструкции
+        tags: Теги — чанк подходит, если у него есть хотя бы один из них
+        instruction_ids: Только чанки этих инструкций
+
+    Returns:
+        Фильтр для collection.query/get или None (без фильтрации)
+    """
+    conditions = []
+    if active_only:
+        conditions.append({"active": True})
+
+    if tags:
+        tag_conditions = [{f"{TAG_KEY_PREFIX}{tag}": True} for tag in tags]
+        if len(tag_conditions) == 1:
+            conditions.append(tag_conditions[0])
+        else:
+            conditions.append({"$or": tag_conditions})
+
+    if instruction_ids:
+        conditions.append({"instruction_id": {"$in": list(instruction_ids)}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
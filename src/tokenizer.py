@@ -0,0 +1,170 @@
+"""
+Токенизация русского текста для keyword-поиска
+
+Общий конвейер для всех keyword-движков (HybridSearcher / BM25 и FTS5):
+нижний регистр и ё → е, слова по заранее скомпилированному шаблону,
+удаление стоп-слов, стемминг русских слов по алгоритму Snowball
+(https://snowballstem.org/algorithms/russian/stemmer.html). Благодаря
+стеммингу "накладная", "накладной" и "накладные" дают один токен.
+
+Латиница и числа (номера магазинов, коды ошибок) не стеммируются.
+Результат для каждого слова кэшируется (lru_cache): в корпусе слова
+повторяются, поэтому токен в основном обходится одним обращением к кэшу.
+"""
+import re
+from functools import lru_cache
+from typing import List, Optional
+
+# Слов в кэше токенизации (словарь корпуса обычно меньше)
+TOKEN_CACHE_SIZE = 100000
+
+_TOKEN_RE = re.compile(r'\w+')
+_CYRILLIC_RE = re.compile(r'[а-я]+')
+
+STOP_WORDS = frozenset('''
+    и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по
+    только ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если
+    уже или ни быть был него до вас нибудь опять уж вам ведь там потом себя ничего ей
+    может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто чего раз
+    тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом
+    один почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец
+    два об другой хоть после над больше тот через эти нас про всего них какая много
+    разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой
+    им более всегда конечно всю между это
+'''.split())
+
+_VOWELS = frozenset('аеиоуыэюя')
+
+# Окончания Snowball; (окончание, True) — только после "а" или "я" (сама буква остаётся)
+_PERFECTIVE_GERUND = (
+    [(e, True) for e in ('в', 'вши', 'вшись')]
+    + [(e, False) for e in ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись')]
+)
+_ADJECTIVE = [(e, False) for e in (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'
+)]
+_PARTICIPLE = (
+    [(e, True) for e in ('ем', 'нн', 'вш', 'ющ', 'щ')]
+    + [(e, False) for e in ('ивш', 'ывш', 'ующ')]
+)
+_REFLEXIVE = [(e, False) for e in ('ся', 'сь')]
+_VERB = (
+    [(e, True) for e in (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'
+    )]
+    + [(e, False) for e in (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+        'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'
+    )]
+)
+_NOUN = [(e, False) for e in (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й',
+    'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'
+)]
+_SUPERLATIVE = [(e, False) for e in ('ейше', 'ейш')]
+_DERIVATIONAL = ('ость', 'ост')
+
+
+def _by_length(endings):
+    """Самое длинное окончание проверяется первым"""
+    return sorted(endings, key=lambda item: -len(item[0]))
+
+
+_PERFECTIVE_GERUND = _by_length(_PERFECTIVE_GERUND)
+_ADJECTIVE = _by_length(_ADJECTIVE)
+_PARTICIPLE = _by_length(_PARTICIPLE)
+_REFLEXIVE = _by_length(_REFLEXIVE)
+_VERB = _by_length(_VERB)
+_NOUN = _by_length(_NOUN)
+_SUPERLATIVE = _by_length(_SUPERLATIVE)
+
+
+def _strip_ending(rv: str, endings) -> Optional[str]:
+    """rv без самого длинного подходящего окончания (или None, если ни одно не подошло)"""
+    for ending, after_a in endings:
+        if rv.endswith(ending):
+            if after_a and (len(rv) == len(ending) or rv[-len(ending) - 1] not in 'ая'):
+                continue
+            return rv[:-len(ending)]
+    return None
+
+
+def _regions(word: str):
+    """Начала областей RV и R2 алгоритма Snowball"""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def stem(word: str) -> str:
+    """Основа русского слова (Snowball); слово — в нижнем регистре, ё заменена на е"""
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1: деепричастие, иначе возвратность и одно из прилагательное/глагол/существительное
+    stripped = _strip_ending(rv, _PERFECTIVE_GERUND)
+    if stripped is not None:
+        rv = stripped
+    else:
+        stripped = _strip_ending(rv, _REFLEXIVE)
+        if stripped is not None:
+            rv = stripped
+        stripped = _strip_ending(rv, _ADJECTIVE)
+        if stripped is not None:
+            participle = _strip_ending(stripped, _PARTICIPLE)
+            rv = participle if participle is not None else stripped
+        else:
+            for endings in (_VERB, _NOUN):
+                stripped = _strip_ending(rv, endings)
+                if stripped is not None:
+                    rv = stripped
+                    break
+
+    # Шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательное окончание целиком в R2
+    for ending in _DERIVATIONAL:
+        if rv.endswith(ending) and len(prefix) + len(rv) - len(ending) >= r2_start:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        stripped = _strip_ending(rv, _SUPERLATIVE)
+        if stripped is not None:
+            rv = stripped[:-1] if stripped.endswith('нн') else stripped
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _term(word: str) -> str:
+    """Токен для слова ('' для стоп-слова)"""
+    if word in STOP_WORDS:
+        return ''
+    return stem(word) if _CYRILLIC_RE.fullmatch(word) else word
+
+
+def tokenize_russian(text: str) -> List[str]:
+    """
+    Токены текста для keyword-поиска: без стоп-слов, русские слова — основами
+    """
+    return [term for term in map(_term, _TOKEN_RE.findall(text.lower().replace('ё', 'е'))) if term]
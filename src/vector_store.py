@@ -0,0 +1,826 @@
+"""
+Хранилища векторов
+
+Код поиска и загрузки работает с интерфейсом VectorStore, а не с ChromaDB
+напрямую. Методы и форматы ответов повторяют коллекцию ChromaDB (query
+возвращает вложенные списки по запросам, get — плоские), поэтому
+реализации взаимозаменяемы.
+
+- ChromaVectorStore — коллекция ChromaDB (HNSW), по умолчанию
+- NumpyVectorStore — матрица векторов в .npy, открываемая через mmap, и
+  метаданные в SQLite рядом. Поиск — точный перебор через BLAS или IVF
+  (k-means списки). На корпусах в десятки тысяч чанков точный перебор
+  быстрее HNSW, а открытие хранилища не требует загрузки индекса.
+
+Выбор реализации — VECTOR_STORE_BACKEND в src/config.py, перенос данных
+между ними — scripts/migrate_vector_store.py.
+"""
+import glob
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.config import (
+    DATA_DIR,
+    VECTOR_SPACE,
+    HNSW_M,
+    HNSW_CONSTRUCTION_EF,
+    HNSW_SEARCH_EF,
+    VECTOR_STORE_BACKEND,
+    VECTOR_STORE_DIR,
+    NUMPY_INDEX_TYPE,
+    NUMPY_IVF_N_PROBE
+)
+from src.db_pool import get_pool
+from src.index_lock import file_lock
+from src.storage import DOCUMENTS_COLLECTION, INSTRUCTIONS_COLLECTION, get_chroma_client
+
+# Пространство расстояний каждой коллекции
+COLLECTION_SPACES = {
+    DOCUMENTS_COLLECTION: VECTOR_SPACE,
+    INSTRUCTIONS_COLLECTION: 'cosine',
+}
+
+# Пачка при копировании между хранилищами
+COPY_BATCH_SIZE = 500
+
+
+class VectorStore:
+    """Базовый интерфейс хранилища векторов"""
+
+    name = "base"
+
+    def add(self, ids: List[str], embeddings: Sequence, metadatas: List[Dict], documents: List[str] = None):
+        """Добавление новых записей"""
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], embeddings: Sequence, metadatas: List[Dict], documents: List[str] = None):
+        """Добавление или перезапись записей"""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str] = None, where: Dict = None):
+        """Удаление по id или по фильтру метаданных"""
+        raise NotImplementedError
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]):
+        """Обновление метаданных (переданные ключи перезаписываются, остальные сохраняются)"""
+        raise NotImplementedError
+
+    def query(
+        self,
+        query_embeddings: Sequence,
+        n_results: int,
+        where: Dict = None,
+        include: List[str] = None
+    ) -> Dict:
+        """
+        Поиск ближайших векторов
+
+        Returns:
+            {'ids': [[...]], 'distances': [[...]], 'documents': [[...]],
+             'metadatas': [[...]], 'embeddings': [[...]]} — список на каждый запрос
+        """
+        raise NotImplementedError
+
+    def get(
+        self,
+        ids: List[str] = None,
+        where: Dict = None,
+        include: List[str] = None,
+        limit: int = None,
+        offset: int = None
+    ) -> Dict:
+        """Записи по id/фильтру: {'ids': [...], 'documents', 'metadatas', 'embeddings'}"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Число записей"""
+        raise NotImplementedError
+
+    def drop(self):
+        """Удаление всех записей хранилища"""
+        raise NotImplementedError
+
+
+def hnsw_metadata(
+    space: str = VECTOR_SPACE,
+    m: int = HNSW_M,
+    construction_ef: int = HNSW_CONSTRUCTION_EF,
+    search_ef: int = HNSW_SEARCH_EF
+) -> Dict:
+    """Метаданные коллекции ChromaDB с параметрами индекса HNSW"""
+    return {
+        "hnsw:space": space,
+        "hnsw:M": m,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+    }
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    Коллекция ChromaDB
+
+    Параметры HNSW задаются при создании коллекции; у существующей коллекции
+    ChromaDB их не меняет (см. scripts/reembed_index.py).
+    """
+
+    def __init__(self, name: str, space: str = VECTOR_SPACE, client=None, metadata: Dict = None):
+        self.name = name
+        self.client = client or get_chroma_client()
+        try:
+            # get_or_create_collection перезаписал бы метаданные существующей коллекции
+            self.collection = self.client.get_collection(name)
+        except Exception:
+            self.collection = self.client.get_or_create_collection(name, metadata=metadata or hnsw_metadata(space))
+        actual_space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        if actual_space != space:
+            print(f"⚠️  Коллекция {name} создана с пространством {actual_space}, в настройках {space} — "
+                  f"запустите scripts/reembed_index.py")
+
+    def add(self, ids, embeddings, metadatas, documents=None):
+        self.collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def upsert(self, ids, embeddings, metadatas, documents=None):
+        self.collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def update_metadata(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def query(self, query_embeddings, n_results, where=None, include=None):
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=include or ['documents', 'metadatas', 'distances']
+        )
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None):
+        return self.collection.get(
+            ids=ids,
+            where=where,
+            include=include or ['documents', 'metadatas'],
+            limit=limit,
+            offset=offset
+        )
+
+    def count(self):
+        return self.collection.count()
+
+    def drop(self):
+        self.client.delete_collection(self.name)
+
+
+# === Хранилище на numpy ===
+
+_SQL_OPERATORS = {'$eq': '=', '$ne': '!=', '$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+
+def where_to_sql(where: Dict) -> Tuple[str, List]:
+    """
+    Фильтр в синтаксисе ChromaDB -> условие SQL по JSON-метаданным
+
+    Поддерживаются $and, $or, $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin.
+    """
+    if '$and' in where or '$or' in where:
+        operator = '$and' if '$and' in where else '$or'
+        parts, params = [], []
+        for condition in where[operator]:
+            sql, condition_params = where_to_sql(condition)
+            parts.append(f'({sql})')
+            params.extend(condition_params)
+        return f" {operator[1:].upper()} ".join(parts), params
+
+    (key, condition), = where.items()
+    if not isinstance(condition, dict):
+        condition = {'$eq': condition}
+    (operator, value), = condition.items()
+
+    field = "json_extract(metadata, ?)"
+    path = f'$."{key}"'
+    if operator in ('$in', '$nin'):
+        placeholders = ','.join('?' * len(value))
+        negation = 'NOT ' if operator == '$nin' else ''
+        return f"{field} {negation}IN ({placeholders})", [path, *value]
+    if operator not in _SQL_OPERATORS:
+        raise ValueError(f"Неподдерживаемый оператор фильтра: {operator}")
+    return f"{field} {_SQL_OPERATORS[operator]} ?", [path, value]
+
+
+def _init_records_db(conn):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS records (
+            row INTEGER PRIMARY KEY,     -- строка в файле векторов
+            id TEXT UNIQUE NOT NULL,
+            document TEXT,
+            metadata TEXT NOT NULL,      -- JSON
+            list_id INTEGER              -- список IVF
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_list_id ON records(list_id);
+        CREATE TABLE IF NOT EXISTS store_info (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    ''')
+    conn.commit()
+
+
+# Блокировки записи по каталогу хранилища (общие для всех экземпляров в процессе)
+_write_locks: Dict[str, threading.Lock] = {}
+_write_locks_guard = threading.Lock()
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Векторы в .npy (mmap) + метаданные в SQLite
+
+    Файл vectors.<поколение>.npy создаётся с запасом строк: новые векторы
+    дописываются на место за последней занятой строкой, а число занятых
+    строк ('rows') меняется в одной транзакции SQLite с записями — читатели
+    не видят строк, которых ещё нет в records. Когда запас кончается,
+    матрица копируется в новый файл вдвое большей ёмкости; имя текущего файла
+    тоже хранится в SQLite. Удалённые строки остаются в матрице до
+    уплотнения (COMPACT_RATIO).
+
+    Запись идёт под файловой блокировкой каталога хранилища (между
+    процессами); под ней же удаляются файлы, не ставшие текущими.
+    """
+
+    # Доля удалённых строк, после которой матрица уплотняется
+    COMPACT_RATIO = 0.25
+    # Минимальная ёмкость файла векторов (строк) и рост при нехватке места
+    MIN_CAPACITY = 1024
+    GROWTH_FACTOR = 2
+
+    def __init__(
+        self,
+        name: str,
+        space: str = 'l2',
+        path: str = None,
+        index_type: str = NUMPY_INDEX_TYPE,
+        n_probe: int = NUMPY_IVF_N_PROBE
+    ):
+        if space not in ('l2', 'cosine', 'ip'):
+            raise ValueError(f"Неизвестное пространство расстояний: {space}")
+        self.name = name
+        self.space = space
+        self.path = path or os.path.join(VECTOR_STORE_DIR, name)
+        self.index_type = index_type
+        self.n_probe = n_probe
+        os.makedirs(self.path, exist_ok=True)
+
+        self.pool = get_pool(os.path.join(self.path, 'records.db'), on_init=_init_records_db)
+        with _write_locks_guard:
+            self._write_lock = _write_locks.setdefault(self.path, threading.Lock())
+
+        # Кэш открытой матрицы: (имя файла, матрица всей ёмкости, квадраты норм занятых строк)
+        self._cache = None
+        self._cache_lock = threading.Lock()
+
+    # --- служебное ---
+
+    def _info(self, conn) -> Dict[str, str]:
+        return {row['key']: row['value'] for row in conn.execute('SELECT key, value FROM store_info')}
+
+    def _set_info(self, conn, **values):
+        conn.executemany(
+            'INSERT OR REPLACE INTO store_info (key, value) VALUES (?, ?)',
+            [(key, str(value)) for key, value in values.items()]
+        )
+
+    @contextmanager
+    def _reading(self):
+        """
+        Подключение с транзакцией чтения
+
+        store_info и records читаются из одного снимка WAL: дописанные строки
+        и уплотнение, закреплённые после начала чтения, не видны до его конца.
+        """
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN')
+            yield conn
+            conn.commit()
+
+    def _read(self, read: Callable):
+        """
+        read(conn, info) в транзакции чтения
+
+        Файл прежнего поколения писатель удаляет сразу после commit: если это
+        случилось до np.load, чтение повторяется один раз с новым store_info.
+        """
+        try:
+            with self._reading() as conn:
+                return read(conn, self._info(conn))
+        except FileNotFoundError:
+            with self._reading() as conn:
+                return read(conn, self._info(conn))
+
+    @contextmanager
+    def _writing(self):
+        """Блокировка записи: потоки процесса и другие процессы"""
+        with self._write_lock, file_lock(os.path.join(self.path, 'write.lock')):
+            yield
+
+    def _remove_stale_files(self, info: Dict[str, str]):
+        """
+        Удаление файлов, не ставших текущими (сбой во время записи)
+
+        Вызывается только под _writing: другой процесс не может в это время
+        записывать новый, ещё не закреплённый в store_info файл.
+        """
+        current = {info.get('vectors_file'), info.get('centroids_file')}
+        for file_path in glob.glob(os.path.join(self.path, '*.npy')):
+            if os.path.basename(file_path) not in current:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+
+    def _load(self, info: Dict[str, str]) -> Tuple[Optional[np.memmap], Optional[np.ndarray]]:
+        """Занятые строки матрицы текущего поколения (mmap) и квадраты их норм"""
+        vectors_file = info.get('vectors_file')
+        if not vectors_file:
+            return None, None
+
+        rows = int(info.get('rows', 0))
+        with self._cache_lock:
+            if self._cache is None or self._cache[0] != vectors_file:
+                matrix = np.load(os.path.join(self.path, vectors_file), mmap_mode='r')
+                self._cache = (vectors_file, matrix, np.empty(0, dtype=np.float32))
+            _, matrix, sq_norms = self._cache
+            if len(sq_norms) < rows:
+                # в том же файле строки только дописываются — считаем нормы новых
+                tail = matrix[len(sq_norms):rows]
+                sq_norms = np.concatenate([sq_norms, np.einsum('ij,ij->i', tail, tail)])
+                self._cache = (vectors_file, matrix, sq_norms)
+            return matrix[:rows], sq_norms[:rows]
+
+    def _centroids(self, info: Dict[str, str]) -> Optional[np.ndarray]:
+        centroids_file = info.get('centroids_file')
+        if not centroids_file:
+            return None
+        return np.load(os.path.join(self.path, centroids_file))
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """Векторы для сравнения с центроидами IVF (косинус — нормированные)"""
+        if self.space == 'cosine':
+            norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+            norms[norms == 0] = 1.0
+            return vectors / norms
+        return vectors
+
+    def _list_scores(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Близость векторов к центроидам IVF (больше — ближе)"""
+        scores = self._prepare(vectors) @ centroids.T
+        if self.space == 'l2':
+            # argmin ||x - c||² = argmax (x·c - ||c||²/2)
+            scores -= 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+        return scores
+
+    def _assign_lists(self, centroids: Optional[np.ndarray], vectors: np.ndarray) -> List[Optional[int]]:
+        if centroids is None or not len(vectors):
+            return [None] * len(vectors)
+        return self._list_scores(vectors, centroids).argmax(axis=1).tolist()
+
+    def _distances(self, matrix, sq_norms, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Расстояния в пространстве хранилища (как в ChromaDB)"""
+        vectors = matrix if rows is None else matrix[rows]
+        norms = sq_norms if rows is None else sq_norms[rows]
+        dots = vectors @ query
+        if self.space == 'l2':
+            return norms - 2 * dots + query @ query
+        if self.space == 'cosine':
+            denominator = np.sqrt(norms) * np.linalg.norm(query)
+            denominator[denominator == 0] = 1.0
+            return 1.0 - dots / denominator
+        return 1.0 - dots
+
+    def _write_matrix(
+        self,
+        matrix: Optional[np.ndarray],
+        keep_rows: Optional[np.ndarray],
+        new_vectors: np.ndarray,
+        generation: int,
+        capacity: int = 0
+    ) -> str:
+        """Новый файл векторов: строки keep_rows старой матрицы + new_vectors, не меньше capacity строк"""
+        kept = 0 if matrix is None else (len(matrix) if keep_rows is None else len(keep_rows))
+        dim = new_vectors.shape[1] if len(new_vectors) else matrix.shape[1]
+        vectors_file = f'vectors.{generation}.npy'
+        target = np.lib.format.open_memmap(
+            os.path.join(self.path, vectors_file),
+            mode='w+',
+            dtype=np.float32,
+            shape=(max(capacity, kept + len(new_vectors)), dim)
+        )
+        if kept:
+            target[:kept] = matrix if keep_rows is None else matrix[keep_rows]
+        if len(new_vectors):
+            target[kept:kept + len(new_vectors)] = new_vectors
+        target.flush()
+        del target
+        return vectors_file
+
+    def _capacity(self, vectors_file: str) -> int:
+        """Ёмкость файла векторов (строк, включая запас)"""
+        return np.load(os.path.join(self.path, vectors_file), mmap_mode='r').shape[0]
+
+    def _append_rows(self, vectors_file: str, first_row: int, new_vectors: np.ndarray):
+        """Запись новых векторов в запас текущего файла (читатели их пока не видят)"""
+        target = np.load(os.path.join(self.path, vectors_file), mmap_mode='r+')
+        target[first_row:first_row + len(new_vectors)] = new_vectors
+        target.flush()
+        del target
+
+    def _commit_files(self, conn, info: Dict[str, str], vectors_file: str, generation: int, rows: int):
+        self._set_info(conn, vectors_file=vectors_file, generation=generation, rows=rows)
+        conn.commit()
+        old_file = info.get('vectors_file')
+        if old_file and old_file != vectors_file:
+            try:
+                os.remove(os.path.join(self.path, old_file))
+            except OSError:
+                pass  # файл ещё открыт читателем (Windows) — удалится при следующем открытии
+
+    def _fetch(self, conn, rows: Sequence[int], include: List[str], matrix) -> Dict[int, Dict]:
+        """Записи по номерам строк"""
+        records = {}
+        rows = [int(row) for row in rows]
+        for start in range(0, len(rows), 500):
+            batch = rows[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            for record in conn.execute(
+                f'SELECT row, id, document, metadata FROM records WHERE row IN ({placeholders})', batch
+            ):
+                records[record['row']] = {
+                    'id': record['id'],
+                    'document': record['document'],
+                    'metadata': json.loads(record['metadata']),
+                    'embedding': matrix[record['row']].tolist() if 'embeddings' in include else None
+                }
+        return records
+
+    # --- запись ---
+
+    def _write(self, ids, embeddings, metadatas, documents, replace: bool):
+        if not ids:
+            return
+        new_vectors = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+
+        with self._writing(), self.pool.connection() as conn:
+            info = self._info(conn)
+            matrix, _ = self._load(info)
+            if matrix is not None and matrix.shape[1] != new_vectors.shape[1]:
+                raise ValueError(
+                    f"Размерность векторов {new_vectors.shape[1]} не совпадает с хранилищем ({matrix.shape[1]})"
+                )
+
+            placeholders = ','.join('?' * len(ids))
+            existing = [row['id'] for row in conn.execute(f'SELECT id FROM records WHERE id IN ({placeholders})', ids)]
+            if existing and not replace:
+                raise ValueError(f"Записи уже существуют: {existing[:5]}")
+
+            generation = int(info.get('generation', 0))
+            first_row = int(info.get('rows', 0))
+            capacity = 0 if matrix is None else self._capacity(info['vectors_file'])
+            if first_row + len(ids) <= capacity:
+                vectors_file = info['vectors_file']
+                self._append_rows(vectors_file, first_row, new_vectors)
+            else:
+                # запас кончился: копия в файл большей ёмкости (редко — ёмкость растёт в GROWTH_FACTOR раз)
+                self._remove_stale_files(info)
+                generation += 1
+                vectors_file = self._write_matrix(
+                    matrix,
+                    None,
+                    new_vectors,
+                    generation,
+                    capacity=max(self.MIN_CAPACITY, capacity * self.GROWTH_FACTOR)
+                )
+            lists = self._assign_lists(self._centroids(info), new_vectors)
+
+            conn.execute(f'DELETE FROM records WHERE id IN ({placeholders})', ids)
+            conn.executemany(
+                'INSERT INTO records (row, id, document, metadata, list_id) VALUES (?, ?, ?, ?, ?)',
+                [
+                    (first_row + i, ids[i], documents[i], json.dumps(metadatas[i], ensure_ascii=False), lists[i])
+                    for i in range(len(ids))
+                ]
+            )
+            self._commit_files(conn, info, vectors_file, generation, first_row + len(ids))
+
+        self._maybe_compact()
+
+    def add(self, ids, embeddings, metadatas, documents=None):
+        self._write(ids, embeddings, metadatas, documents, replace=False)
+
+    def upsert(self, ids, embeddings, metadatas, documents=None):
+        self._write(ids, embeddings, metadatas, documents, replace=True)
+
+    def delete(self, ids=None, where=None):
+        conditions, params = [], []
+        if ids is not None:
+            if not ids:
+                return
+            conditions.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if where:
+            sql, where_params = where_to_sql(where)
+            conditions.append(sql)
+            params.extend(where_params)
+        if not conditions:
+            raise ValueError("Укажите ids или where")
+
+        with self._writing(), self.pool.transaction() as conn:
+            conn.execute(f"DELETE FROM records WHERE {' AND '.join(conditions)}", params)
+
+        self._maybe_compact()
+
+    def update_metadata(self, ids, metadatas):
+        with self._writing(), self.pool.transaction() as conn:
+            conn.executemany(
+                'UPDATE records SET metadata = json_patch(metadata, ?) WHERE id = ?',
+                [(json.dumps(metadata, ensure_ascii=False), record_id) for record_id, metadata in zip(ids, metadatas)]
+            )
+
+    def _maybe_compact(self):
+        with self.pool.connection() as conn:
+            total = int(self._info(conn).get('rows', 0))
+            alive = conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+        if total and (total - alive) / total > self.COMPACT_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Уплотнение матрицы: удаление строк удалённых записей"""
+        with self._writing(), self.pool.connection() as conn:
+            info = self._info(conn)
+            matrix, _ = self._load(info)
+            if matrix is None:
+                return
+            self._remove_stale_files(info)
+            rows = np.array([row[0] for row in conn.execute('SELECT row FROM records ORDER BY row')], dtype=np.int64)
+            generation = int(info.get('generation', 0)) + 1
+            vectors_file = self._write_matrix(
+                matrix,
+                rows,
+                np.empty((0, matrix.shape[1]), dtype=np.float32),
+                generation,
+                capacity=max(self.MIN_CAPACITY, len(rows) * self.GROWTH_FACTOR)
+            )
+            # По возрастанию новый номер строки не больше старого — конфликтов PRIMARY KEY нет
+            conn.executemany(
+                'UPDATE records SET row = ? WHERE row = ?',
+                [(new_row, int(old_row)) for new_row, old_row in enumerate(rows)]
+            )
+            self._commit_files(conn, info, vectors_file, generation, len(rows))
+
+    def build_ivf(self, n_lists: int, iterations: int = 10, sample_size: int = 50000):
+        """
+        Обучение списков IVF (k-means) и распределение по ним всех записей
+
+        После этого query при index_type='ivf' считает расстояния только для
+        записей из n_probe ближайших списков.
+        """
+        with self._writing(), self.pool.connection() as conn:
+            info = self._info(conn)
+            matrix, _ = self._load(info)
+            rows = np.array([row[0] for row in conn.execute('SELECT row FROM records ORDER BY row')], dtype=np.int64)
+            if matrix is None or len(rows) < n_lists:
+                raise ValueError(f"Для {n_lists} списков IVF нужно не меньше {n_lists} записей")
+
+            rng = np.random.default_rng(0)
+            sample = self._prepare(np.asarray(matrix[np.sort(rng.choice(rows, min(sample_size, len(rows)), replace=False))]))
+            centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = self._list_scores(sample, centroids).argmax(axis=1)
+                for list_id in range(n_lists):
+                    members = sample[assignment == list_id]
+                    if len(members):
+                        centroids[list_id] = members.mean(axis=0)
+                centroids = self._prepare(centroids) if self.space == 'cosine' else centroids
+
+            generation = int(info.get('generation', 0)) + 1
+            centroids_file = f'centroids.{generation}.npy'
+            np.save(os.path.join(self.path, centroids_file), centroids.astype(np.float32))
+
+            updates = []
+            for start in range(0, len(rows), COPY_BATCH_SIZE):
+                batch_rows = rows[start:start + COPY_BATCH_SIZE]
+                lists = self._assign_lists(centroids, np.asarray(matrix[batch_rows]))
+                updates.extend(zip(lists, batch_rows.tolist()))
+            conn.executemany('UPDATE records SET list_id = ? WHERE row = ?', updates)
+            self._set_info(conn, centroids_file=centroids_file, generation=generation)
+            conn.commit()
+
+            old_file = info.get('centroids_file')
+            if old_file:
+                try:
+                    os.remove(os.path.join(self.path, old_file))
+                except OSError:
+                    pass
+
+    # --- чтение ---
+
+    def _candidate_rows(
+        self,
+        conn,
+        where: Optional[Dict],
+        list_ids: Optional[List[int]],
+        total_rows: int
+    ) -> Optional[np.ndarray]:
+        """Номера строк записей, подходящих под фильтр и списки IVF (в пределах занятых строк)"""
+        conditions, params = [], []
+        if where:
+            sql, params = where_to_sql(where)
+            conditions.append(sql)
+        if list_ids is not None:
+            conditions.append(f"list_id IN ({','.join('?' * len(list_ids))})")
+            params = [*params, *list_ids]
+        sql = 'SELECT row FROM records'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        rows = np.array([row[0] for row in conn.execute(sql, params)], dtype=np.int64)
+        return rows[rows < total_rows]
+
+    def query(self, query_embeddings, n_results, where=None, include=None):
+        include = include or ['documents', 'metadatas', 'distances']
+
+        def read(conn, info):
+            result = {key: [] for key in ('ids', 'distances', 'documents', 'metadatas', 'embeddings')}
+            matrix, sq_norms = self._load(info)
+            total_rows = int(info.get('rows', 0))
+            centroids = self._centroids(info) if self.index_type == 'ivf' else None
+            all_rows = None
+
+            for query_embedding in query_embeddings:
+                query = np.asarray(query_embedding, dtype=np.float32)
+                rows = np.empty(0, dtype=np.int64)
+                if matrix is not None:
+                    rows = None
+                    if centroids is not None:
+                        probe = np.argsort(-self._list_scores(query[None, :], centroids)[0])[:self.n_probe]
+                        rows = self._candidate_rows(conn, where, probe.tolist(), total_rows)
+                    if rows is None or len(rows) < n_results:
+                        # мало кандидатов в ближайших списках — точный поиск
+                        if all_rows is None:
+                            all_rows = self._candidate_rows(conn, where, None, total_rows)
+                        rows = all_rows
+
+                distances = np.empty(0)
+                if len(rows) and len(rows) > len(matrix) // 4:
+                    # большая часть матрицы: один проход BLAS по mmap без копирования строк
+                    distances = self._distances(matrix, sq_norms, None, query)[rows]
+                elif len(rows):
+                    distances = self._distances(matrix, sq_norms, rows, query)
+                k = min(n_results, len(rows))
+                top = np.argpartition(distances, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+                top = top[np.argsort(distances[top])]
+
+                records = self._fetch(conn, rows[top], include, matrix) if k else {}
+                hits = [(records[int(rows[i])], float(distances[i])) for i in top if int(rows[i]) in records]
+                result['ids'].append([record['id'] for record, _ in hits])
+                result['distances'].append([distance for _, distance in hits])
+                result['documents'].append([record['document'] for record, _ in hits])
+                result['metadatas'].append([record['metadata'] for record, _ in hits])
+                result['embeddings'].append([record['embedding'] for record, _ in hits])
+            return result
+
+        result = self._read(read)
+        for key in ('distances', 'documents', 'metadatas', 'embeddings'):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None):
+        include = include or ['documents', 'metadatas']
+        conditions, params = [], []
+        if ids is not None:
+            if not ids:
+                return {'ids': [], 'documents': [], 'metadatas': [], 'embeddings': []}
+            conditions.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if where:
+            sql, where_params = where_to_sql(where)
+            conditions.append(sql)
+            params.extend(where_params)
+
+        sql = 'SELECT row, id, document, metadata FROM records'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY row LIMIT ? OFFSET ?'
+        params.extend([limit if limit is not None else -1, offset or 0])
+
+        def read(conn, info):
+            matrix, _ = self._load(info)
+            return matrix, conn.execute(sql, params).fetchall()
+
+        matrix, records = self._read(read)
+
+        return {
+            'ids': [record['id'] for record in records],
+            'documents': [record['document'] for record in records] if 'documents' in include else None,
+            'metadatas': [json.loads(record['metadata']) for record in records] if 'metadatas' in include else None,
+            'embeddings': [matrix[record['row']].tolist() for record in records] if 'embeddings' in include else None
+        }
+
+    def count(self):
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def drop(self):
+        with self._writing(), self.pool.transaction() as conn:
+            info = self._info(conn)
+            conn.execute('DELETE FROM records')
+            # Поколение сохраняется: имя нового файла не совпадёт с открытым у читателей
+            conn.execute("DELETE FROM store_info WHERE key != 'generation'")
+        for key in ('vectors_file', 'centroids_file'):
+            if info.get(key):
+                try:
+                    os.remove(os.path.join(self.path, info[key]))
+                except OSError:
+                    pass
+        with self._cache_lock:
+            self._cache = None
+
+
+def get_vector_store(name: str = DOCUMENTS_COLLECTION, backend: str = VECTOR_STORE_BACKEND) -> VectorStore:
+    """Хранилище векторов по имени коллекции (реализация — из config.py)"""
+    space = COLLECTION_SPACES.get(name, VECTOR_SPACE)
+    if backend == "chroma":
+        return ChromaVectorStore(name, space)
+    if backend == "numpy":
+        return NumpyVectorStore(name, space)
+    raise ValueError(f"Неизвестное хранилище векторов: {backend}")
+
+
+def get_instruction_store(backend: str = VECTOR_STORE_BACKEND) -> VectorStore:
+    """Хранилище индекса инструкций (см. src/instruction_index.py)"""
+    return get_vector_store(INSTRUCTIONS_COLLECTION, backend)
+
+
+def copy_store(source: VectorStore, target: VectorStore, transform=None, batch_size: int = COPY_BATCH_SIZE) -> int:
+    """
+    Копирование всех записей между хранилищами
+
+    Args:
+        transform: Преобразование пачки векторов (например, сжатие), по умолчанию без изменений
+
+    Returns:
+        Число скопированных записей
+    """
+    total = source.count()
+    copied = 0
+    for offset in range(0, total, batch_size):
+        batch = source.get(include=['documents', 'metadatas', 'embeddings'], limit=batch_size, offset=offset)
+        if not len(batch['ids']):
+            continue
+        embeddings = np.asarray(batch['embeddings'], dtype=np.float32)
+        if transform is not None:
+            embeddings = transform(embeddings)
+        target.upsert(
+            ids=batch['ids'],
+            embeddings=embeddings.tolist(),
+            metadatas=batch['metadatas'],
+            documents=batch['documents']
+        )
+        copied += len(batch['ids'])
+    return copied
+
+
+def swap_marker(tmp_name: str) -> str:
+    """Отметка незавершённой подмены основного хранилища временным tmp_name"""
+    return os.path.join(DATA_DIR, f'{tmp_name}.swap')
+
+
+def swap_pending(tmp_name: str) -> bool:
+    """Прервалась ли подмена: основное хранилище неполное, полная копия — в tmp_name"""
+    return os.path.exists(swap_marker(tmp_name))
+
+
+def swap_store(tmp_name: str, name: str = DOCUMENTS_COLLECTION, batch_size: int = COPY_BATCH_SIZE) -> int:
+    """
+    Подмена хранилища name временным tmp_name
+
+    Перед очисткой основного хранилища ставится отметка (swap_marker):
+    если копирование прервётся, повторный вызов продолжит подмену.
+    Временное хранилище удаляется только после успешного копирования.
+
+    Returns:
+        Число скопированных записей
+    """
+    marker = swap_marker(tmp_name)
+    with open(marker, 'w', encoding='utf-8') as f:
+        f.write(name)
+    get_vector_store(name).drop()
+    copied = copy_store(get_vector_store(tmp_name), get_vector_store(name), batch_size=batch_size)
+    get_vector_store(tmp_name).drop()
+    os.remove(marker)
+    return copied